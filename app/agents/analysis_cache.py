@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any
+
+from app.cache import LRUCache
+from app.config import Settings
+from app.logging import get_logger
+from app.prompts import diagram_analysis_prompt
+
+__all__ = ["AnalysisCache", "PROMPT_VERSION", "normalize_description"]
+
+logger = get_logger(__name__)
+
+# Hash of the analysis prompt template, so prompt edits invalidate old entries
+PROMPT_VERSION = hashlib.sha256(
+    diagram_analysis_prompt("").encode("utf-8")
+).hexdigest()[:16]
+
+
+def normalize_description(description: str) -> str:
+    """Collapse whitespace and case so trivially different copies share a key."""
+    return " ".join(description.split()).lower()
+
+
+class AnalysisCache:
+    """TTL/LRU cache of parsed analysis results with optional SQLite persistence."""
+
+    def __init__(
+        self,
+        model: str,
+        maxsize: int = 1024,
+        ttl: float = 86400.0,
+        db_path: str | None = None,
+    ) -> None:
+        self.model = model
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.memory: LRUCache[str, dict[str, Any]] = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._db = self._open_db(db_path)
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> AnalysisCache:
+        """Build an analysis cache from application settings."""
+        return cls(
+            model=settings.gemini_model,
+            maxsize=settings.analysis_cache_max_items,
+            ttl=settings.analysis_cache_ttl,
+            db_path=settings.analysis_cache_db_path or None,
+        )
+
+    def _open_db(self, db_path: str) -> sqlite3.Connection:
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS analysis_cache_accessed "
+            "ON analysis_cache (accessed)"
+        )
+        return db
+
+    def key(self, description: str) -> str:
+        """Build the cache key for a description under the current model and prompt."""
+        payload = (
+            f"{self.model}\0{PROMPT_VERSION}\0{normalize_description(description)}"
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @property
+    def persistent(self) -> bool:
+        """Whether entries are also kept in SQLite, whose calls may block."""
+        return self._db is not None
+
+    def get_memory(self, description: str) -> dict[str, Any] | None:
+        """Return a copy of the analysis cached in memory, if any.
+
+        Hits are counted, misses are not, since :meth:`get` may still find
+        the analysis in SQLite.
+        """
+        result = self.memory.get(self.key(description))
+        if result is None:
+            return None
+        self.hits += 1
+        return copy.deepcopy(result)
+
+    def get(self, description: str) -> dict[str, Any] | None:
+        """Return a copy of the cached analysis for a description, if any."""
+        key = self.key(description)
+        result = self.memory.get(key)
+        if result is None and self._db is not None:
+            row = self._db_get(key)
+            if row is not None:
+                result, created = row
+                # Keep the entry only for what is left of its SQLite lifetime
+                self.memory.set(key, result, ttl=created + self.ttl - time.time())
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return copy.deepcopy(result)
+
+    def set(self, description: str, analysis: dict[str, Any]) -> None:
+        """Store an analysis result for a description."""
+        key = self.key(description)
+        self.memory.set(key, copy.deepcopy(analysis))
+        if self._db is not None:
+            try:
+                self._db_set(key, analysis)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to persist analysis cache entry: {e}")
+
+    def _db_get(self, key: str) -> tuple[dict[str, Any], float] | None:
+        now = time.time()
+        with self._db_lock:
+            row = self._db.execute(  # type: ignore[union-attr]
+                "SELECT value, created FROM analysis_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] + self.ttl <= now:
+                self._db.execute(  # type: ignore[union-attr]
+                    "DELETE FROM analysis_cache WHERE key = ?", (key,)
+                )
+                return None
+            self._db.execute(  # type: ignore[union-attr]
+                "UPDATE analysis_cache SET accessed = ? WHERE key = ?", (now, key)
+            )
+        return json.loads(row[0]), row[1]
+
+    def _db_set(self, key: str, analysis: dict[str, Any]) -> None:
+        now = time.time()
+        with self._db_lock:
+            self._db.execute(  # type: ignore[union-attr]
+                "INSERT OR REPLACE INTO analysis_cache (key, value, created, accessed) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(analysis), now, now),
+            )
+            # Drop expired rows and keep only the most recently used entries
+            self._db.execute(  # type: ignore[union-attr]
+                "DELETE FROM analysis_cache WHERE created <= ? OR key IN ("
+                "SELECT key FROM analysis_cache ORDER BY accessed DESC "
+                "LIMIT -1 OFFSET ?)",
+                (now - self.ttl, self.maxsize),
+            )
+
+    def close(self) -> None:
+        """Close the SQLite backing store, if any."""
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+    def stats(self) -> dict[str, int]:
+        """Return hit, miss and eviction counters."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.memory.evictions,
+            "expirations": self.memory.expirations,
+            "size": len(self.memory),
+        }
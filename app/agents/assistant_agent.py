@@ -1,42 +1,257 @@
 from __future__ import annotations
 
-import json
+import functools
+import math
+import re
+import time
+from collections import Counter
+from typing import Any, NamedTuple
 
-from app.config import settings
-from app.llm import client
-from app.prompts import intent_prompt
+from app.config import Settings, settings
+from app.json_repair import loads_lenient
+from app.llm import LLMUnavailableError, client, json_config, llm_caller
+from app.llm_scheduler import estimate_tokens
+from app.logging import get_logger
+from app.metrics import FALLBACKS, LLM_PARSES, LLM_SECONDS
+from app.models.analysis import AssistantTurn, IntentResult
+from app.prompts import assistant_turn_prompt, intent_prompt
+from app.tracing import tracer
 
-__all__ = ["AssistantAgent"]
+__all__ = ["AssistantAgent", "IntentClassifier", "LocalIntent"]
+
+logger = get_logger(__name__)
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+# (intent, confidence, pattern) rules for messages that need no LLM judgement
+_RULES: list[tuple[str, float, re.Pattern[str]]] = [
+    (
+        "greeting",
+        0.99,
+        re.compile(
+            r"^(hi|hello|hey|hiya|greetings|good (morning|afternoon|evening))"
+            r"( there)?[\s!.,]*$"
+        ),
+    ),
+    (
+        "clarification",
+        0.95,
+        re.compile(
+            r"^(help|what can you do|what do you do|who are you|what are you"
+            r"|how does this work|how do i use this)[\s?!.]*$"
+        ),
+    ),
+    (
+        "generate_diagram",
+        0.95,
+        re.compile(
+            r"^(please |can you |could you )?(create|generate|draw|make|build|design)"
+            r" (me )?(an? |the )?([\w-]+ ){0,3}(diagram|architecture)"
+            r" (of|for|showing|with|that) \S.{8,}$"
+        ),
+    ),
+]
+
+# Example messages the bundled naive Bayes model is fitted on at start-up
+_EXAMPLES: dict[str, list[str]] = {
+    "greeting": [
+        "hi",
+        "hello there",
+        "hey how are you",
+        "good morning",
+        "hello friend",
+        "hey there assistant",
+    ],
+    "clarification": [
+        "what can you do",
+        "help me understand what you do",
+        "how does this work",
+        "what diagram types do you support",
+        "explain what you can help with",
+        "which components are available",
+    ],
+    "generate_diagram": [
+        "create a diagram of a web application with a load balancer",
+        "draw an architecture with lambda functions and an sqs queue",
+        "generate a microservices diagram with an api gateway",
+        "show me a serverless architecture with s3 and dynamodb",
+        "design a system with ec2 instances and an rds database",
+        "build a diagram showing kinesis streaming into s3",
+    ],
+    "unknown": [
+        "what is the weather today",
+        "tell me a joke",
+        "asdf",
+        "who won the game last night",
+        "translate this sentence",
+        "ok",
+    ],
+}
+
+
+class LocalIntent(NamedTuple):
+    """Intent decided without an LLM call."""
+
+    intent: str
+    confidence: float
+    description: str | None
+
+
+@functools.lru_cache(maxsize=1)
+def _fit_classifier() -> tuple[
+    dict[str, float], dict[str, dict[str, float]], dict[str, float]
+]:
+    """Fit the naive Bayes model once; it is only read afterwards."""
+    priors = {intent: -math.log(len(_EXAMPLES)) for intent in _EXAMPLES}
+    log_probs: dict[str, dict[str, float]] = {}
+    unseen: dict[str, float] = {}
+    vocabulary = {
+        w for texts in _EXAMPLES.values() for t in texts for w in _WORD.findall(t)
+    }
+    for intent, texts in _EXAMPLES.items():
+        counts = Counter(w for t in texts for w in _WORD.findall(t))
+        total = sum(counts.values()) + len(vocabulary)
+        log_probs[intent] = {w: math.log((counts[w] + 1) / total) for w in vocabulary}
+        unseen[intent] = math.log(1 / total)
+    return priors, log_probs, unseen
+
+
+class IntentClassifier:
+    """Confidence-gated local intent classifier with no network calls.
+
+    Regex rules catch unambiguous greetings, help requests and diagram
+    requests; everything else goes through a small multinomial naive Bayes
+    model fitted on bundled examples. Only results at or above
+    ``threshold`` are used; the rest are left to the LLM.
+    """
+
+    def __init__(self, threshold: float = 0.9) -> None:
+        self.threshold = threshold
+        self._priors, self._log_probs, self._unseen = _fit_classifier()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> IntentClassifier:
+        """Build a classifier from application settings."""
+        return cls(threshold=settings.intent_fast_path_threshold)
+
+    def classify(self, message: str) -> LocalIntent | None:
+        """Return a confident local intent, or None if the LLM should decide."""
+        text = " ".join(message.lower().split())
+        for intent, confidence, pattern in _RULES:
+            if pattern.match(text):
+                return self._gate(intent, confidence, message)
+
+        words = [w for w in _WORD.findall(text) if w in self._log_probs["unknown"]]
+        if not words:
+            return None
+        scores = {
+            intent: self._priors[intent] + sum(probs[w] for w in words)
+            for intent, probs in self._log_probs.items()
+        }
+        best = max(scores, key=scores.__getitem__)
+        # Softmax over log scores gives the posterior of the best intent
+        confidence = 1 / sum(math.exp(s - scores[best]) for s in scores.values())
+        return self._gate(best, confidence, message)
+
+    def _gate(self, intent: str, confidence: float, message: str) -> LocalIntent | None:
+        if confidence < self.threshold or intent == "unknown":
+            return None
+        description = message.strip() if intent == "generate_diagram" else None
+        return LocalIntent(intent, confidence, description)
 
 
 class AssistantAgent:
     """Agent for handling assistant conversations and intent detection."""
 
-    def __init__(self) -> None:
-        pass
+    def __init__(self, classifier: IntentClassifier | None = None) -> None:
+        self.classifier = classifier
+        self.parse_stats = {"parsed": 0, "repaired": 0, "failed": 0}
+        # Requests and cumulative seconds per intent detection path
+        self.routing_stats = {
+            path: {"count": 0, "seconds": 0.0} for path in ("local", "llm")
+        }
 
     async def get_intent(
-        self, message: str, context: dict | None = None
-    ) -> dict[str, str]:
-        """Get intent from user message using LLM."""
+        self,
+        message: str,
+        context: dict | None = None,
+        *,
+        with_analysis: bool = False,
+    ) -> dict[str, Any]:
+        """Get intent from user message using LLM.
+
+        With ``with_analysis`` the same call also returns the diagram
+        ``analysis`` for generate_diagram intents, when the model gives a
+        complete one. Messages the local classifier is confident about are
+        answered without calling the LLM. ``source`` says which path
+        answered: ``local`` or ``llm``.
+        """
+        start = time.perf_counter()
+        if self.classifier is not None:
+            local = self.classifier.classify(message)
+            if local is not None:
+                self._record("local", start)
+                result = {
+                    "intent": local.intent,
+                    "confidence": local.confidence,
+                    "source": "local",
+                }
+                if local.description:
+                    result["description"] = local.description
+                return result
+
+        try:
+            result = await self._llm_intent(message, context, with_analysis)
+        finally:
+            self._record("llm", start)
+        return {**result, "source": "llm"}
+
+    async def _llm_intent(
+        self, message: str, context: dict | None, with_analysis: bool
+    ) -> dict[str, Any]:
         # Include context in prompt if available
         context_str = ""
         if context and "messages" in context and len(context["messages"]) > 1:
             recent_messages = context["messages"][-3:]  # Last 3 messages for context
             context_str = f"\nConversation history: {recent_messages}"
 
-        prompt = intent_prompt(message + context_str)
+        if with_analysis:
+            prompt = assistant_turn_prompt(message + context_str)
+            schema: type[IntentResult] = AssistantTurn
+        else:
+            prompt = intent_prompt(message + context_str)
+            schema = IntentResult
+        agent = "assistant_fused" if with_analysis else "assistant"
         try:
-            response = await client.aio.models.generate_content(
-                model=settings.gemini_model, contents=prompt
-            )
+            with (
+                tracer.span(f"llm.{agent}", kind="client", model=settings.gemini_model),
+                LLM_SECONDS.time(agent=agent),
+            ):
+                response = await llm_caller.call(
+                    lambda: client.aio.models.generate_content(
+                        model=settings.gemini_model,
+                        contents=prompt,
+                        config=json_config(schema),
+                    ),
+                    tokens=estimate_tokens(prompt),
+                )
             return self._parse_response(response.text or "")
+        except LLMUnavailableError as e:
+            logger.warning(f"Using heuristic intent, LLM is unavailable: {e}")
+            FALLBACKS.inc(kind="intent")
+            return self._create_fallback_intent(message)
         except Exception as e:
             # If there's a location or API issue, return a basic fallback
             if "location" in str(e).lower() or "failed_precondition" in str(e).lower():
+                FALLBACKS.inc(kind="intent")
                 return self._create_fallback_intent(message)
             raise e
 
+    def _record(self, path: str, start: float) -> None:
+        stats = self.routing_stats[path]
+        stats["count"] += 1
+        stats["seconds"] += time.perf_counter() - start
+
     def _create_fallback_intent(self, message: str) -> dict[str, str]:
         """Create a basic fallback intent when API is unavailable."""
         # Simple heuristics to determine intent
@@ -51,10 +266,40 @@ class AssistantAgent:
         else:
             return {"intent": "general", "confidence": "low"}
 
-    def _parse_response(self, response_text: str) -> dict[str, str]:
-        """Parse JSON response from LLM."""
+    def _count_parse(self, result: str) -> None:
+        self.parse_stats[result] += 1
+        LLM_PARSES.inc(agent="assistant", result=result)
+
+    def _parse_response(self, response_text: str) -> dict[str, Any]:
+        """Parse JSON response from LLM, repairing noisy or truncated output."""
         try:
-            json_text = response_text.strip().replace("```json", "").replace("```", "")
-            return json.loads(json_text)
-        except json.JSONDecodeError as e:
-            raise ValueError("Failed to decode LLM response as JSON.") from e
+            result, repaired = loads_lenient(response_text)
+            if not isinstance(result, dict) or "intent" not in result:
+                raise ValueError("LLM response does not contain an intent.")
+        except ValueError:
+            self._count_parse("failed")
+            raise
+        if repaired:
+            logger.warning("Repaired malformed intent JSON from LLM")
+            self._count_parse("repaired")
+        else:
+            self._count_parse("parsed")
+        if "analysis" in result and not self._is_complete_analysis(result["analysis"]):
+            logger.info("Dropping incomplete analysis from fused intent reply")
+            del result["analysis"]
+        # Structured output sends null for the optional fields
+        return {key: value for key, value in result.items() if value is not None}
+
+    @staticmethod
+    def _is_complete_analysis(analysis: Any) -> bool:
+        """Check that an analysis has nodes with ids and list-valued sections."""
+        if not isinstance(analysis, dict):
+            return False
+        nodes = analysis.get("nodes")
+        return (
+            isinstance(nodes, list)
+            and bool(nodes)
+            and all(isinstance(n, dict) and n.get("id") for n in nodes)
+            and isinstance(analysis.get("clusters", []), list)
+            and isinstance(analysis.get("connections", []), list)
+        )
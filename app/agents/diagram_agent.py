@@ -1,33 +1,97 @@
 from __future__ import annotations
 
-import json
+import copy
 
+import anyio
+
+from app.agents.analysis_cache import AnalysisCache, normalize_description
 from app.config import settings
-from app.llm import client
+from app.json_repair import loads_lenient
+from app.llm import LLMUnavailableError, client, json_config, llm_caller
+from app.llm_scheduler import current_lane, estimate_tokens
+from app.logging import get_logger
+from app.metrics import CACHE_EVENTS, FALLBACKS, LLM_PARSES, LLM_SECONDS
+from app.models.analysis import DiagramAnalysis
 from app.prompts import diagram_analysis_prompt
+from app.singleflight import SingleFlight
+from app.tracing import tracer
 
 __all__ = ["DiagramAgent"]
 
+logger = get_logger(__name__)
+
 
 class DiagramAgent:
     """Agent for analyzing diagram descriptions and extracting components."""
 
-    def __init__(self) -> None:
-        pass
+    def __init__(self, cache: AnalysisCache | None = None) -> None:
+        self.cache = cache
+        self.inflight: SingleFlight[dict[str, list[dict[str, str]]]] = SingleFlight()
+        self.parse_stats = {"parsed": 0, "repaired": 0, "failed": 0}
 
     async def generate_analysis(
         self, description: str
     ) -> dict[str, list[dict[str, str]]]:
-        """Generate diagram component analysis from description."""
+        """Generate diagram component analysis from description.
+
+        Concurrent calls for the same description in the same LLM priority
+        lane share one LLM request.
+        """
+        if self.cache is not None:
+            cached = self.cache.get_memory(description)
+            if cached is None:
+                if self.cache.persistent:
+                    # SQLite reads also write the access time, keep them off the loop
+                    cached = await anyio.to_thread.run_sync(self.cache.get, description)
+                else:
+                    cached = self.cache.get(description)
+            CACHE_EVENTS.inc(
+                cache="analysis", result="hit" if cached is not None else "miss"
+            )
+            if cached is not None:
+                return cached
+
+        # Keyed by lane too, so interactive callers never wait in the bulk lane
+        result = await self.inflight.do(
+            (current_lane(), normalize_description(description)),
+            lambda: self._analyze(description),
+        )
+        # Every coalesced caller gets its own copy to mutate
+        return copy.deepcopy(result)
+
+    async def _analyze(self, description: str) -> dict[str, list[dict[str, str]]]:
         prompt = diagram_analysis_prompt(description)
         try:
-            response = await client.aio.models.generate_content(
-                model=settings.gemini_model, contents=prompt
-            )
-            return self._parse_response(response.text)
+            with (
+                tracer.span(
+                    "llm.diagram_analysis", kind="client", model=settings.gemini_model
+                ),
+                LLM_SECONDS.time(agent="diagram"),
+            ):
+                response = await llm_caller.call(
+                    lambda: client.aio.models.generate_content(
+                        model=settings.gemini_model,
+                        contents=prompt,
+                        config=json_config(DiagramAnalysis),
+                    ),
+                    tokens=estimate_tokens(prompt),
+                )
+            result, repaired = self._parse_response(response.text or "")
+            # A repaired reply may have lost its tail, so let a retry replace it
+            if self.cache is not None and not repaired:
+                if self.cache.persistent:
+                    await anyio.to_thread.run_sync(self.cache.set, description, result)
+                else:
+                    self.cache.set(description, result)
+            return result
+        except LLMUnavailableError as e:
+            logger.warning(f"Using heuristic analysis, LLM is unavailable: {e}")
+            FALLBACKS.inc(kind="analysis")
+            return self._create_fallback_analysis(description)
         except Exception as e:
             # If there's a location or API issue, return a basic fallback structure
             if "location" in str(e).lower() or "failed_precondition" in str(e).lower():
+                FALLBACKS.inc(kind="analysis")
                 return self._create_fallback_analysis(description)
             raise e
 
@@ -179,11 +243,31 @@ class DiagramAgent:
 
         return {"nodes": nodes, "connections": connections, "clusters": clusters}
 
-    def _parse_response(self, response_text: str) -> dict[str, list[dict[str, str]]]:
-        """Parse JSON response from LLM."""
+    def _count_parse(self, result: str) -> None:
+        self.parse_stats[result] += 1
+        LLM_PARSES.inc(agent="diagram", result=result)
+
+    def _parse_response(
+        self, response_text: str
+    ) -> tuple[dict[str, list[dict[str, str]]], bool]:
+        """Parse JSON response from LLM, repairing noisy or truncated output.
+
+        Returns ``(analysis, repaired)``.
+        """
         try:
-            # The response may be wrapped in markdown, so we need to extract the JSON
-            json_text = response_text.strip().replace("```json", "").replace("```", "")
-            return json.loads(json_text)
-        except json.JSONDecodeError as e:
-            raise ValueError("Failed to decode LLM response as JSON.") from e
+            result, repaired = loads_lenient(response_text)
+            if not isinstance(result, dict) or not isinstance(
+                result.get("nodes"), list
+            ):
+                raise ValueError("LLM response is not a diagram analysis.")
+        except ValueError:
+            self._count_parse("failed")
+            raise
+        if repaired:
+            logger.warning("Repaired malformed analysis JSON from LLM")
+            self._count_parse("repaired")
+        else:
+            self._count_parse("parsed")
+        result.setdefault("clusters", [])
+        result.setdefault("connections", [])
+        return result, repaired
@@ -1,24 +1,124 @@
 from __future__ import annotations
 
-from fastapi import Depends, FastAPI, HTTPException
+import json
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+import anyio
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.config import Settings, settings
+from app.container import ServiceContainer
 from app.logging import get_logger, setup_logging
+from app.metrics import ERRORS, HTTP_REQUEST_SECONDS, REGISTRY, server_timing
 from app.models.diagram import (
     AssistantRequest,
     AssistantResponse,
+    BatchDiagramRequest,
+    BatchDiagramResponse,
+    BatchItemResult,
     DiagramMetadata,
     DiagramRequest,
     DiagramResponse,
+    JobResponse,
 )
+from app.services.artifact_store import ArtifactStore
 from app.services.assistant_service import AssistantService
-from app.services.diagram_service import DiagramService
+from app.services.batch_service import BatchDiagramService, BatchOutcome
+from app.services.diagram_service import DiagramService, encode_image
+from app.services.job_service import Job, JobQueueFullError, JobService
+from app.services.render_engine import RenderQueueFullError
+from app.services.renderer import normalize_formats, size_attrs
+from app.tracing import tracer
 
 # Setup logging
 setup_logging()
 logger = get_logger(__name__)
 
-app = FastAPI(title="Diagram API Service", version="0.1.0")
+
+# Keep proxies from buffering or caching server-sent event streams
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Build shared services once per process and warm them up."""
+    container = ServiceContainer(settings)
+    await container.startup()
+    app.state.container = container
+    try:
+        yield
+    finally:
+        await container.shutdown()
+        app.state.container = None
+
+
+app = FastAPI(title="Diagram API Service", version="0.1.0", lifespan=lifespan)
+
+
+class InstrumentMiddleware:
+    """Trace each request, record its latency and report it in ``Server-Timing``.
+
+    An incoming W3C ``traceparent`` header is continued; the response carries
+    the trace id in ``X-Trace-Id``. A plain ASGI middleware, so streamed
+    responses pass through untouched; the headers report the time until the
+    response started, the latency histogram the time until it finished.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        method = scope["method"]
+        status = 500
+        with tracer.span(
+            f"{method} {scope['path']}",
+            parent=Headers(scope=scope).get("traceparent"),
+            kind="server",
+        ) as span:
+
+            async def send_instrumented(message: Message) -> None:
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    headers = MutableHeaders(scope=message)
+                    headers["X-Trace-Id"] = span.trace_id
+                    total = server_timing({"total": time.perf_counter() - start})
+                    existing = headers.get("Server-Timing")
+                    headers["Server-Timing"] = (
+                        f"{existing}, {total}" if existing else total
+                    )
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_instrumented)
+            finally:
+                # Label by route template so path parameters do not explode
+                # cardinality; routing stores the matched route in the scope
+                route = getattr(scope.get("route"), "path", "unmatched")
+                span.name = f"{method} {route}"
+                span.set_attribute("http.method", method)
+                span.set_attribute("http.route", route)
+                span.set_attribute("http.status_code", status)
+                HTTP_REQUEST_SECONDS.observe(
+                    time.perf_counter() - start,
+                    method=method,
+                    route=route,
+                    status=str(status),
+                )
+
+
+app.add_middleware(InstrumentMiddleware)
 
 
 def get_settings() -> Settings:
@@ -26,22 +126,100 @@ def get_settings() -> Settings:
     return settings
 
 
-def get_diagram_service(settings: Settings = Depends(get_settings)) -> DiagramService:
+async def get_container(
+    request: Request, settings: Settings = Depends(get_settings)
+) -> ServiceContainer:
+    """Dependency to get the application service container."""
+    container = getattr(request.app.state, "container", None)
+    if container is None:
+        # Lifespan did not run (e.g. bare ASGI transports); build it lazily.
+        # Async so this runs on the event loop and concurrent first requests
+        # cannot each build a container in the threadpool
+        container = ServiceContainer(settings)
+        request.app.state.container = container
+    return container
+
+
+def get_diagram_service(
+    container: ServiceContainer = Depends(get_container),
+) -> DiagramService:
     """Dependency to get diagram service."""
-    return DiagramService(settings)
+    return container.diagram_service
 
 
 def get_assistant_service(
-    settings: Settings = Depends(get_settings),
+    container: ServiceContainer = Depends(get_container),
 ) -> AssistantService:
     """Dependency to get assistant service."""
-    return AssistantService(settings)
+    return container.assistant_service
+
+
+def get_batch_service(
+    container: ServiceContainer = Depends(get_container),
+) -> BatchDiagramService:
+    """Dependency to get the batch diagram service."""
+    return container.batch_service
+
+
+def get_job_service(
+    container: ServiceContainer = Depends(get_container),
+) -> JobService:
+    """Dependency to get the asynchronous job service."""
+    return container.job_service
+
+
+def get_artifact_store(
+    container: ServiceContainer = Depends(get_container),
+) -> ArtifactStore:
+    """Dependency to get the rendered image artifact store."""
+    return container.artifact_store
+
+
+async def build_diagram_response(
+    images: dict[str, bytes],
+    metadata: dict,
+    return_url: bool,
+    artifact_store: ArtifactStore,
+) -> DiagramResponse:
+    """Build a diagram response, inlining images or publishing them as artifacts.
+
+    The first requested format is the primary image; every format is also
+    listed in ``images``/``image_urls`` when more than one was requested.
+    """
+    start = time.perf_counter()
+    if return_url:
+        urls = {}
+        for fmt, data in images.items():
+            # The file store writes to disk, keep that off the event loop
+            artifact_id = await anyio.to_thread.run_sync(artifact_store.put, data, fmt)
+            urls[fmt] = app.url_path_for("get_diagram", artifact_id=artifact_id)
+        return DiagramResponse(
+            success=True,
+            image_url=next(iter(urls.values())),
+            image_urls=urls if len(urls) > 1 else None,
+            metadata=_with_encode_time(metadata, start),
+        )
+
+    encoded = {fmt: encode_image(data) for fmt, data in images.items()}
+    return DiagramResponse(
+        success=True,
+        image_data=next(iter(encoded.values())),
+        images=encoded if len(encoded) > 1 else None,
+        metadata=_with_encode_time(metadata, start),
+    )
+
+
+def _with_encode_time(metadata: dict, start: float) -> DiagramMetadata:
+    # Copy the timings so cached job metadata is not mutated across requests
+    timings = {**(metadata.get("timings") or {}), "encode": time.perf_counter() - start}
+    return DiagramMetadata(**{**metadata, "timings": timings})
 
 
 @app.post("/api/v1/generate-diagram", response_model=DiagramResponse)
 async def generate_diagram(
     request: DiagramRequest,
     diagram_service: DiagramService = Depends(get_diagram_service),
+    artifact_store: ArtifactStore = Depends(get_artifact_store),
 ):
     """
     Generate diagram image from natural language description.
@@ -52,17 +230,246 @@ async def generate_diagram(
         )
 
     try:
-        image_data, metadata = await diagram_service.generate_diagram_from_description(
-            request.description
-        )
+        formats = normalize_formats(request.format)
+        size_attrs(request.size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
 
-        return DiagramResponse(
-            success=True, image_data=image_data, metadata=DiagramMetadata(**metadata)
+    try:
+        images, metadata = await diagram_service.generate_diagram_images(
+            request.description, formats, request.size
+        )
+        response = await build_diagram_response(
+            images, metadata, request.return_url, artifact_store
         )
+    except RenderQueueFullError as e:
+        logger.warning(f"Rejecting diagram request: {e}")
+        ERRORS.inc(endpoint="generate_diagram", type="queue_full")
+        raise HTTPException(status_code=503, detail=str(e)) from e
     except Exception as e:
         logger.error(f"Error generating diagram: {e}", exc_info=True)
+        ERRORS.inc(endpoint="generate_diagram", type=type(e).__name__)
         raise HTTPException(status_code=500, detail=str(e)) from e
 
+    # Serialize here rather than in FastAPI so the cost shows up in Server-Timing
+    start = time.perf_counter()
+    with tracer.span("serialize"):
+        body = response.model_dump_json()
+    stages = response.metadata.timings if response.metadata else None
+    timings = {**(stages or {}), "serialize": time.perf_counter() - start}
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"Server-Timing": server_timing(timings)},
+    )
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one server-sent event with a JSON payload."""
+    if hasattr(data, "model_dump_json"):
+        payload = data.model_dump_json()
+    else:
+        payload = json.dumps(data)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+@app.post("/api/v1/generate-diagram:stream")
+async def generate_diagram_stream(
+    request: DiagramRequest,
+    diagram_service: DiagramService = Depends(get_diagram_service),
+    artifact_store: ArtifactStore = Depends(get_artifact_store),
+):
+    """
+    Generate a diagram, streaming progress as server-sent events.
+    """
+    if not request.description:
+        raise HTTPException(
+            status_code=400, detail="Invalid diagram description provided"
+        )
+
+    try:
+        formats = normalize_formats(request.format)
+        size_attrs(request.size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for event, data in diagram_service.stream_diagram(
+                request.description, formats, request.size
+            ):
+                if event == "image":
+                    images, metadata = data
+                    response = await build_diagram_response(
+                        images, metadata, request.return_url, artifact_store
+                    )
+                    yield sse_event(event, response)
+                else:
+                    yield sse_event(event, data)
+        except Exception as e:
+            logger.error(f"Error streaming diagram: {e}", exc_info=True)
+            ERRORS.inc(endpoint="generate_diagram_stream", type=type(e).__name__)
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+
+@app.post("/api/v1/generate-diagrams:batch", response_model=BatchDiagramResponse)
+async def generate_diagrams_batch(
+    request: BatchDiagramRequest,
+    batch_service: BatchDiagramService = Depends(get_batch_service),
+    artifact_store: ArtifactStore = Depends(get_artifact_store),
+    settings: Settings = Depends(get_settings),
+):
+    """
+    Generate many diagrams at once, optionally streaming results as NDJSON.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch contains no items")
+    if len(request.items) > settings.batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds the limit of {settings.batch_max_items} items",
+        )
+
+    async def to_result(outcome: BatchOutcome) -> BatchItemResult:
+        if outcome.error is not None:
+            return BatchItemResult(
+                index=outcome.index, success=False, error=outcome.error
+            )
+        return BatchItemResult(
+            index=outcome.index,
+            success=True,
+            result=await build_diagram_response(
+                outcome.images,
+                outcome.metadata,
+                request.items[outcome.index].return_url,
+                artifact_store,
+            ),
+        )
+
+    outcomes = batch_service.run(request.items)
+    if request.stream:
+
+        async def ndjson():
+            async for outcome in outcomes:
+                yield (await to_result(outcome)).model_dump_json() + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    results = [await to_result(outcome) async for outcome in outcomes]
+    return BatchDiagramResponse(results=sorted(results, key=lambda r: r.index))
+
+
+async def build_job_response(job: Job, artifact_store: ArtifactStore) -> JobResponse:
+    """Describe a job, including its diagram once it has succeeded."""
+    result = None
+    if job.images is not None and job.metadata is not None:
+        result = await build_diagram_response(
+            job.images, job.metadata, job.request.return_url, artifact_store
+        )
+    return JobResponse(
+        job_id=job.id,
+        status=job.status,
+        status_url=app.url_path_for("get_job", job_id=job.id),
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        result=result,
+        error=job.error,
+    )
+
+
+@app.post("/api/v1/jobs", response_model=JobResponse, status_code=202)
+async def create_job(
+    request: DiagramRequest,
+    job_service: JobService = Depends(get_job_service),
+    artifact_store: ArtifactStore = Depends(get_artifact_store),
+):
+    """
+    Queue diagram generation and return a job id immediately.
+    """
+    if not request.description:
+        raise HTTPException(
+            status_code=400, detail="Invalid diagram description provided"
+        )
+
+    try:
+        job = job_service.submit(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    return await build_job_response(job, artifact_store)
+
+
+@app.get("/api/v1/jobs/{job_id}", response_model=JobResponse, name="get_job")
+async def get_job(
+    job_id: str,
+    job_service: JobService = Depends(get_job_service),
+    artifact_store: ArtifactStore = Depends(get_artifact_store),
+):
+    """
+    Return the status of a job and its result once finished.
+    """
+    job = job_service.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return await build_job_response(job, artifact_store)
+
+
+@app.get("/api/v1/diagrams/{artifact_id}", name="get_diagram")
+async def get_diagram(
+    artifact_id: str,
+    if_none_match: str | None = Header(default=None),
+    artifact_store: ArtifactStore = Depends(get_artifact_store),
+):
+    """
+    Serve a rendered diagram image by its content-addressed id.
+    """
+    if not artifact_store.is_valid_id(artifact_id):
+        raise HTTPException(status_code=404, detail="Diagram not found")
+
+    etag = f'"{artifact_id.split(".", 1)[0]}"'
+    # Content never changes, but the URL only lives as long as the retention
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={int(artifact_store.retention)}",
+    }
+    if if_none_match and (
+        if_none_match.strip() == "*"
+        or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    ):
+        return Response(status_code=304, headers=headers)
+
+    media_type = artifact_store.media_type(artifact_id)
+    path = artifact_store.path(artifact_id)
+    if path is not None:
+        return FileResponse(path, media_type=media_type, headers=headers)
+
+    data = artifact_store.get(artifact_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Diagram not found")
+    return Response(content=data, media_type=media_type, headers=headers)
+
+
+@app.get("/api/v1/stats")
+async def stats(container: ServiceContainer = Depends(get_container)):
+    """
+    Report cache, render queue, job and request coalescing counters.
+    """
+    return container.stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Expose request, LLM, render and cache metrics in the Prometheus text format.
+    """
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 
 @app.post("/api/v1/assistant", response_model=AssistantResponse)
 async def assistant(
@@ -76,3 +483,28 @@ async def assistant(
         raise HTTPException(status_code=400, detail="Invalid message provided")
 
     return await assistant_service.process_message(request)
+
+
+@app.post("/api/v1/assistant:stream")
+async def assistant_stream(
+    request: AssistantRequest,
+    assistant_service: AssistantService = Depends(get_assistant_service),
+):
+    """
+    Assistant endpoint streaming intent, progress and the reply as server-sent events.
+    """
+    if not request.message:
+        raise HTTPException(status_code=400, detail="Invalid message provided")
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for event, data in assistant_service.stream_message(request):
+                yield sse_event(event, data)
+        except Exception as e:
+            logger.error(f"Error streaming assistant reply: {e}", exc_info=True)
+            ERRORS.inc(endpoint="assistant_stream", type=type(e).__name__)
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers=SSE_HEADERS
+    )
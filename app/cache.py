@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any, Generic, TypeVar
+
+__all__ = ["LRUCache"]
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Thread-safe in-memory LRU cache bounded by item count and optional size.
+
+    Entries optionally expire ``ttl`` seconds after they were stored.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 128,
+        max_bytes: int | None = None,
+        sizeof: Callable[[V], int] | None = None,
+        ttl: float | None = None,
+    ) -> None:
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sizeof = sizeof or len  # type: ignore[assignment]
+        self._data: OrderedDict[K, tuple[V, int, float | None]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: K) -> V | None:
+        """Return the cached value and mark it as recently used."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at = entry[2]
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self._bytes -= entry[1]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        """Store a value, evicting least recently used entries when over bounds.
+
+        ``ttl`` overrides the cache's TTL for this entry.
+        """
+        size = self._sizeof(value) if self.max_bytes is not None else 0
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = (value, size, expires_at)
+            self._bytes += size
+            while len(self._data) > self.maxsize or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def pop(self, key: K) -> V | None:
+        """Remove a value from the cache and return it."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return None
+            self._bytes -= entry[1]
+            return entry[0]
+
+    def clear(self) -> None:
+        """Drop all cached values."""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __contains__(self, key: object) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, Any]:
+        """Return hit, miss and eviction counters along with current size."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "size": len(self._data),
+            "bytes": self._bytes,
+        }
@@ -29,6 +29,235 @@ class Settings(BaseSettings):
     google_cloud_location: str = Field(
         default="us-central1", description="Google Cloud location for Vertex AI"
     )
+    llm_mode: str = Field(
+        default="live",
+        description="LLM client: live, record (live + write cassette), replay or stub",
+    )
+    llm_cassette_path: str = Field(
+        default="llm_cassette.jsonl",
+        description="JSON-lines cassette written by record and read by replay",
+    )
+    llm_replay_latency: float = Field(
+        default=0.0,
+        description="Synthetic replay/stub latency in seconds (negative replays recorded latency)",
+    )
+    llm_replay_jitter: float = Field(
+        default=0.0, description="Uniform +/- jitter in seconds added to replay latency"
+    )
+    llm_stub_nodes: int = Field(
+        default=8, description="Nodes in each analysis returned by the stub LLM"
+    )
+    llm_structured_output: bool = Field(
+        default=True,
+        description="Ask Gemini for JSON constrained to the analysis/intent schemas",
+    )
+    assistant_fused_call: bool = Field(
+        default=True,
+        description="Detect intent and analyze the diagram in one LLM call",
+    )
+    intent_fast_path: bool = Field(
+        default=True,
+        description="Classify obvious assistant messages locally without the LLM",
+    )
+    intent_fast_path_threshold: float = Field(
+        default=0.9, description="Minimum local classifier confidence to skip the LLM"
+    )
+    llm_timeout: float = Field(
+        default=20.0, description="Seconds allowed for a single LLM request attempt"
+    )
+    llm_deadline: float = Field(
+        default=45.0, description="Seconds allowed for an LLM call including retries"
+    )
+    llm_max_attempts: int = Field(
+        default=3, description="LLM attempts per call on timeouts and transient errors"
+    )
+    llm_backoff_base: float = Field(
+        default=0.5, description="Base of the jittered exponential retry backoff"
+    )
+    llm_backoff_max: float = Field(
+        default=8.0, description="Maximum retry backoff in seconds"
+    )
+    llm_hedge: bool = Field(
+        default=False,
+        description="Send a second LLM request when the first runs past the hedge delay",
+    )
+    llm_hedge_quantile: float = Field(
+        default=0.95, description="Recent latency quantile used as the hedge delay"
+    )
+    llm_hedge_min_delay: float = Field(
+        default=1.0, description="Minimum seconds to wait before hedging"
+    )
+    llm_max_concurrency: int = Field(
+        default=16, description="Maximum concurrent LLM requests per process"
+    )
+    llm_rpm: int = Field(
+        default=0, description="LLM requests-per-minute quota (0 disables the limit)"
+    )
+    llm_tpm: int = Field(
+        default=0, description="LLM tokens-per-minute quota (0 disables the limit)"
+    )
+    llm_rate_burst: float = Field(
+        default=10.0, description="Seconds worth of LLM quota usable in one burst"
+    )
+    llm_breaker_failures: int = Field(
+        default=5,
+        description="Consecutive LLM failures that open the circuit breaker",
+    )
+    llm_breaker_reset: float = Field(
+        default=30.0, description="Seconds the breaker stays open before a probe"
+    )
+    tracing_exporter: str = Field(
+        default="none", description="Span exporter: none, console, file or otlp"
+    )
+    tracing_file_path: str = Field(
+        default="traces.jsonl",
+        description="JSON-lines file written by the file exporter",
+    )
+    tracing_otlp_endpoint: str = Field(
+        default="http://localhost:4318/v1/traces",
+        description="OTLP/HTTP traces endpoint of an OpenTelemetry collector",
+    )
+    tracing_service_name: str = Field(
+        default="diagram-api", description="service.name reported with exported spans"
+    )
+    node_providers: str = Field(
+        default="aws,gcp,azure,k8s,onprem,generic",
+        description="diagrams providers searched for node types, in priority order",
+    )
+    node_index_path: str = Field(
+        default="",
+        description="Cached node type alias index (defaults to <tmp_dir>/node-index.json)",
+    )
+    server_host: str = Field(
+        default="0.0.0.0", description="Address the pre-fork server listens on"
+    )
+    server_port: int = Field(default=8000, description="Port of the pre-fork server")
+    server_workers: int = Field(
+        default=0, description="Pre-fork server workers (0 uses one per CPU core)"
+    )
+    server_max_requests: int = Field(
+        default=0,
+        description="Requests a worker serves before it is recycled (0 disables)",
+    )
+    server_max_requests_jitter: int = Field(
+        default=0,
+        description="Random extra requests so workers recycle at different times",
+    )
+    server_worker_memory_mb: float = Field(
+        default=0,
+        description="Private memory in MB above which a worker is recycled (0 disables)",
+    )
+    server_graceful_timeout: float = Field(
+        default=30.0,
+        description="Seconds a recycled worker gets to finish its requests",
+    )
+    render_cache_enabled: bool = Field(
+        default=True, description="Cache rendered diagrams by analysis content hash"
+    )
+    render_cache_memory_items: int = Field(
+        default=256, description="Maximum number of renders kept in memory"
+    )
+    render_cache_dir: str = Field(
+        default="",
+        description="Shared on-disk render cache directory (defaults to <tmp_dir>/render-cache)",
+    )
+    render_cache_disk_bytes: int = Field(
+        default=256 * 1024 * 1024,
+        description="Maximum size of the on-disk render cache in bytes (0 disables it)",
+    )
+    render_backend: str = Field(
+        default="process", description="Render executor backend: process or thread"
+    )
+    render_workers: int = Field(
+        default=0, description="Number of render workers (0 uses one per CPU core)"
+    )
+    render_queue_size: int = Field(
+        default=32, description="Render jobs allowed to wait beyond busy workers"
+    )
+    render_pipeline: str = Field(
+        default="memory",
+        description="Render pipeline: memory (graphviz over pipes) or file (tmp_dir)",
+    )
+    tmp_janitor_interval: float = Field(
+        default=300.0,
+        description="Seconds between orphaned tmp file sweeps (0 disables)",
+    )
+    tmp_janitor_max_age: float = Field(
+        default=600.0, description="Age in seconds after which tmp files are orphans"
+    )
+    artifact_store: str = Field(
+        default="file", description="Rendered image store backend: file or memory"
+    )
+    artifact_dir: str = Field(
+        default="",
+        description="Directory for the file artifact store (defaults to <tmp_dir>/artifacts)",
+    )
+    artifact_max_bytes: int = Field(
+        default=512 * 1024 * 1024, description="Maximum size of stored artifacts"
+    )
+    artifact_retention: float = Field(
+        default=86400.0,
+        description="Seconds an image URL stays valid after it was last handed out",
+    )
+    batch_max_items: int = Field(
+        default=500, description="Maximum number of items in one batch request"
+    )
+    batch_analysis_concurrency: int = Field(
+        default=8, description="Concurrent LLM analyses across batch requests"
+    )
+    batch_render_concurrency: int = Field(
+        default=4, description="Concurrent renders across batch requests"
+    )
+    batch_item_timeout: float = Field(
+        default=120.0, description="Timeout in seconds for a single batch item"
+    )
+    job_workers: int = Field(
+        default=4, description="Background workers processing asynchronous jobs"
+    )
+    job_queue_size: int = Field(
+        default=1000, description="Maximum number of queued asynchronous jobs"
+    )
+    job_retention: float = Field(
+        default=3600.0, description="Seconds finished jobs are kept for polling"
+    )
+    job_max_jobs: int = Field(
+        default=10000, description="Maximum number of jobs tracked at once"
+    )
+    job_max_bytes: int = Field(
+        default=256 * 1024 * 1024,
+        description="Maximum image bytes held by finished jobs awaiting polling",
+    )
+    analysis_cache_enabled: bool = Field(
+        default=True, description="Cache parsed LLM analysis results"
+    )
+    analysis_cache_max_items: int = Field(
+        default=1024, description="Maximum number of cached analysis results"
+    )
+    analysis_cache_ttl: float = Field(
+        default=86400.0, description="Analysis cache entry lifetime in seconds"
+    )
+    analysis_cache_db_path: str = Field(
+        default="",
+        description="SQLite file backing the analysis cache (empty keeps it in memory)",
+    )
+    conversation_store: str = Field(
+        default="memory",
+        description="Assistant conversation store backend: memory or sqlite",
+    )
+    conversation_max_items: int = Field(
+        default=10000, description="Maximum number of stored conversations"
+    )
+    conversation_ttl: float = Field(
+        default=3600.0, description="Seconds an idle conversation is kept"
+    )
+    conversation_max_bytes: int = Field(
+        default=64 * 1024 * 1024,
+        description="Maximum size of the in-memory conversation store in bytes",
+    )
+    conversation_db_path: str = Field(
+        default="",
+        description="SQLite conversation store file (defaults to <tmp_dir>/conversations.sqlite3)",
+    )
 
 
 # Global settings instance
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from typing import Any
+
+import anyio
+import graphviz
+
+from app.agents.analysis_cache import AnalysisCache
+from app.agents.assistant_agent import AssistantAgent, IntentClassifier
+from app.agents.diagram_agent import DiagramAgent
+from app.config import Settings
+from app.llm import client, llm_caller
+from app.logging import get_logger
+from app.services.artifact_store import create_artifact_store
+from app.services.assistant_service import AssistantService
+from app.services.batch_service import BatchDiagramService
+from app.services.conversation_store import create_conversation_store
+from app.services.diagram_service import DiagramService
+from app.services.job_service import JobService
+from app.services.render_cache import RenderCache
+from app.services.render_engine import RenderEngine
+from app.services.renderer import cleanup_orphans
+from app.tracing import tracer
+
+__all__ = ["ServiceContainer"]
+
+logger = get_logger(__name__)
+
+
+class ServiceContainer:
+    """Application-scoped holder for shared services, agents and caches.
+
+    Built once per process by the FastAPI lifespan so that request handlers
+    reuse the same instances instead of constructing them per request.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self.render_cache = (
+            RenderCache.from_settings(settings)
+            if settings.render_cache_enabled
+            else None
+        )
+        self.analysis_cache = (
+            AnalysisCache.from_settings(settings)
+            if settings.analysis_cache_enabled
+            else None
+        )
+        self.render_engine = RenderEngine.from_settings(settings)
+        self.artifact_store = create_artifact_store(settings)
+        self.conversation_store = create_conversation_store(settings)
+        self.diagram_agent = DiagramAgent(self.analysis_cache)
+        self.assistant_agent = AssistantAgent(
+            IntentClassifier.from_settings(settings)
+            if settings.intent_fast_path
+            else None
+        )
+        self.diagram_service = DiagramService(
+            settings,
+            render_cache=self.render_cache,
+            agent=self.diagram_agent,
+            render_engine=self.render_engine,
+        )
+        self.batch_service = BatchDiagramService.from_settings(
+            settings, self.diagram_service
+        )
+        self.job_service = JobService.from_settings(settings, self.diagram_service)
+        self._janitor: asyncio.Task | None = None
+        self.assistant_service = AssistantService(
+            settings,
+            assistant_agent=self.assistant_agent,
+            diagram_service=self.diagram_service,
+            conversation_store=self.conversation_store,
+        )
+
+    async def startup(self) -> None:
+        """Warm up graphviz and the GenAI client before serving traffic."""
+        try:
+            version = await anyio.to_thread.run_sync(graphviz.version)
+            logger.info(f"Graphviz {'.'.join(map(str, version))} available")
+        except (graphviz.ExecutableNotFound, RuntimeError) as e:
+            logger.warning(f"Graphviz warm-up failed: {e}")
+
+        await self.render_engine.start()
+        self.job_service.start()
+        if self.settings.tmp_janitor_interval > 0:
+            self._janitor = asyncio.create_task(self._run_janitor())
+
+        # Touch the async models API so its transport is initialized up front
+        _ = client.aio.models
+        logger.info("Service container started")
+
+    async def shutdown(self) -> None:
+        """Release resources held by shared services."""
+        if self._janitor is not None:
+            self._janitor.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._janitor
+            self._janitor = None
+        await self.job_service.stop()
+        self.render_engine.shutdown()
+        if self.analysis_cache is not None:
+            self.analysis_cache.close()
+        self.conversation_store.close()
+        tracer.flush()
+        logger.info("Service container stopped")
+
+    def stats(self) -> dict[str, Any]:
+        """Collect counters from every shared component."""
+        return {
+            "render_cache": (
+                self.render_cache.stats() if self.render_cache is not None else None
+            ),
+            "analysis_cache": (
+                self.analysis_cache.stats() if self.analysis_cache is not None else None
+            ),
+            "render_engine": self.render_engine.stats(),
+            "jobs": self.job_service.stats(),
+            "conversations": self.conversation_store.stats(),
+            "llm_parsing": {
+                "analysis": self.diagram_agent.parse_stats,
+                "intent": self.assistant_agent.parse_stats,
+                "fused_calls": self.assistant_service.fused_stats,
+            },
+            "intent_routing": self.assistant_agent.routing_stats,
+            "coalescing": {
+                "analysis": self.diagram_agent.inflight.stats(),
+                "render": self.diagram_service.render_flight.stats(),
+            },
+            "llm_calls": llm_caller.stats(),
+            "tracing": tracer.stats(),
+        }
+
+    async def _run_janitor(self) -> None:
+        """Periodically remove render files orphaned in the tmp dir."""
+        while True:
+            try:
+                await anyio.to_thread.run_sync(
+                    cleanup_orphans,
+                    self.settings.tmp_dir,
+                    self.settings.tmp_janitor_max_age,
+                )
+            except OSError as e:
+                logger.warning(f"Tmp dir cleanup failed: {e}")
+            await asyncio.sleep(self.settings.tmp_janitor_interval)
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import json
+import re
+from collections.abc import Iterator
+from typing import Any
+
+__all__ = ["loads_lenient"]
+
+_FENCE = re.compile(r"```(?:json)?")
+
+# How many truncation points to try, newest first, before giving up
+_MAX_CUTS = 32
+
+
+def loads_lenient(text: str) -> tuple[Any, bool]:
+    """Parse JSON from an LLM reply, repairing it if needed.
+
+    Handles markdown fences, prose around the JSON, trailing commas and
+    replies truncated mid-value, in which case the incomplete tail is
+    dropped. Returns ``(value, repaired)`` and raises ValueError if nothing
+    usable can be recovered.
+    """
+    stripped = _FENCE.sub("", text).strip()
+    try:
+        return json.loads(stripped), False
+    except json.JSONDecodeError:
+        pass
+
+    start = min(
+        (i for i in (stripped.find("{"), stripped.find("[")) if i != -1), default=-1
+    )
+    if start == -1:
+        raise ValueError("No JSON object found in LLM response.")
+    body = stripped[start:]
+    try:
+        # A complete value followed by trailing prose
+        return json.JSONDecoder().raw_decode(body)[0], True
+    except json.JSONDecodeError:
+        pass
+
+    for candidate in _repairs(body):
+        try:
+            return json.loads(candidate), True
+        except json.JSONDecodeError:
+            continue
+    raise ValueError("Failed to decode LLM response as JSON.")
+
+
+def _strip_trailing_comma(out: list[str]) -> None:
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def _close(prefix: list[str], stack: list[str]) -> str:
+    out = list(prefix)
+    _strip_trailing_comma(out)
+    return "".join(out) + "".join(reversed(stack))
+
+
+def _repairs(body: str) -> Iterator[str]:
+    """Yield repaired candidates: the whole text closed, then shorter prefixes."""
+    out: list[str] = []
+    stack: list[str] = []
+    # Points where the text can be cut and closed: (output length, open containers)
+    cuts: list[tuple[int, list[str]]] = []
+    in_string = escape = False
+    for ch in body:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+            cuts.append((len(out), list(stack)))
+        elif ch in "}]":
+            _strip_trailing_comma(out)
+            if stack and stack[-1] == ch:
+                stack.pop()
+                out.append(ch)
+            if not stack:
+                break
+        elif ch == ",":
+            cuts.append((len(out), list(stack)))
+            out.append(ch)
+        else:
+            out.append(ch)
+
+    if in_string:
+        if escape:
+            out.pop()
+        out.append('"')
+    yield _close(out, stack)
+    for length, open_stack in reversed(cuts[-_MAX_CUTS:]):
+        yield _close(out[:length], open_stack)
@@ -1,17 +1,584 @@
 from __future__ import annotations
 
-from google import genai
+import asyncio
+import hashlib
+import importlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from collections.abc import Awaitable, Callable
+from typing import TYPE_CHECKING, Any, TypeVar
 
-from app.config import settings
+from pydantic import BaseModel
 
-__all__ = ["client"]
+from app.config import Settings, settings
+from app.llm_scheduler import LLMScheduler, current_lane
+from app.logging import get_logger
+from app.metrics import LLM_CALL_EVENTS
+from app.tracing import current_span
 
-# Configure the GenAI client with fallback to Vertex AI
-if settings.use_vertex_ai and settings.google_cloud_project:
-    client = genai.Client(
-        vertexai=True,
-        project=settings.google_cloud_project,
-        location=settings.google_cloud_location,
+if TYPE_CHECKING:
+    from google import genai
+    from google.genai import types
+
+__all__ = [
+    "CassetteClient",
+    "CassetteMissError",
+    "CassetteResponse",
+    "CircuitBreaker",
+    "LazyClient",
+    "LLMCaller",
+    "LLMUnavailableError",
+    "StubClient",
+    "client",
+    "create_client",
+    "json_config",
+    "llm_caller",
+]
+
+logger = get_logger(__name__)
+
+LLM_MODES = ("live", "record", "replay", "stub")
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+class CassetteResponse:
+    """Replayed response exposing the ``text`` attribute the agents read."""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: str | None) -> None:
+        self.text = text
+
+
+class _Models:
+    """``client.aio.models`` facade delegating to an offline client."""
+
+    def __init__(self, owner: Any) -> None:
+        self._owner = owner
+
+    async def generate_content(
+        self, *, model: str, contents: Any, config: Any = None
+    ) -> Any:
+        return await self._owner.generate_content(
+            model=model, contents=contents, config=config
+        )
+
+
+class _Aio:
+    def __init__(self, owner: Any) -> None:
+        self.models = _Models(owner)
+
+
+async def _synthetic_delay(latency: float, jitter: float) -> None:
+    delay = latency + random.uniform(-jitter, jitter)
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+
+class CassetteClient:
+    """Stand-in for ``genai.Client`` that records or replays LLM calls.
+
+    In ``record`` mode each request is forwarded to ``live`` and the prompt,
+    reply text and latency are appended to a JSON-lines cassette. In
+    ``replay`` mode replies come from the cassette after a synthetic delay of
+    ``latency`` seconds plus uniform ``jitter``; a negative ``latency``
+    replays the recorded latency instead. Requests recorded several times
+    are replayed in rotation.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mode: str = "replay",
+        live: Any = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+    ) -> None:
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unsupported cassette mode '{mode}'")
+        if mode == "record" and live is None:
+            raise ValueError("Recording needs a live client")
+        self.path = path
+        self.mode = mode
+        self.live = live
+        self.latency = latency
+        self.jitter = jitter
+        self.aio = _Aio(self)
+        self._lock = threading.Lock()
+        self._entries: dict[str, list[dict[str, Any]]] = defaultdict(list)
+        self._cursors: dict[str, int] = defaultdict(int)
+        if mode == "replay":
+            self._load()
+
+    @staticmethod
+    def request_key(model: str, contents: Any, config: Any = None) -> str:
+        """Stable key for a request: model, prompt and response schema."""
+        schema = getattr(config, "response_schema", None)
+        payload = json.dumps(
+            {
+                "model": model,
+                "contents": contents,
+                "schema": getattr(schema, "__name__", None),
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _load(self) -> None:
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+        logger.info(
+            f"Loaded {len(self._entries)} recorded LLM requests from {self.path}"
+        )
+
+    async def generate_content(
+        self, *, model: str, contents: Any, config: Any = None
+    ) -> Any:
+        key = self.request_key(model, contents, config)
+        if self.mode == "record":
+            return await self._record(key, model, contents, config)
+
+        entries = self._entries.get(key)
+        if not entries:
+            raise CassetteMissError(
+                f"No recorded LLM response for request {key[:12]} in {self.path}"
+            )
+        entry = entries[self._cursors[key] % len(entries)]
+        self._cursors[key] += 1
+        latency = entry["latency"] if self.latency < 0 else self.latency
+        await _synthetic_delay(latency, self.jitter)
+        return CassetteResponse(entry["text"])
+
+    async def _record(self, key: str, model: str, contents: Any, config: Any) -> Any:
+        start = time.perf_counter()
+        response = await self.live.aio.models.generate_content(
+            model=model, contents=contents, config=config
+        )
+        entry = {
+            "key": key,
+            "model": model,
+            "contents": contents,
+            "text": response.text,
+            "latency": time.perf_counter() - start,
+        }
+        line = json.dumps(entry, default=str) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+        return response
+
+
+class StubClient:
+    """Offline stand-in for ``genai.Client`` that answers with canned replies.
+
+    Intent prompts are answered with a generate_diagram intent for the
+    message (with an analysis when the fused prompt asks for one), and
+    analysis prompts with a chain of ``nodes`` components, after
+    ``latency`` seconds plus uniform ``jitter``. Meant for load tests.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, nodes: int = 8):
+        self.latency = max(latency, 0.0)
+        self.jitter = jitter
+        self.nodes = nodes
+        self.aio = _Aio(self)
+
+    async def generate_content(
+        self, *, model: str, contents: Any, config: Any = None
+    ) -> Any:
+        await _synthetic_delay(self.latency, self.jitter)
+        return CassetteResponse(json.dumps(self.reply(str(contents))))
+
+    def reply(self, prompt: str) -> dict[str, Any]:
+        """Build the canned reply for a prompt."""
+        message = _STUB_MESSAGE.search(prompt)
+        text = message.group(1).strip() if message else ""
+        if "Possible intents are" not in prompt:
+            return self.analysis()
+        reply: dict[str, Any] = {"intent": "generate_diagram", "description": text}
+        if '"analysis"' in prompt:
+            reply["analysis"] = self.analysis()
+        return reply
+
+    def analysis(self) -> dict[str, Any]:
+        types = ("alb", "ec2", "lambda", "sqs", "rds", "s3")
+        nodes = [
+            {"id": f"n{i}", "type": types[i % len(types)], "label": f"Component {i}"}
+            for i in range(self.nodes)
+        ]
+        connections = [
+            {"source": f"n{i}", "target": f"n{i + 1}"} for i in range(self.nodes - 1)
+        ]
+        clusters = [{"label": "Tier", "nodes": [n["id"] for n in nodes[1:3]]}]
+        return {"nodes": nodes, "clusters": clusters, "connections": connections}
+
+
+_STUB_MESSAGE = re.compile(r'(?:Message|Description): """(.*?)"""', re.DOTALL)
+
+
+def _live_client(settings: Settings) -> genai.Client:
+    # Importing google.genai takes most of a second, so only live modes pay it
+    genai = importlib.import_module("google.genai")
+    # Configure the GenAI client with fallback to Vertex AI
+    if settings.use_vertex_ai and settings.google_cloud_project:
+        return genai.Client(
+            vertexai=True,
+            project=settings.google_cloud_project,
+            location=settings.google_cloud_location,
+        )
+    return genai.Client(api_key=settings.gemini_api_key)
+
+
+def create_client(settings: Settings) -> Any:
+    """Build the LLM client selected by ``LLM_MODE``."""
+    if settings.llm_mode not in LLM_MODES:
+        raise ValueError(
+            f"Unsupported LLM_MODE '{settings.llm_mode}', expected one of {', '.join(LLM_MODES)}"
+        )
+    if settings.llm_mode == "live":
+        return _live_client(settings)
+    if settings.llm_mode == "stub":
+        return StubClient(
+            latency=settings.llm_replay_latency,
+            jitter=settings.llm_replay_jitter,
+            nodes=settings.llm_stub_nodes,
+        )
+    return CassetteClient(
+        settings.llm_cassette_path,
+        mode=settings.llm_mode,
+        live=_live_client(settings) if settings.llm_mode == "record" else None,
+        latency=settings.llm_replay_latency,
+        jitter=settings.llm_replay_jitter,
+    )
+
+
+class LazyClient:
+    """Builds the LLM client on first attribute access.
+
+    Keeps importing this module cheap for processes that never call the
+    LLM, such as render workers and CLI tools.
+    """
+
+    def __init__(self, factory: Callable[[], Any]) -> None:
+        self._factory = factory
+        self._client: Any = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        """The underlying client, building it if needed."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+
+client = LazyClient(lambda: create_client(settings))
+
+
+def json_config(schema: type[BaseModel]) -> types.GenerateContentConfig | None:
+    """Request config constraining the reply to JSON matching ``schema``."""
+    if not settings.llm_structured_output:
+        return None
+    types = importlib.import_module("google.genai.types")
+    return types.GenerateContentConfig(
+        response_mime_type="application/json", response_schema=schema
     )
-else:
-    client = genai.Client(api_key=settings.gemini_api_key)
+
+
+T = TypeVar("T")
+
+# HTTP status codes worth retrying: timeouts, rate limits and server errors
+_TRANSIENT_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class LLMUnavailableError(RuntimeError):
+    """Raised when the LLM upstream is degraded and callers should fall back."""
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether an LLM call error is likely to succeed on retry."""
+    # Only loaded once a live client exists; without it no API error can occur
+    errors = sys.modules.get("google.genai.errors")
+    if errors is not None and isinstance(error, errors.APIError):
+        return error.code in _TRANSIENT_CODES
+    return isinstance(error, (TimeoutError, ConnectionError))
+
+
+class CircuitBreaker:
+    """Stops calling a degraded upstream until it has had time to recover.
+
+    After ``failure_threshold`` consecutive transient failures the breaker
+    opens and calls are refused for ``reset_timeout`` seconds. Then a single
+    probe call is let through (half-open): success closes the breaker,
+    failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probe_started: float | None = None
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now."""
+        state = self.state
+        if state == "closed":
+            return True
+        now = time.monotonic()
+        # A probe that never reported back (e.g. cancelled) is given up on
+        if state == "half_open" and (
+            self._probe_started is None
+            or now - self._probe_started >= self.reset_timeout
+        ):
+            self._probe_started = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probe_started is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                self.trips += 1
+            self.opened_at = time.monotonic()
+            self._probe_started = None
+
+
+class LLMCaller:
+    """Runs LLM calls with deadlines, retries, hedging and a circuit breaker.
+
+    Each attempt gets at most ``timeout`` seconds and the whole call at most
+    ``deadline`` seconds. Transient failures are retried up to
+    ``max_attempts`` times with full-jitter exponential backoff. With
+    ``hedge`` enabled, an attempt still running after the recent
+    ``hedge_quantile`` latency (but no sooner than ``hedge_min_delay``)
+    gets a second identical request and the first reply wins. Every attempt
+    first waits for its turn on the ``scheduler``, which enforces the
+    concurrency cap, rate limits and lane priority.
+
+    When the breaker is open, the deadline is exceeded or retries run out,
+    :class:`LLMUnavailableError` is raised so callers can fall back to
+    their heuristics. Other errors propagate unchanged.
+    """
+
+    def __init__(
+        self,
+        *,
+        timeout: float = 20.0,
+        deadline: float = 45.0,
+        max_attempts: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_delay: float = 1.0,
+        scheduler: LLMScheduler | None = None,
+        breaker: CircuitBreaker | None = None,
+    ) -> None:
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_attempts = max(max_attempts, 1)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.scheduler = scheduler or LLMScheduler()
+        self.breaker = breaker or CircuitBreaker()
+        self._latencies: deque[float] = deque(maxlen=200)
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+        self.short_circuited = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> LLMCaller:
+        """Build an LLM caller from application settings."""
+        return cls(
+            timeout=settings.llm_timeout,
+            deadline=settings.llm_deadline,
+            max_attempts=settings.llm_max_attempts,
+            backoff_base=settings.llm_backoff_base,
+            backoff_max=settings.llm_backoff_max,
+            hedge=settings.llm_hedge,
+            hedge_quantile=settings.llm_hedge_quantile,
+            hedge_min_delay=settings.llm_hedge_min_delay,
+            scheduler=LLMScheduler.from_settings(settings),
+            breaker=CircuitBreaker(
+                settings.llm_breaker_failures, settings.llm_breaker_reset
+            ),
+        )
+
+    def hedge_delay(self) -> float | None:
+        """Seconds to wait before hedging, or None when hedging is off."""
+        if not self.hedge or len(self._latencies) < 20:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(int(len(ordered) * self.hedge_quantile), len(ordered) - 1)
+        return max(ordered[index], self.hedge_min_delay)
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number ``attempt`` (1-based)."""
+        cap = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return random.uniform(0, cap)
+
+    async def call(self, fn: Callable[[], Awaitable[T]], *, tokens: int = 0) -> T:
+        """Run ``fn`` (which starts one LLM request) under the call policy.
+
+        ``tokens`` is the estimated usage of one request, reserved against
+        the tokens-per-minute limit and corrected once the reply reports
+        its actual usage. The lane comes from :func:`llm_lane`.
+        """
+        self.calls += 1
+        lane = current_lane()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        last_error: BaseException | None = None
+        for attempt in range(1, self.max_attempts + 1):
+            if not self.breaker.allow():
+                self.short_circuited += 1
+                LLM_CALL_EVENTS.inc(event="short_circuit")
+                raise LLMUnavailableError("LLM circuit breaker is open")
+            try:
+                async with asyncio.timeout_at(deadline):
+                    await self.scheduler.acquire(lane, tokens)
+            except TimeoutError:
+                # Local queueing says nothing about the upstream's health
+                raise LLMUnavailableError(
+                    f"No LLM capacity in the {lane} lane before the deadline"
+                ) from None
+            if span := current_span():
+                span.set_attribute("llm.attempts", attempt)
+                span.set_attribute("llm.lane", lane)
+            try:
+                result = await self._attempt(
+                    fn, min(self.timeout, deadline - loop.time()), tokens
+                )
+            except Exception as e:
+                last_error = e
+            else:
+                last_error = None
+            finally:
+                self.scheduler.release()
+            if last_error is None:
+                self.breaker.record_success()
+                self._reconcile(result, tokens)
+                return result
+            if not is_transient(last_error):
+                # The request itself is bad; the upstream is not degraded
+                self.breaker.record_success()
+                raise last_error
+            if isinstance(last_error, TimeoutError):
+                self.timeouts += 1
+                LLM_CALL_EVENTS.inc(event="timeout")
+            self.breaker.record_failure()
+            if attempt == self.max_attempts:
+                break
+            delay = self.backoff(attempt)
+            if loop.time() + delay >= deadline:
+                break
+            self.retries += 1
+            LLM_CALL_EVENTS.inc(event="retry")
+            logger.warning(
+                f"LLM call failed ({last_error!r}), retrying in {delay:.2f}s"
+            )
+            await asyncio.sleep(delay)
+        raise LLMUnavailableError(
+            f"LLM unavailable after {attempt} attempts: {last_error!r}"
+        ) from last_error
+
+    def _reconcile(self, response: Any, tokens: int) -> None:
+        usage = getattr(response, "usage_metadata", None)
+        actual = getattr(usage, "total_token_count", None)
+        if isinstance(actual, int) and tokens:
+            self.scheduler.charge(actual - tokens)
+
+    async def _attempt(
+        self, fn: Callable[[], Awaitable[T]], timeout: float, tokens: int = 0
+    ) -> T:
+        """One attempt, hedged with a second request if it runs long."""
+        start = time.perf_counter()
+        tasks = [asyncio.ensure_future(fn())]
+        try:
+            async with asyncio.timeout(timeout):
+                delay = self.hedge_delay()
+                if delay is not None and delay < timeout:
+                    done, _ = await asyncio.wait(tasks, timeout=delay)
+                    if not done:
+                        self.hedges += 1
+                        LLM_CALL_EVENTS.inc(event="hedge")
+                        # The hedge spends quota without waiting its turn
+                        self.scheduler.charge(tokens, requests=1)
+                        tasks.append(asyncio.ensure_future(fn()))
+                pending = set(tasks)
+                while True:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        if task.exception() is None:
+                            if task is not tasks[0]:
+                                self.hedge_wins += 1
+                                LLM_CALL_EVENTS.inc(event="hedge_win")
+                            self._latencies.append(time.perf_counter() - start)
+                            return task.result()
+                    if not pending:
+                        # Every request failed; raise the primary's error
+                        return tasks[0].result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # mark the losing request's error retrieved
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "timeouts": self.timeouts,
+            "short_circuited": self.short_circuited,
+            "breaker": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+            "hedge_delay": self.hedge_delay(),
+            "scheduler": self.scheduler.stats(),
+        }
+
+
+llm_caller = LLMCaller.from_settings(settings)
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import time
+from collections.abc import Iterator
+from contextvars import ContextVar
+from typing import Any
+
+from app.config import Settings
+from app.metrics import LLM_QUEUE_WAIT_SECONDS
+
+__all__ = [
+    "LANES",
+    "LLMScheduler",
+    "TokenBucket",
+    "current_lane",
+    "estimate_tokens",
+    "llm_lane",
+]
+
+# Lanes in priority order: interactive requests are always dispatched first
+LANES = ("interactive", "bulk")
+
+# Rough reply size assumed before the actual usage is known
+_REPLY_TOKENS_ESTIMATE = 1024
+
+_lane: ContextVar[str] = ContextVar("llm_lane", default="interactive")
+
+
+def current_lane() -> str:
+    """Lane that LLM calls made in the current context are scheduled in."""
+    return _lane.get()
+
+
+@contextlib.contextmanager
+def llm_lane(lane: str) -> Iterator[None]:
+    """Schedule LLM calls made inside the ``with`` block in ``lane``.
+
+    Tasks created inside the block inherit the lane.
+    """
+    if lane not in LANES:
+        raise ValueError(f"Unknown LLM lane '{lane}'")
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def estimate_tokens(prompt: str) -> int:
+    """Estimate the tokens one call will use: ~4 characters per prompt token."""
+    return len(prompt) // 4 + _REPLY_TOKENS_ESTIMATE
+
+
+class TokenBucket:
+    """Refills at ``per_minute / 60`` units per second up to ``capacity``.
+
+    The level may go negative when a call turns out more expensive than
+    estimated; later requests then wait for the debt to be repaid.
+    """
+
+    def __init__(self, per_minute: float, capacity: float) -> None:
+        self.rate = per_minute / 60.0
+        self.capacity = max(capacity, 1.0)
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until ``amount`` can be taken (0 if it can be now)."""
+        self._refill()
+        # Requests larger than the whole bucket go through once it is full
+        needed = min(amount, self.capacity) - self.level
+        return max(needed / self.rate, 0.0)
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+
+class LLMScheduler:
+    """Priority scheduler for LLM requests under quota and concurrency limits.
+
+    Callers wait in per-lane queues; the head of the highest-priority
+    non-empty lane is dispatched as soon as fewer than ``max_concurrency``
+    requests are in flight and the requests-per-minute and
+    tokens-per-minute buckets can cover it. A ``rpm`` or ``tpm`` of 0
+    disables that limit. Buckets hold ``burst`` seconds worth of quota so
+    idle periods cannot be saved up into a burst that trips upstream 429s.
+    """
+
+    def __init__(
+        self,
+        rpm: int = 0,
+        tpm: int = 0,
+        max_concurrency: int = 16,
+        burst: float = 10.0,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(rpm, rpm * burst / 60) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm, tpm * burst / 60) if tpm > 0 else None
+        # Heap of (lane priority, arrival, tokens, waiter future)
+        self._waiters: list[tuple[int, int, int, asyncio.Future[None]]] = []
+        self._arrivals = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+        self.in_flight = 0
+        self.lane_stats = {
+            lane: {"dispatched": 0, "waiting": 0, "wait_seconds": 0.0} for lane in LANES
+        }
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> LLMScheduler:
+        """Build an LLM scheduler from application settings."""
+        return cls(
+            rpm=settings.llm_rpm,
+            tpm=settings.llm_tpm,
+            max_concurrency=settings.llm_max_concurrency,
+            burst=settings.llm_rate_burst,
+        )
+
+    async def acquire(self, lane: str, tokens: int = 0) -> None:
+        """Wait for this lane's turn and reserve quota for one request.
+
+        Every successful ``acquire`` must be paired with :meth:`release`.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        waiter: asyncio.Future[None] = loop.create_future()
+        heapq.heappush(
+            self._waiters,
+            (LANES.index(lane), next(self._arrivals), tokens, waiter),
+        )
+        stats = self.lane_stats[lane]
+        stats["waiting"] += 1
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Dispatched just as the caller gave up: hand the slot back
+                self.release()
+            raise
+        finally:
+            stats["waiting"] -= 1
+        wait = loop.time() - start
+        stats["dispatched"] += 1
+        stats["wait_seconds"] += wait
+        LLM_QUEUE_WAIT_SECONDS.observe(wait, lane=lane)
+
+    def release(self) -> None:
+        """Free the concurrency slot of a finished request."""
+        self.in_flight -= 1
+        self._dispatch()
+
+    def charge(self, tokens: int, requests: int = 0) -> None:
+        """Account for usage beyond what was reserved, e.g. hedges or long replies."""
+        if self.requests is not None and requests:
+            self.requests.take(requests)
+        if self.tokens is not None and tokens:
+            self.tokens.take(tokens)
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters and self.in_flight < self.max_concurrency:
+            _, _, tokens, waiter = self._waiters[0]
+            if waiter.done():
+                # Cancelled while queued
+                heapq.heappop(self._waiters)
+                continue
+            delay = max(
+                self.requests.time_until(1) if self.requests else 0.0,
+                self.tokens.time_until(tokens) if self.tokens else 0.0,
+            )
+            if delay > 0:
+                # Strict priority: nothing overtakes the head while it waits
+                self._timer = asyncio.get_running_loop().call_later(
+                    delay, self._dispatch
+                )
+                return
+            heapq.heappop(self._waiters)
+            self.charge(tokens, requests=1)
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "requests_available": (
+                round(self.requests.level, 2) if self.requests else None
+            ),
+            "tokens_available": round(self.tokens.level) if self.tokens else None,
+            "lanes": self.lane_stats,
+        }
@@ -3,15 +3,29 @@ from __future__ import annotations
 import logging
 import sys
 
-__all__ = ["setup_logging", "get_logger"]
+from app.tracing import current_span
+
+__all__ = ["TraceContextFilter", "setup_logging", "get_logger"]
+
+
+class TraceContextFilter(logging.Filter):
+    """Stamp records with the trace and span ids of the active span."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = current_span()
+        record.trace_id = span.trace_id if span else "-"
+        record.span_id = span.span_id if span else "-"
+        return True
 
 
 def setup_logging(level: int = logging.INFO) -> None:
     """Setup basic logging configuration for the application."""
+    handler = logging.StreamHandler(sys.stdout)
+    handler.addFilter(TraceContextFilter())
     logging.basicConfig(
         level=level,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        handlers=[logging.StreamHandler(sys.stdout)],
+        format="%(asctime)s - %(name)s - %(levelname)s - [trace=%(trace_id)s] - %(message)s",
+        handlers=[handler],
     )
 
 
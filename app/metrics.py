@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import bisect
+import contextlib
+import threading
+import time
+from collections.abc import Iterator, Sequence
+from typing import TypeVar
+
+__all__ = [
+    "CACHE_EVENTS",
+    "CONVERSATIONS",
+    "CONVERSATION_EVICTIONS",
+    "ERRORS",
+    "FALLBACKS",
+    "HTTP_REQUEST_SECONDS",
+    "LLM_CALL_EVENTS",
+    "LLM_PARSES",
+    "LLM_QUEUE_WAIT_SECONDS",
+    "LLM_SECONDS",
+    "PAYLOAD_BYTES",
+    "QUEUE_WAIT_SECONDS",
+    "REGISTRY",
+    "RENDER_SECONDS",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "Registry",
+    "graph_size_bucket",
+    "server_timing",
+]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = tuple(1024 * 4**i for i in range(9))  # 1 KiB .. 64 MiB
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic counter with optional labels."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {value:g}"
+            for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    """Value that can go up and down, with optional labels."""
+
+    type_name = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram with optional labels."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: per-bucket counts (last is +Inf), sum
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(
+                key, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[index] += 1
+            total[0] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of the ``with`` block, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def _samples(self) -> list[str]:
+        lines = []
+        with self._lock:
+            items = sorted((k, (list(c), t[0])) for k, (c, t) in self._series.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts, strict=True):
+                cumulative += count
+                le = bound if isinstance(bound, str) else f"{bound:g}"
+                labels = _labels(self.labelnames, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total:g}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+M = TypeVar("M", bound=_Metric)
+
+
+class Registry:
+    """Collection of metrics rendered in the Prometheus text format."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: M) -> M:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.register(
+    Histogram(
+        "diagram_http_request_seconds",
+        "HTTP request latency by route and status",
+        ("method", "route", "status"),
+    )
+)
+LLM_SECONDS = REGISTRY.register(
+    Histogram("diagram_llm_seconds", "LLM call latency by agent", ("agent",))
+)
+RENDER_SECONDS = REGISTRY.register(
+    Histogram(
+        "diagram_render_seconds",
+        "Graphviz render time by output formats and graph size",
+        ("format", "nodes"),
+    )
+)
+QUEUE_WAIT_SECONDS = REGISTRY.register(
+    Histogram("diagram_queue_wait_seconds", "Time render jobs wait for a worker")
+)
+PAYLOAD_BYTES = REGISTRY.register(
+    Histogram(
+        "diagram_payload_bytes",
+        "Rendered image size by format",
+        ("format",),
+        buckets=BYTES_BUCKETS,
+    )
+)
+CACHE_EVENTS = REGISTRY.register(
+    Counter(
+        "diagram_cache_events_total", "Cache lookups by result", ("cache", "result")
+    )
+)
+CONVERSATIONS = REGISTRY.register(
+    Gauge(
+        "diagram_conversations",
+        "Assistant conversations held by the conversation store",
+        ("backend",),
+    )
+)
+CONVERSATION_EVICTIONS = REGISTRY.register(
+    Counter(
+        "diagram_conversation_evictions_total",
+        "Conversations dropped from the store by reason",
+        ("backend", "reason"),
+    )
+)
+LLM_CALL_EVENTS = REGISTRY.register(
+    Counter(
+        "diagram_llm_call_events_total",
+        "LLM retries, hedges, timeouts and short-circuited calls",
+        ("event",),
+    )
+)
+LLM_QUEUE_WAIT_SECONDS = REGISTRY.register(
+    Histogram(
+        "diagram_llm_queue_wait_seconds",
+        "Time LLM requests wait for concurrency and quota by priority lane",
+        ("lane",),
+    )
+)
+LLM_PARSES = REGISTRY.register(
+    Counter(
+        "diagram_llm_parses_total", "LLM reply parses by outcome", ("agent", "result")
+    )
+)
+FALLBACKS = REGISTRY.register(
+    Counter("diagram_fallbacks_total", "Degraded code paths taken", ("kind",))
+)
+ERRORS = REGISTRY.register(
+    Counter(
+        "diagram_errors_total",
+        "Request errors by endpoint and type",
+        ("endpoint", "type"),
+    )
+)
+
+
+def graph_size_bucket(nodes: int) -> str:
+    """Coarse node-count label that keeps metric cardinality bounded."""
+    for bound in (10, 50, 200, 1000):
+        if nodes <= bound:
+            return f"le{bound}"
+    return "gt1000"
+
+
+def server_timing(timings: dict[str, float]) -> str:
+    """Format stage durations in seconds as a ``Server-Timing`` header value."""
+    return ", ".join(
+        f"{name};dur={seconds * 1e3:.1f}" for name, seconds in timings.items()
+    )
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+__all__ = [
+    "AnalysisCluster",
+    "AnalysisConnection",
+    "AnalysisNode",
+    "AssistantTurn",
+    "DiagramAnalysis",
+    "IntentResult",
+]
+
+# Response schemas passed to Gemini structured output. Gemini schemas cannot
+# be recursive, so clusters are flat here even though rendering accepts nesting.
+
+
+class AnalysisNode(BaseModel):
+    id: str = Field(description="Unique node id referenced by clusters and connections")
+    type: str = Field(description="Component type from the available types")
+    label: str
+
+
+class AnalysisCluster(BaseModel):
+    label: str
+    nodes: list[str] = Field(description="Ids of the nodes in this cluster")
+
+
+class AnalysisConnection(BaseModel):
+    source: str
+    target: str
+
+
+class DiagramAnalysis(BaseModel):
+    nodes: list[AnalysisNode]
+    clusters: list[AnalysisCluster]
+    connections: list[AnalysisConnection]
+
+
+class IntentResult(BaseModel):
+    intent: Literal["generate_diagram", "clarification", "greeting", "unknown"]
+    description: str | None = Field(
+        default=None, description="What the diagram should show, for generate_diagram"
+    )
+
+
+class AssistantTurn(IntentResult):
+    analysis: DiagramAnalysis | None = Field(
+        default=None, description="Diagram analysis of the description"
+    )
@@ -6,6 +6,10 @@ __all__ = [
     "DiagramRequest",
     "DiagramMetadata",
     "DiagramResponse",
+    "BatchDiagramRequest",
+    "BatchItemResult",
+    "BatchDiagramResponse",
+    "JobResponse",
     "AssistantRequest",
     "AssistantResponse",
 ]
@@ -13,9 +17,10 @@ __all__ = [
 
 class DiagramRequest(BaseModel):
     description: str
-    format: str | None = "png"
+    format: str | list[str] | None = "png"
     style: str | None = None
     size: dict[str, str] | None = None
+    return_url: bool = False
 
 
 class DiagramMetadata(BaseModel):
@@ -23,15 +28,49 @@ class DiagramMetadata(BaseModel):
     clusters_created: int
     connections_made: int
     generation_time: float
+    queue_wait: float | None = None
+    cache_hit: bool = False
+    cache: dict[str, int] | None = None
+    # Seconds spent per pipeline stage (llm, queue_wait, render, encode)
+    timings: dict[str, float] | None = None
 
 
 class DiagramResponse(BaseModel):
     success: bool
     image_data: str | None = None
     image_url: str | None = None
+    images: dict[str, str] | None = None
+    image_urls: dict[str, str] | None = None
     metadata: DiagramMetadata | None = None
 
 
+class BatchDiagramRequest(BaseModel):
+    items: list[DiagramRequest]
+    stream: bool = False
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    success: bool
+    result: DiagramResponse | None = None
+    error: str | None = None
+
+
+class BatchDiagramResponse(BaseModel):
+    results: list[BatchItemResult]
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+    created_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
+    result: DiagramResponse | None = None
+    error: str | None = None
+
+
 class AssistantRequest(BaseModel):
     message: str
     context: dict[str, str] | None = None
@@ -41,6 +80,7 @@ class AssistantRequest(BaseModel):
 class AssistantResponse(BaseModel):
     response_type: str
     content: str
+    conversation_id: str | None = None
     image_data: str | None = None
     follow_up_questions: list[str] | None = None
     suggestions: list[str] | None = None
@@ -1,6 +1,67 @@
 from __future__ import annotations
 
-__all__ = ["intent_prompt", "diagram_analysis_prompt"]
+__all__ = ["intent_prompt", "diagram_analysis_prompt", "assistant_turn_prompt"]
+
+
+_INTENTS = """\
+- "generate_diagram": The user wants to generate a diagram.
+- "clarification": The user is asking for more information or clarification.
+- "greeting": The user is just saying hello.
+- "unknown": The user's intent is unclear."""
+
+_ANALYSIS_GUIDE = """\
+Available component types:
+- Compute: ec2, lambda, service, microservice, web_server
+- Database: rds, dynamodb, database
+- Network & Load Balancing: elb, alb, nlb, api_gateway, apigateway, gateway
+- Storage: s3
+- Integration & Messaging: sqs, sns, queue
+- Management & Monitoring: cloudwatch, monitoring
+- Security: iam, cognito, auth_service
+- Analytics: kinesis
+- Developer Tools: codebuild, codepipeline
+- Other clouds and on-premises: any node of the gcp, azure, k8s, onprem or generic
+  providers, optionally prefixed with the provider (e.g. gke, gcp.bigquery,
+  azure.function_apps, k8s.pod, onprem.kafka, onprem.postgresql)
+
+Please identify:
+1. All nodes/components mentioned (give each a unique id)
+2. Their types (use the available types listed above)
+3. Any grouping/clustering requirements
+4. Connections and relationships between components (using the unique ids)
+5. Any specific labeling requirements
+
+For microservices, use "service" or "microservice" type, or specific service types like "auth_service", "payment_service", "order_service".
+For Application Load Balancer, use "alb" type.
+For API Gateway, use "api_gateway" type.
+For SQS queues, use "sqs" type.
+For CloudWatch monitoring, use "cloudwatch" type."""
+
+_ANALYSIS_EXAMPLE = """\
+{
+    "nodes": [
+        {"id": "alb", "type": "alb", "label": "Application Load Balancer"},
+        {"id": "web1", "type": "ec2", "label": "Web Server 1"},
+        {"id": "web2", "type": "ec2", "label": "Web Server 2"},
+        {"id": "db", "type": "rds", "label": "Database"},
+        {"id": "api_gw", "type": "api_gateway", "label": "API Gateway"},
+        {"id": "auth_svc", "type": "auth_service", "label": "Authentication Service"},
+        {"id": "queue", "type": "sqs", "label": "Message Queue"},
+        {"id": "monitoring", "type": "cloudwatch", "label": "CloudWatch"}
+    ],
+    "clusters": [
+        {"label": "Web Tier", "nodes": ["web1", "web2"]},
+        {"label": "Microservices", "nodes": ["auth_svc"]}
+    ],
+    "connections": [
+        {"source": "alb", "target": "web1"},
+        {"source": "alb", "target": "web2"},
+        {"source": "web1", "target": "db"},
+        {"source": "web2", "target": "db"},
+        {"source": "api_gw", "target": "auth_svc"},
+        {"source": "auth_svc", "target": "queue"}
+    ]
+}"""
 
 
 def intent_prompt(message: str) -> str:
@@ -13,10 +74,7 @@ You are an intelligent assistant. Your job is to determine the user's intent fro
 Message: """{safe_message}"""
 
 Possible intents are:
-- "generate_diagram": The user wants to generate a diagram.
-- "clarification": The user is asking for more information or clarification.
-- "greeting": The user is just saying hello.
-- "unknown": The user's intent is unclear.
+{_INTENTS}
 
 Please respond with a JSON object containing the user's intent and any relevant entities.
 For example:
@@ -36,54 +94,34 @@ You are a diagram architecture expert. Analyze the user's natural language descr
 
 Description: """{safe_description}"""
 
-Available component types:
-- Compute: ec2, lambda, service, microservice, web_server
-- Database: rds, dynamodb, database
-- Network & Load Balancing: elb, alb, nlb, api_gateway, apigateway, gateway
-- Storage: s3
-- Integration & Messaging: sqs, sns, queue
-- Management & Monitoring: cloudwatch, monitoring
-- Security: iam, cognito, auth_service
-- Analytics: kinesis
-- Developer Tools: codebuild, codepipeline
+{_ANALYSIS_GUIDE}
 
-Please identify:
-1. All nodes/components mentioned (give each a unique id)
-2. Their types (use the available types listed above)
-3. Any grouping/clustering requirements
-4. Connections and relationships between components (using the unique ids)
-5. Any specific labeling requirements
+Respond in structured JSON format like this example:
 
-For microservices, use "service" or "microservice" type, or specific service types like "auth_service", "payment_service", "order_service".
-For Application Load Balancer, use "alb" type.
-For API Gateway, use "api_gateway" type.
-For SQS queues, use "sqs" type.
-For CloudWatch monitoring, use "cloudwatch" type.
+{_ANALYSIS_EXAMPLE}
+'''
 
-Respond in structured JSON format like this example:
 
+def assistant_turn_prompt(message: str) -> str:
+    """Generate a combined intent and diagram analysis prompt for one LLM call."""
+    # Escape potential injection by wrapping in triple quotes and escaping triple quotes
+    safe_message = message.replace('"""', r"\"\"\"").replace("\\", "\\\\")
+    return f'''
+You are an intelligent assistant that creates technical diagrams. Determine the user's intent from their message and, when they want a diagram, analyze it in the same reply.
+
+Message: """{safe_message}"""
+
+Possible intents are:
+{_INTENTS}
+
+Respond with a JSON object containing the user's "intent". When the intent is "generate_diagram", also include a "description" of what the diagram should show and an "analysis" that breaks that description down into the components, relationships, and groupings needed for a technical diagram.
+
+{_ANALYSIS_GUIDE}
+
+For example:
 {{
-    "nodes": [
-        {{"id": "alb", "type": "alb", "label": "Application Load Balancer"}},
-        {{"id": "web1", "type": "ec2", "label": "Web Server 1"}},
-        {{"id": "web2", "type": "ec2", "label": "Web Server 2"}},
-        {{"id": "db", "type": "rds", "label": "Database"}},
-        {{"id": "api_gw", "type": "api_gateway", "label": "API Gateway"}},
-        {{"id": "auth_svc", "type": "auth_service", "label": "Authentication Service"}},
-        {{"id": "queue", "type": "sqs", "label": "Message Queue"}},
-        {{"id": "monitoring", "type": "cloudwatch", "label": "CloudWatch"}}
-    ],
-    "clusters": [
-        {{"label": "Web Tier", "nodes": ["web1", "web2"]}},
-        {{"label": "Microservices", "nodes": ["auth_svc"]}}
-    ],
-    "connections": [
-        {{"source": "alb", "target": "web1"}},
-        {{"source": "alb", "target": "web2"}},
-        {{"source": "web1", "target": "db"}},
-        {{"source": "web2", "target": "db"}},
-        {{"source": "api_gw", "target": "auth_svc"}},
-        {{"source": "auth_svc", "target": "queue"}}
-    ]
+    "intent": "generate_diagram",
+    "description": "Create a diagram of a web application.",
+    "analysis": {_ANALYSIS_EXAMPLE}
 }}
 '''
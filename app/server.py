@@ -0,0 +1,356 @@
+"""Pre-fork HTTP server for running the API on several cores.
+
+Run with ``python -m app.server --workers 4``. The parent process imports
+the app and its heavy dependencies, loads the node type index and the
+local intent model, freezes the garbage collector and only then forks the workers, so the preloaded
+modules are shared copy-on-write instead of being imported once per
+worker. Each worker runs its own event loop and service container on a
+shared listening socket.
+
+Workers are recycled gracefully after ``--max-requests`` requests (with
+jitter so they do not all restart at once), when their private memory
+exceeds ``--worker-memory-mb``, or for all workers on ``SIGHUP``. A
+recycled worker stops accepting connections, finishes in-flight requests
+and is replaced by a fresh fork of the parent.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import importlib
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Any
+
+import uvicorn
+
+from app.config import Settings, settings
+from app.logging import get_logger, setup_logging
+
+__all__ = ["PreforkServer", "available_cpus", "preload", "private_memory_mb"]
+
+logger = get_logger(__name__)
+
+# Imported in the parent so workers inherit them instead of importing each
+_PRELOAD_MODULES = ("app.api.main", "google.genai", "google.genai.types")
+
+# Node types the analysis prompt suggests, resolved up front for in-process renders
+_COMMON_NODE_TYPES = (
+    "ec2",
+    "lambda",
+    "rds",
+    "dynamodb",
+    "elb",
+    "alb",
+    "nlb",
+    "api_gateway",
+    "s3",
+    "sqs",
+    "sns",
+    "cloudwatch",
+    "iam",
+    "cognito",
+    "kinesis",
+    "codebuild",
+    "codepipeline",
+)
+
+# cgroup v2 CPU quota, "<quota> <period>" or "max <period>"
+_CPU_MAX_PATH = "/sys/fs/cgroup/cpu.max"
+
+# Workers dying this soon after starting are restarted with a delay
+_MIN_WORKER_LIFETIME = 5.0
+
+
+def preload(settings: Settings) -> Any:
+    """Import and warm everything workers can share, then freeze the GC.
+
+    Only read-only state is warmed here. The render and analysis caches,
+    the conversation store and the render pool are written on every
+    request or hold threads, sockets and database connections that do not
+    survive a fork, so each worker builds its own in the app lifespan.
+
+    Returns the ASGI app.
+    """
+    for module in _PRELOAD_MODULES:
+        importlib.import_module(module)
+    registry = importlib.import_module("app.services.node_registry").node_registry
+    _ = registry.index
+    if settings.render_backend == "thread":
+        # Renders happen inside the workers, so their node modules are shared too
+        for node_type in _COMMON_NODE_TYPES:
+            registry.resolve(node_type)
+    if settings.intent_fast_path:
+        # Fits the local intent model, which workers then only read
+        agents = importlib.import_module("app.agents.assistant_agent")
+        agents.IntentClassifier.from_settings(settings)
+    # Move everything allocated so far out of the collector's reach, so
+    # collections in the workers do not write to (and un-share) these pages
+    gc.collect()
+    gc.freeze()
+    return importlib.import_module("app.api.main").app
+
+
+def available_cpus() -> int:
+    """CPUs this process may use, honouring its affinity and cgroup CPU quota.
+
+    ``os.cpu_count()`` reports every CPU of the host, even inside a
+    container limited to a few of them.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open(_CPU_MAX_PATH, encoding="ascii") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def private_memory_mb(pid: int) -> float | None:
+    """Memory a process does not share with others, or None if unknown.
+
+    Reads ``/proc/<pid>/smaps_rollup``, so it is only available on Linux.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    kilobytes = sum(
+        int(line.split()[1])
+        for line in lines
+        if line.startswith(("Private_Clean:", "Private_Dirty:"))
+    )
+    return kilobytes / 1024
+
+
+def _ignore_signal(signum: int, frame: Any) -> None:
+    pass
+
+
+class PreforkServer:
+    """Forks uvicorn workers from a preloaded parent and keeps them running."""
+
+    def __init__(
+        self,
+        app: Any,
+        *,
+        host: str = "0.0.0.0",
+        port: int = 8000,
+        workers: int = 0,
+        max_requests: int = 0,
+        max_requests_jitter: int = 0,
+        worker_memory_mb: float = 0,
+        graceful_timeout: float = 30.0,
+        check_interval: float = 5.0,
+    ) -> None:
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers or available_cpus()
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.worker_memory_mb = worker_memory_mb
+        self.graceful_timeout = graceful_timeout
+        self.check_interval = check_interval
+        self.socket: socket.socket | None = None
+        # Worker pid -> start time
+        self.children: dict[int, float] = {}
+        self._retiring: set[int] = set()
+        self._stopping = False
+        self._reload = False
+        self.recycled = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings, app: Any) -> PreforkServer:
+        """Build a pre-fork server from application settings."""
+        return cls(
+            app,
+            host=settings.server_host,
+            port=settings.server_port,
+            workers=settings.server_workers,
+            max_requests=settings.server_max_requests,
+            max_requests_jitter=settings.server_max_requests_jitter,
+            worker_memory_mb=settings.server_worker_memory_mb,
+            graceful_timeout=settings.server_graceful_timeout,
+        )
+
+    def _bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                # uvicorn handles these itself and re-raises them once shut
+                # down; ignoring them then lets the worker exit normally
+                for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+                    signal.signal(sig, _ignore_signal)
+                self._serve()
+            except Exception:
+                logger.exception("Worker crashed")
+                code = 1
+            # A normal exit, so atexit hooks stop the render worker processes
+            sys.exit(code)
+        self.children[pid] = time.monotonic()
+        logger.info(f"Started worker {pid}")
+
+    def _serve(self) -> None:
+        config = uvicorn.Config(
+            self.app,
+            limit_max_requests=self.max_requests or None,
+            limit_max_requests_jitter=self.max_requests_jitter,
+            timeout_graceful_shutdown=self.graceful_timeout,
+        )
+        uvicorn.Server(config).run(sockets=[self.socket])
+
+    def _retire(self, pid: int, reason: str) -> None:
+        if pid in self._retiring:
+            return
+        logger.info(f"Recycling worker {pid}: {reason}")
+        self._retiring.add(pid)
+        self.recycled += 1
+        # Start the replacement first so capacity does not drop
+        self._spawn()
+        os.kill(pid, signal.SIGTERM)
+
+    def _reap(self) -> None:
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            started = self.children.pop(pid, None)
+            if started is None:
+                continue
+            if pid in self._retiring:
+                self._retiring.discard(pid)
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if self._stopping:
+                continue
+            if code != 0 and time.monotonic() - started < _MIN_WORKER_LIFETIME:
+                logger.error(f"Worker {pid} exited with {code} right after start")
+                time.sleep(1)
+            else:
+                # Exit code 0: it served max_requests and shut itself down
+                logger.info(f"Worker {pid} exited with {code}, replacing it")
+            self._spawn()
+
+    def _check_memory(self) -> None:
+        if self.worker_memory_mb <= 0:
+            return
+        for pid in list(self.children):
+            used = private_memory_mb(pid)
+            if used is not None and used > self.worker_memory_mb:
+                self._retire(
+                    pid, f"{used:.0f} MB private memory > {self.worker_memory_mb} MB"
+                )
+
+    def _handle_signal(self, signum: int, frame: Any) -> None:
+        if signum == signal.SIGHUP:
+            self._reload = True
+        else:
+            self._stopping = True
+
+    def run(self) -> int:
+        """Serve until SIGTERM or SIGINT, then stop workers gracefully."""
+        self.socket = self._bind()
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, self._handle_signal)
+        logger.info(
+            f"Pre-fork server on {self.host}:{self.port} with {self.workers} workers"
+        )
+        for _ in range(self.workers):
+            self._spawn()
+
+        next_check = time.monotonic() + self.check_interval
+        while not self._stopping:
+            self._reap()
+            if self._reload:
+                self._reload = False
+                for pid in list(self.children):
+                    self._retire(pid, "SIGHUP")
+            if time.monotonic() >= next_check:
+                self._check_memory()
+                next_check = time.monotonic() + self.check_interval
+            time.sleep(0.2)
+        return self._shutdown()
+
+    def _shutdown(self) -> int:
+        logger.info("Stopping workers")
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in self.children:
+            logger.warning(f"Killing worker {pid} after graceful timeout")
+            os.kill(pid, signal.SIGKILL)
+        if self.socket is not None:
+            self.socket.close()
+        return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=settings.server_host)
+    parser.add_argument("--port", type=int, default=settings.server_port)
+    parser.add_argument("--workers", type=int, default=settings.server_workers)
+    parser.add_argument(
+        "--max-requests", type=int, default=settings.server_max_requests
+    )
+    parser.add_argument(
+        "--max-requests-jitter", type=int, default=settings.server_max_requests_jitter
+    )
+    parser.add_argument(
+        "--worker-memory-mb", type=float, default=settings.server_worker_memory_mb
+    )
+    parser.add_argument(
+        "--graceful-timeout", type=float, default=settings.server_graceful_timeout
+    )
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    workers = args.workers or available_cpus()
+    if settings.render_backend == "process" and settings.render_workers == 0:
+        # Split the cores between the workers' render pools instead of
+        # giving every worker one render process per core
+        settings.render_workers = max(1, available_cpus() // workers)
+    # Every worker has its own LLM scheduler, so each gets a share of the quota
+    if settings.llm_rpm > 0:
+        settings.llm_rpm = max(1, settings.llm_rpm // workers)
+    if settings.llm_tpm > 0:
+        settings.llm_tpm = max(1, settings.llm_tpm // workers)
+
+    app = preload(settings)
+    server = PreforkServer(
+        app,
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        max_requests=args.max_requests,
+        max_requests_jitter=args.max_requests_jitter,
+        worker_memory_mb=args.worker_memory_mb,
+        graceful_timeout=args.graceful_timeout,
+    )
+    return server.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from app.config import Settings
+from app.services.render_cache import DiskCache
+
+__all__ = [
+    "ArtifactStore",
+    "FileArtifactStore",
+    "MemoryArtifactStore",
+    "MEDIA_TYPES",
+    "create_artifact_store",
+]
+
+MEDIA_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "svg": "image/svg+xml",
+    "pdf": "application/pdf",
+}
+
+_ARTIFACT_ID = re.compile(r"^[0-9a-f]{64}\.(png|jpg|svg|pdf)$")
+
+
+class ArtifactStore(ABC):
+    """Content-addressed store for rendered diagram images.
+
+    Artifact ids have the form ``<sha256>.<format>``, so identical images are
+    stored once and an id never refers to different content. An artifact is
+    kept for at least ``retention`` seconds after it was last stored, so
+    URLs handed out stay valid for that long even when the store is over
+    its size limit.
+    """
+
+    retention = 0.0
+
+    @staticmethod
+    def artifact_id(data: bytes, outformat: str) -> str:
+        """Return the content-addressed id for image bytes."""
+        return f"{hashlib.sha256(data).hexdigest()}.{outformat}"
+
+    @staticmethod
+    def is_valid_id(artifact_id: str) -> bool:
+        """Check that an id is well formed before touching the store."""
+        return _ARTIFACT_ID.match(artifact_id) is not None
+
+    @staticmethod
+    def media_type(artifact_id: str) -> str:
+        """Return the media type for an artifact id."""
+        return MEDIA_TYPES[artifact_id.rsplit(".", 1)[1]]
+
+    @abstractmethod
+    def put(self, data: bytes, outformat: str) -> str:
+        """Store image bytes and return their artifact id."""
+
+    @abstractmethod
+    def get(self, artifact_id: str) -> bytes | None:
+        """Return stored image bytes, or None if unknown."""
+
+    def path(self, artifact_id: str) -> str | None:
+        """Return a local file path for streaming, if the store has one."""
+        return None
+
+
+class MemoryArtifactStore(ArtifactStore):
+    """Artifact store kept in process memory, bounded by total bytes."""
+
+    def __init__(self, max_bytes: int, retention: float = 0.0) -> None:
+        self.max_bytes = max_bytes
+        self.retention = retention
+        # Artifact id -> (bytes, stored at), oldest first
+        self._data: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, data: bytes, outformat: str) -> str:
+        artifact_id = self.artifact_id(data, outformat)
+        now = time.monotonic()
+        with self._lock:
+            previous = self._data.pop(artifact_id, None)
+            if previous is not None:
+                self._bytes -= len(previous[0])
+            self._data[artifact_id] = (data, now)
+            self._bytes += len(data)
+            cutoff = now - self.retention
+            while self._bytes > self.max_bytes:
+                oldest, (oldest_data, stored) = next(iter(self._data.items()))
+                if stored > cutoff:
+                    break
+                del self._data[oldest]
+                self._bytes -= len(oldest_data)
+        return artifact_id
+
+    def get(self, artifact_id: str) -> bytes | None:
+        with self._lock:
+            entry = self._data.get(artifact_id)
+        return entry[0] if entry is not None else None
+
+
+class FileArtifactStore(ArtifactStore):
+    """Artifact store on the local filesystem, shared by all workers."""
+
+    def __init__(self, directory: str, max_bytes: int, retention: float = 0.0) -> None:
+        self.retention = retention
+        self._disk = DiskCache(directory, max_bytes, min_age=retention)
+
+    def put(self, data: bytes, outformat: str) -> str:
+        artifact_id = self.artifact_id(data, outformat)
+        try:
+            # Already stored: restart its retention for the new URL
+            os.utime(self._disk.path(artifact_id))
+        except FileNotFoundError:
+            self._disk.set(artifact_id, data)
+        return artifact_id
+
+    def get(self, artifact_id: str) -> bytes | None:
+        return self._disk.get(artifact_id)
+
+    def path(self, artifact_id: str) -> str | None:
+        path = self._disk.path(artifact_id)
+        return path if os.path.exists(path) else None
+
+
+def create_artifact_store(settings: Settings) -> ArtifactStore:
+    """Build the artifact store selected in settings."""
+    if settings.artifact_store == "memory":
+        return MemoryArtifactStore(
+            settings.artifact_max_bytes, settings.artifact_retention
+        )
+    if settings.artifact_store == "file":
+        directory = settings.artifact_dir or os.path.join(settings.tmp_dir, "artifacts")
+        return FileArtifactStore(
+            directory, settings.artifact_max_bytes, settings.artifact_retention
+        )
+    raise ValueError(f"Unknown artifact store '{settings.artifact_store}'")
@@ -1,10 +1,23 @@
 from __future__ import annotations
 
+import re
+import uuid
+from collections.abc import AsyncIterator
+from typing import Any
+
+import anyio
+
 from app.agents.assistant_agent import AssistantAgent
 from app.config import Settings
 from app.logging import get_logger
+from app.metrics import FALLBACKS
 from app.models.diagram import AssistantRequest, AssistantResponse
-from app.services.diagram_service import DiagramService
+from app.services.conversation_store import (
+    ConversationStore,
+    create_conversation_store,
+)
+from app.services.diagram_service import DiagramService, encode_image
+from app.tracing import tracer
 
 __all__ = ["AssistantService"]
 
@@ -14,16 +27,110 @@ logger = get_logger(__name__)
 class AssistantService:
     """Service for handling assistant conversations and routing to diagram generation."""
 
-    def __init__(self, settings: Settings) -> None:
-        self.assistant_agent = AssistantAgent()
-        self.diagram_service = DiagramService(settings)
-        # Simple in-memory conversation store (for stateless service with session-like behavior)
-        self._conversation_context: dict[str, dict] = {}
+    def __init__(
+        self,
+        settings: Settings,
+        assistant_agent: AssistantAgent | None = None,
+        diagram_service: DiagramService | None = None,
+        conversation_store: ConversationStore | None = None,
+    ) -> None:
+        self.assistant_agent = assistant_agent or AssistantAgent()
+        self.diagram_service = diagram_service or DiagramService(settings)
+        self.fused_call = settings.assistant_fused_call
+        # Fused replies whose analysis was used, and ones that needed a second call
+        self.fused_stats = {"fused": 0, "fallback": 0}
+        self.conversation_store = conversation_store or create_conversation_store(
+            settings
+        )
 
     async def process_message(self, request: AssistantRequest) -> AssistantResponse:
-        # Handle conversation context and memory
-        conversation_id = request.conversation_id or "default"
-        context = self._get_conversation_context(conversation_id)
+        with tracer.span("assistant.process_message") as span:
+            response = await self._process_message(request)
+            span.set_attribute("response_type", response.response_type)
+            return response
+
+    async def _process_message(self, request: AssistantRequest) -> AssistantResponse:
+        conversation_id, context, intent_data, used_llm = await self._detect_intent(
+            request
+        )
+        intent = intent_data.get("intent")
+
+        if intent == "generate_diagram":
+            description = intent_data.get("description")
+            if not description:
+                return self._missing_description_response(conversation_id)
+
+            analysis = self._fused_analysis(intent_data, used_llm)
+            if analysis is not None:
+                image_data, _ = await self.diagram_service.render_analysis(
+                    analysis, description
+                )
+            else:
+                (
+                    image_data,
+                    _,
+                ) = await self.diagram_service.generate_diagram_from_description(
+                    description
+                )
+            response = self._image_response(image_data)
+            await self._store_response(conversation_id, context, response, "image")
+            return response
+
+        response = self._text_response(intent)
+        await self._store_response(conversation_id, context, response)
+        return response
+
+    async def stream_message(
+        self, request: AssistantRequest
+    ) -> AsyncIterator[tuple[str, Any]]:
+        """Process a message, yielding progress events as ``(event, data)`` pairs.
+
+        Emits ``intent`` first, then either the diagram pipeline's
+        ``analysis``/``render_started`` events or ``text`` deltas, and finally
+        ``response`` with the complete AssistantResponse.
+        """
+        conversation_id, context, intent_data, used_llm = await self._detect_intent(
+            request
+        )
+        intent = intent_data.get("intent")
+        yield "intent", {k: v for k, v in intent_data.items() if k != "analysis"}
+
+        if intent == "generate_diagram":
+            description = intent_data.get("description")
+            if not description:
+                yield "response", self._missing_description_response(conversation_id)
+                return
+
+            events = self.diagram_service.stream_diagram(
+                description, analysis=self._fused_analysis(intent_data, used_llm)
+            )
+            async for event, data in events:
+                if event != "image":
+                    yield event, data
+                    continue
+                images, _ = data
+                response = self._image_response(encode_image(images["png"]))
+                await self._store_response(conversation_id, context, response, "image")
+                yield "response", response
+            return
+
+        response = self._text_response(intent)
+        for chunk in re.findall(r"\S+\s*", response.content):
+            yield "text", {"delta": chunk}
+        await self._store_response(conversation_id, context, response)
+        yield "response", response
+
+    async def _detect_intent(
+        self, request: AssistantRequest
+    ) -> tuple[str, dict, dict[str, Any], bool]:
+        """Record the user message in its conversation and detect its intent.
+
+        Also returns whether the intent came from the LLM rather than the
+        local classifier.
+        """
+        # Start a new conversation unless the client continues one
+        conversation_id = request.conversation_id or uuid.uuid4().hex
+        context = await self._get_conversation_context(conversation_id)
 
         # Add current message to context
         if "messages" not in context:
@@ -36,42 +143,65 @@ class AssistantService:
             context.update(request.context)
 
         intent_data = await self.assistant_agent.get_intent(
-            message_with_context, context
+            message_with_context, context, with_analysis=self.fused_call
+        )
+        used_llm = intent_data.pop("source", None) == "llm"
+        return conversation_id, context, intent_data, used_llm
+
+    def _fused_analysis(
+        self, intent_data: dict[str, Any], used_llm: bool
+    ) -> dict[str, Any] | None:
+        """Return the analysis from a fused reply, or None to fall back to two calls.
+
+        Intents from the local classifier never carry an analysis, so they
+        do not count as fused or fallback replies.
+        """
+        if not self.fused_call or not used_llm:
+            return None
+        analysis = intent_data.get("analysis")
+        if analysis is None:
+            self.fused_stats["fallback"] += 1
+            FALLBACKS.inc(kind="fused_analysis")
+        else:
+            self.fused_stats["fused"] += 1
+        return analysis
+
+    async def _store_response(
+        self,
+        conversation_id: str,
+        context: dict,
+        response: AssistantResponse,
+        message_type: str | None = None,
+    ) -> None:
+        """Store the assistant response in the conversation context."""
+        response.conversation_id = conversation_id
+        message = {"role": "assistant", "content": response.content}
+        if message_type:
+            message["type"] = message_type
+        context["messages"].append(message)
+        await self._update_conversation_context(conversation_id, context)
+
+    def _missing_description_response(self, conversation_id: str) -> AssistantResponse:
+        return AssistantResponse(
+            response_type="question",
+            conversation_id=conversation_id,
+            content="I can help with that! What would you like the diagram to show?",
         )
-        intent = intent_data.get("intent")
-
-        if intent == "generate_diagram":
-            description = intent_data.get("description")
-            if not description:
-                return AssistantResponse(
-                    response_type="question",
-                    content="I can help with that! What would you like the diagram to show?",
-                )
 
-            (
-                image_data,
-                _,
-            ) = await self.diagram_service.generate_diagram_from_description(
-                description
-            )
-            response = AssistantResponse(
-                response_type="image",
-                content="Here is the diagram you requested:",
-                image_data=image_data,
-                follow_up_questions=[
-                    "Would you like me to modify any part of this diagram?",
-                    "Should I explain how this architecture works?",
-                ],
-            )
+    def _image_response(self, image_data: str) -> AssistantResponse:
+        return AssistantResponse(
+            response_type="image",
+            content="Here is the diagram you requested:",
+            image_data=image_data,
+            follow_up_questions=[
+                "Would you like me to modify any part of this diagram?",
+                "Should I explain how this architecture works?",
+            ],
+        )
 
-            # Store response in context
-            context["messages"].append(
-                {"role": "assistant", "content": response.content, "type": "image"}
-            )
-            self._update_conversation_context(conversation_id, context)
-            return response
-        elif intent == "clarification":
-            response = AssistantResponse(
+    def _text_response(self, intent: str | None) -> AssistantResponse:
+        if intent == "clarification":
+            return AssistantResponse(
                 response_type="text",
                 content="I am an AI assistant that can generate diagrams from natural language descriptions. How can I help you?",
                 suggestions=[
@@ -80,8 +210,8 @@ class AssistantService:
                     "Design a web application flow",
                 ],
             )
-        elif intent == "greeting":
-            response = AssistantResponse(
+        if intent == "greeting":
+            return AssistantResponse(
                 response_type="text",
                 content="Hello! How can I help you create a diagram today?",
                 suggestions=[
@@ -90,28 +220,30 @@ class AssistantService:
                     "Design a database schema",
                 ],
             )
-        else:
-            response = AssistantResponse(
-                response_type="text",
-                content="I'm not sure how to help with that. Please try describing the diagram you would like to create.",
-                suggestions=[
-                    "Try: 'Create a web application with database'",
-                    "Try: 'Show me a microservices architecture'",
-                ],
-            )
-
-        # Store response in context
-        context["messages"].append({"role": "assistant", "content": response.content})
-        self._update_conversation_context(conversation_id, context)
-        return response
+        return AssistantResponse(
+            response_type="text",
+            content="I'm not sure how to help with that. Please try describing the diagram you would like to create.",
+            suggestions=[
+                "Try: 'Create a web application with database'",
+                "Try: 'Show me a microservices architecture'",
+            ],
+        )
 
-    def _get_conversation_context(self, conversation_id: str) -> dict:
+    async def _get_conversation_context(self, conversation_id: str) -> dict:
         """Get conversation context for a given conversation ID."""
-        return self._conversation_context.get(conversation_id, {})
+        # Stores may block on disk, so keep them off the event loop
+        context = await anyio.to_thread.run_sync(
+            self.conversation_store.get, conversation_id
+        )
+        return context or {}
 
-    def _update_conversation_context(self, conversation_id: str, context: dict) -> None:
+    async def _update_conversation_context(
+        self, conversation_id: str, context: dict
+    ) -> None:
         """Update conversation context for a given conversation ID."""
         # Keep only last 10 messages to prevent memory bloat
         if "messages" in context and len(context["messages"]) > 10:
             context["messages"] = context["messages"][-10:]
-        self._conversation_context[conversation_id] = context
+        await anyio.to_thread.run_sync(
+            self.conversation_store.set, conversation_id, context
+        )
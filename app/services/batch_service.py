@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator, Sequence
+from typing import Any, NamedTuple
+
+from app.config import Settings
+from app.llm_scheduler import llm_lane
+from app.logging import get_logger
+from app.models.diagram import DiagramRequest
+from app.services.diagram_service import DiagramService
+from app.services.renderer import normalize_formats, size_attrs
+
+__all__ = ["BatchDiagramService", "BatchOutcome"]
+
+logger = get_logger(__name__)
+
+
+class BatchOutcome(NamedTuple):
+    """Result of one batch item: rendered images or an error message."""
+
+    index: int
+    images: dict[str, bytes] | None
+    metadata: dict[str, Any] | None
+    error: str | None
+
+
+class BatchDiagramService:
+    """Fan out many diagram requests with bounded analysis and render parallelism.
+
+    LLM analysis and rendering are throttled by separate semaphores shared by
+    every batch, and each item runs under its own timeout so one slow item
+    never holds up the rest. The timeout only counts time spent working,
+    not time spent waiting for a slot behind other items.
+    """
+
+    def __init__(
+        self,
+        diagram_service: DiagramService,
+        analysis_concurrency: int = 8,
+        render_concurrency: int = 4,
+        item_timeout: float = 120.0,
+    ) -> None:
+        self.diagram_service = diagram_service
+        self.item_timeout = item_timeout
+        self._analysis_slots = asyncio.Semaphore(analysis_concurrency)
+        self._render_slots = asyncio.Semaphore(render_concurrency)
+
+    @classmethod
+    def from_settings(
+        cls, settings: Settings, diagram_service: DiagramService
+    ) -> BatchDiagramService:
+        """Build a batch service from application settings."""
+        return cls(
+            diagram_service,
+            analysis_concurrency=settings.batch_analysis_concurrency,
+            render_concurrency=settings.batch_render_concurrency,
+            item_timeout=settings.batch_item_timeout,
+        )
+
+    async def run(self, items: Sequence[DiagramRequest]) -> AsyncIterator[BatchOutcome]:
+        """Yield item outcomes in completion order."""
+        # Items inherit the bulk lane so interactive LLM calls go first
+        with llm_lane("bulk"):
+            tasks = [
+                asyncio.create_task(self._run_item(index, item))
+                for index, item in enumerate(items)
+            ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Stop outstanding work if the consumer goes away early
+            for task in tasks:
+                task.cancel()
+
+    async def _run_item(self, index: int, item: DiagramRequest) -> BatchOutcome:
+        try:
+            if not item.description:
+                raise ValueError("Invalid diagram description provided")
+            formats = normalize_formats(item.format)
+            size_attrs(item.size)
+            loop = asyncio.get_running_loop()
+            remaining = self.item_timeout
+            async with self._analysis_slots:
+                started = loop.time()
+                async with asyncio.timeout(remaining):
+                    analysis = await self.diagram_service.agent.generate_analysis(
+                        item.description
+                    )
+                remaining -= loop.time() - started
+            async with self._render_slots:
+                async with asyncio.timeout(max(remaining, 0.0)):
+                    images, metadata = await self.diagram_service.render_images(
+                        analysis, item.description, formats, item.size
+                    )
+        except TimeoutError:
+            return BatchOutcome(index, None, None, "Timed out")
+        except Exception as e:
+            logger.warning(f"Batch item {index} failed: {e}")
+            return BatchOutcome(index, None, None, str(e) or type(e).__name__)
+        return BatchOutcome(index, images, metadata, None)
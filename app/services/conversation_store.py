@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any
+
+from app.cache import LRUCache
+from app.config import Settings
+from app.metrics import CONVERSATION_EVICTIONS, CONVERSATIONS
+
+__all__ = [
+    "ConversationStore",
+    "MemoryConversationStore",
+    "SQLiteConversationStore",
+    "create_conversation_store",
+]
+
+
+class ConversationStore(ABC):
+    """Bounded store of assistant conversation contexts by conversation id.
+
+    Contexts are stored as JSON, so callers always get their own copy and
+    must :meth:`set` a context again after changing it. Conversations idle
+    for longer than the TTL are dropped, and the least recently updated
+    ones are evicted once the store is full. Methods may block on I/O, so
+    async callers run them in a worker thread.
+    """
+
+    backend = ""
+
+    @abstractmethod
+    def get(self, conversation_id: str) -> dict[str, Any] | None:
+        """Return the stored context of a conversation, or None if unknown."""
+
+    @abstractmethod
+    def set(self, conversation_id: str, context: dict[str, Any]) -> None:
+        """Store the context of a conversation."""
+
+    @abstractmethod
+    def close(self) -> None:
+        """Release resources held by the store."""
+
+    @abstractmethod
+    def stats(self) -> dict[str, Any]:
+        """Return size and eviction counters."""
+
+
+class MemoryConversationStore(ConversationStore):
+    """Conversation store in process memory, bounded by count and total bytes."""
+
+    backend = "memory"
+
+    def __init__(self, max_items: int, ttl: float, max_bytes: int) -> None:
+        self._cache: LRUCache[str, str] = LRUCache(
+            maxsize=max_items, max_bytes=max_bytes, ttl=ttl
+        )
+
+    def get(self, conversation_id: str) -> dict[str, Any] | None:
+        expirations = self._cache.expirations
+        data = self._cache.get(conversation_id)
+        if self._cache.expirations > expirations:
+            CONVERSATION_EVICTIONS.inc(backend=self.backend, reason="ttl")
+            CONVERSATIONS.set(len(self._cache), backend=self.backend)
+        return json.loads(data) if data is not None else None
+
+    def set(self, conversation_id: str, context: dict[str, Any]) -> None:
+        evictions = self._cache.evictions
+        self._cache.set(conversation_id, json.dumps(context))
+        if evicted := self._cache.evictions - evictions:
+            CONVERSATION_EVICTIONS.inc(evicted, backend=self.backend, reason="capacity")
+        CONVERSATIONS.set(len(self._cache), backend=self.backend)
+
+    def close(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict[str, Any]:
+        stats = self._cache.stats()
+        return {
+            "backend": self.backend,
+            "size": stats["size"],
+            "bytes": stats["bytes"],
+            "evictions": stats["evictions"],
+            "expirations": stats["expirations"],
+        }
+
+
+class SQLiteConversationStore(ConversationStore):
+    """Conversation store in a SQLite database in WAL mode.
+
+    Every worker process opens the same file, so a conversation can
+    continue on any worker. Rows are looked up by primary key and evicted
+    through an index on the update time, and triggers keep a running row
+    count, so no operation scans the table.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, db_path: str, max_items: int, ttl: float) -> None:
+        self.max_items = max_items
+        self.ttl = ttl
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+        self._db = self._open_db(db_path)
+
+    def _open_db(self, db_path: str) -> sqlite3.Connection:
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        # Wait for other workers' writes instead of failing with SQLITE_BUSY
+        db.execute("PRAGMA busy_timeout=5000")
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(
+            "BEGIN IMMEDIATE;"
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            "id TEXT PRIMARY KEY, context TEXT NOT NULL, updated REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS conversations_updated "
+            "ON conversations (updated);"
+            "CREATE TABLE IF NOT EXISTS conversation_count (n INTEGER NOT NULL);"
+            "INSERT INTO conversation_count SELECT count(*) FROM conversations "
+            "WHERE NOT EXISTS (SELECT 1 FROM conversation_count);"
+            "CREATE TRIGGER IF NOT EXISTS conversations_insert "
+            "AFTER INSERT ON conversations "
+            "BEGIN UPDATE conversation_count SET n = n + 1; END;"
+            "CREATE TRIGGER IF NOT EXISTS conversations_delete "
+            "AFTER DELETE ON conversations "
+            "BEGIN UPDATE conversation_count SET n = n - 1; END;"
+            "COMMIT;"
+        )
+        return db
+
+    def get(self, conversation_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT context, updated FROM conversations WHERE id = ?",
+                (conversation_id,),
+            ).fetchone()
+        # Expired rows are left for the next write to delete
+        if row is None or row[1] + self.ttl <= time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, conversation_id: str, context: dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT INTO conversations (id, context, updated) "
+                    "VALUES (?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+                    "context = excluded.context, updated = excluded.updated",
+                    (conversation_id, json.dumps(context), now),
+                )
+                expired = self._db.execute(
+                    "DELETE FROM conversations WHERE updated <= ?", (now - self.ttl,)
+                ).rowcount
+                excess = max(self._size() - self.max_items, 0)
+                if excess:
+                    self._db.execute(
+                        "DELETE FROM conversations WHERE id IN ("
+                        "SELECT id FROM conversations ORDER BY updated LIMIT ?)",
+                        (excess,),
+                    )
+                size = self._size()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if expired:
+            self.expirations += expired
+            CONVERSATION_EVICTIONS.inc(expired, backend=self.backend, reason="ttl")
+        if excess:
+            self.evictions += excess
+            CONVERSATION_EVICTIONS.inc(excess, backend=self.backend, reason="capacity")
+        CONVERSATIONS.set(size, backend=self.backend)
+
+    def _size(self) -> int:
+        return self._db.execute("SELECT n FROM conversation_count").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            size = self._size()
+        return {
+            "backend": self.backend,
+            "size": size,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def create_conversation_store(settings: Settings) -> ConversationStore:
+    """Build the conversation store selected in settings."""
+    if settings.conversation_store == "memory":
+        return MemoryConversationStore(
+            settings.conversation_max_items,
+            settings.conversation_ttl,
+            settings.conversation_max_bytes,
+        )
+    if settings.conversation_store == "sqlite":
+        db_path = settings.conversation_db_path or os.path.join(
+            settings.tmp_dir, "conversations.sqlite3"
+        )
+        return SQLiteConversationStore(
+            db_path, settings.conversation_max_items, settings.conversation_ttl
+        )
+    raise ValueError(f"Unknown conversation store '{settings.conversation_store}'")
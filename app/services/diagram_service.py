@@ -2,187 +2,258 @@ from __future__ import annotations
 
 import base64
 import os
-import shutil
 import time
-import uuid
+from collections.abc import AsyncIterator, Sequence
 from typing import Any
 
 import anyio
-from diagrams import Cluster, Diagram
-from diagrams.aws.analytics import Kinesis
-from diagrams.aws.compute import EC2, Lambda
-from diagrams.aws.database import RDS, Dynamodb
-from diagrams.aws.devtools import Codebuild, Codepipeline
-from diagrams.aws.integration import SNS, SQS
-from diagrams.aws.management import Cloudwatch
-from diagrams.aws.network import ALB, ELB, NLB, VPC, APIGateway, InternetGateway
-from diagrams.aws.security import IAM, Cognito
-from diagrams.aws.storage import S3
-from diagrams.generic.blank import Blank
 
+from app.agents.analysis_cache import AnalysisCache
 from app.agents.diagram_agent import DiagramAgent
 from app.config import Settings
 from app.logging import get_logger
+from app.metrics import (
+    CACHE_EVENTS,
+    PAYLOAD_BYTES,
+    QUEUE_WAIT_SECONDS,
+    RENDER_SECONDS,
+    graph_size_bucket,
+)
+from app.services.render_cache import RenderCache, render_cache_key
+from app.services.render_engine import RenderEngine, RenderJob
+from app.services.renderer import (
+    NODE_MAP,
+    normalize_formats,
+    render_diagrams,
+)
+from app.singleflight import SingleFlight
+from app.tracing import tracer
 
-__all__ = ["DiagramService"]
+__all__ = ["DiagramService", "NODE_MAP", "encode_image"]
 
 logger = get_logger(__name__)
 
-# Node mapping for diagram components
-NODE_MAP: dict[str, type] = {
-    # Compute
-    "ec2": EC2,
-    "lambda": Lambda,
-    # Database
-    "rds": RDS,
-    "dynamodb": Dynamodb,
-    # Network & Load Balancing
-    "elb": ELB,
-    "alb": ALB,  # Application Load Balancer
-    "nlb": NLB,  # Network Load Balancer
-    "api_gateway": APIGateway,
-    "apigateway": APIGateway,
-    "vpc": VPC,
-    "internet_gateway": InternetGateway,
-    # Storage
-    "s3": S3,
-    # Integration & Messaging
-    "sqs": SQS,
-    "sns": SNS,
-    # Management & Monitoring
-    "cloudwatch": Cloudwatch,
-    "monitoring": Cloudwatch,
-    # Security
-    "iam": IAM,
-    "cognito": Cognito,
-    # Analytics
-    "kinesis": Kinesis,
-    # Developer Tools
-    "codebuild": Codebuild,
-    "codepipeline": Codepipeline,
-    # Generic service types
-    "service": EC2,  # Default for microservices
-    "microservice": EC2,
-    "auth_service": EC2,
-    "payment_service": EC2,
-    "order_service": EC2,
-    "web_server": EC2,
-    "database": RDS,
-    "queue": SQS,
-    "gateway": APIGateway,
-}
+
+def _count_clusters(clusters: list[dict[str, Any]]) -> int:
+    """Count clusters including the ones nested inside other clusters."""
+    return sum(1 + _count_clusters(c.get("clusters", [])) for c in clusters)
+
+
+def encode_image(image_bytes: bytes) -> str:
+    """Encode image bytes for inlining in JSON responses."""
+    return base64.b64encode(image_bytes).decode("utf-8")
 
 
 class DiagramService:
     """Service for generating diagrams from natural language descriptions."""
 
-    def __init__(self, settings: Settings) -> None:
+    def __init__(
+        self,
+        settings: Settings,
+        render_cache: RenderCache | None = None,
+        agent: DiagramAgent | None = None,
+        render_engine: RenderEngine | None = None,
+    ) -> None:
         self.temp_dir = settings.tmp_dir
-        if not os.path.exists(self.temp_dir):
-            os.makedirs(self.temp_dir)
-        self.agent = DiagramAgent()
+        self.pipeline = settings.render_pipeline
+        os.makedirs(self.temp_dir, exist_ok=True)
+        if agent is None:
+            agent = DiagramAgent(
+                AnalysisCache.from_settings(settings)
+                if settings.analysis_cache_enabled
+                else None
+            )
+        self.agent = agent
+        if render_cache is None and settings.render_cache_enabled:
+            render_cache = RenderCache.from_settings(settings)
+        self.render_cache = render_cache
+        self.render_engine = render_engine or RenderEngine.from_settings(settings)
+        self.render_flight: SingleFlight[RenderJob] = SingleFlight()
 
     async def generate_diagram_from_description(
         self, description: str
     ) -> tuple[str, dict[str, Any]]:
         """Generate diagram from natural language description."""
+        image_bytes, metadata = await self.generate_diagram_image(description)
+        return encode_image(image_bytes), metadata
+
+    async def generate_diagram_image(
+        self, description: str, outformat: str = "png"
+    ) -> tuple[bytes, dict[str, Any]]:
+        """Generate raw diagram image bytes from natural language description."""
+        images, metadata = await self.generate_diagram_images(description, [outformat])
+        return next(iter(images.values())), metadata
+
+    async def generate_diagram_images(
+        self,
+        description: str,
+        formats: Sequence[str] = ("png",),
+        size: dict[str, str] | None = None,
+    ) -> tuple[dict[str, bytes], dict[str, Any]]:
+        """Generate a diagram in one or more formats from a description."""
+        start = time.perf_counter()
         analysis_result = await self.agent.generate_analysis(description)
+        llm_time = time.perf_counter() - start
+        images, metadata = await self.render_images(
+            analysis_result, description, formats, size
+        )
+        timings = {"llm": llm_time, **metadata.get("timings", {})}
+        return images, {**metadata, "timings": timings}
 
-        # Run the CPU-intensive diagram generation in a thread pool
-        return await anyio.to_thread.run_sync(
-            self._generate_diagram_sync, analysis_result, description
+    async def stream_diagram(
+        self,
+        description: str,
+        formats: Sequence[str] = ("png",),
+        size: dict[str, str] | None = None,
+        analysis: dict[str, Any] | None = None,
+    ) -> AsyncIterator[tuple[str, Any]]:
+        """Generate a diagram, yielding progress events as ``(event, data)`` pairs.
+
+        Emits ``analysis`` as soon as the LLM analysis is parsed, so clients
+        can draw the graph outline while graphviz runs, then
+        ``render_started`` and finally ``image`` with ``(images, metadata)``.
+        An ``analysis`` obtained elsewhere skips the LLM call.
+        """
+        analysis_result = analysis or await self.agent.generate_analysis(description)
+        yield (
+            "analysis",
+            {
+                "nodes": len(analysis_result.get("nodes", [])),
+                "edges": len(analysis_result.get("connections", [])),
+                "clusters": _count_clusters(analysis_result.get("clusters", [])),
+                "analysis": analysis_result,
+            },
+        )
+        yield "render_started", {"formats": normalize_formats(formats)}
+        yield (
+            "image",
+            await self.render_images(analysis_result, description, formats, size),
         )
 
-    def _generate_diagram_sync(
+    async def render_analysis(
         self, analysis_result: dict[str, Any], description: str
     ) -> tuple[str, dict[str, Any]]:
-        """Synchronous diagram generation (runs in thread pool)."""
-        diagram_path = os.path.join(self.temp_dir, str(uuid.uuid4()))
-        nodes: dict[str, Any] = {}
+        """Render an analysis and return the base64-encoded PNG image."""
+        images, metadata = await self.render_images(analysis_result, description)
+        return encode_image(images["png"]), metadata
+
+    async def render_images(
+        self,
+        analysis_result: dict[str, Any],
+        description: str,
+        formats: Sequence[str] = ("png",),
+        size: dict[str, str] | None = None,
+    ) -> tuple[dict[str, bytes], dict[str, Any]]:
+        """Render an analysis on the render engine, consulting the cache first.
+
+        Formats missing from the cache are rendered together in one job so
+        graphviz lays the graph out only once.
+        """
         start_time = time.time()
+        formats = normalize_formats(formats)
+        cache_keys, images = await self._cache_lookup(
+            analysis_result, description, formats, size
+        )
+        missing = [fmt for fmt in formats if fmt not in images]
+        if not missing:
+            return images, self._build_metadata(
+                analysis_result, time.time() - start_time, True
+            )
 
-        with Diagram(
-            description,
-            filename=diagram_path,
-            show=False,
-            outformat="png",
-            graph_attr={
-                "pad": "0.1",
-                "splines": "ortho",
-                "rankdir": "LR",
-                "nodesep": "0.8",
-                "ranksep": "1.2",
-            },
-        ):
-            # Create clusters and the nodes within them
-            for cluster_info in analysis_result.get("clusters", []):
-                with Cluster(cluster_info["label"]):
-                    for node_id in cluster_info["nodes"]:
-                        node_details = next(
-                            (n for n in analysis_result["nodes"] if n["id"] == node_id),
-                            None,
-                        )
-                        if node_details:
-                            node_class = NODE_MAP.get(node_details["type"].lower())
-                            if node_class:
-                                nodes[node_id] = node_class(node_details["label"])
-                            else:
-                                logger.warning(
-                                    f"Unknown node type '{node_details['type']}' for node '{node_id}', using generic node"
-                                )
-                                nodes[node_id] = Blank(
-                                    f"Unknown: {node_details['label']}"
-                                )
-
-            # Create standalone nodes
-            clustered_node_ids = [
-                node_id
-                for c in analysis_result.get("clusters", [])
-                for node_id in c["nodes"]
-            ]
-            for node_details in analysis_result["nodes"]:
-                if node_details["id"] not in clustered_node_ids:
-                    node_class = NODE_MAP.get(node_details["type"].lower())
-                    if node_class:
-                        nodes[node_details["id"]] = node_class(node_details["label"])
-                    else:
-                        logger.warning(
-                            f"Unknown node type '{node_details['type']}' for node '{node_details['id']}', using generic node"
-                        )
-                        nodes[node_details["id"]] = Blank(
-                            f"Unknown: {node_details['label']}"
-                        )
-
-            # Create connections
-            for conn in analysis_result.get("connections", []):
-                source_node = nodes.get(conn["source"])
-                target_node = nodes.get(conn["target"])
-                if source_node and target_node:
-                    source_node >> target_node
-
-        generation_time = time.time() - start_time
-        image_path = f"{diagram_path}.png"
-
-        if not os.path.exists(image_path):
-            raise FileNotFoundError("Diagram image not generated.")
-
-        with open(image_path, "rb") as f:
-            image_data = base64.b64encode(f.read()).decode("utf-8")
-
-        # Clean up temporary files and directories
-        os.remove(image_path)
-        # Remove the UUID subdirectory and any remaining files (like .dot files)
-        diagram_dir = os.path.dirname(diagram_path)
-        if os.path.exists(diagram_dir) and os.path.basename(
-            diagram_dir
-        ) != os.path.basename(self.temp_dir):
-            shutil.rmtree(diagram_dir)
-
-        metadata = {
+        async def render_missing() -> RenderJob:
+            # Run the CPU-intensive diagram generation off the event loop
+            with tracer.span("render", formats=",".join(missing)) as span:
+                job = await self.render_engine.submit(
+                    render_diagrams,
+                    analysis_result,
+                    description,
+                    self.temp_dir,
+                    pipeline=self.pipeline,
+                    formats=missing,
+                    size=size,
+                )
+                span.set_attribute("queue_wait", job.queue_wait)
+            RENDER_SECONDS.observe(
+                job.run_time,
+                format=",".join(missing),
+                nodes=graph_size_bucket(len(analysis_result.get("nodes", []))),
+            )
+            QUEUE_WAIT_SECONDS.observe(job.queue_wait)
+            for fmt, image_bytes in job.result.items():
+                PAYLOAD_BYTES.observe(len(image_bytes), format=fmt)
+                await self._cache_store(cache_keys.get(fmt), image_bytes)
+            return job
+
+        # Identical renders already in flight are awaited rather than repeated
+        flight_key = render_cache_key(
+            analysis_result, description, ",".join(missing), size
+        )
+        job = await self.render_flight.do(flight_key, render_missing)
+        images.update(job.result)
+        metadata = self._build_metadata(analysis_result, job.run_time, False)
+        metadata["queue_wait"] = job.queue_wait
+        metadata["timings"] = {"queue_wait": job.queue_wait, "render": job.run_time}
+        return {fmt: images[fmt] for fmt in formats}, metadata
+
+    async def _cache_lookup(
+        self,
+        analysis_result: dict[str, Any],
+        description: str,
+        formats: Sequence[str],
+        size: dict[str, str] | None,
+    ) -> tuple[dict[str, str], dict[str, bytes]]:
+        """Return render cache keys and any cached images, per format.
+
+        The memory tier is checked inline; the disk tier is read in a worker
+        thread so file I/O never blocks the event loop.
+        """
+        if self.render_cache is None:
+            return {}, {}
+        cache_keys: dict[str, str] = {}
+        images: dict[str, bytes] = {}
+        for fmt in formats:
+            cache_key = render_cache_key(analysis_result, description, fmt, size)
+            cache_keys[fmt] = cache_key
+            cached = self.render_cache.get_memory(cache_key)
+            if cached is None:
+                if self.render_cache.disk is not None:
+                    cached = await anyio.to_thread.run_sync(
+                        self.render_cache.get, cache_key
+                    )
+                else:
+                    cached = self.render_cache.get(cache_key)
+            CACHE_EVENTS.inc(
+                cache="render", result="hit" if cached is not None else "miss"
+            )
+            if cached is not None:
+                images[fmt] = cached
+                logger.info(f"Render cache hit {cache_key[:12]} {self._stats()}")
+        return cache_keys, images
+
+    async def _cache_store(self, cache_key: str | None, image_bytes: bytes) -> None:
+        """Store a freshly rendered image in the render cache."""
+        if self.render_cache is None or cache_key is None:
+            return
+        # Writing the disk tier may also evict, which scans the directory
+        await anyio.to_thread.run_sync(self.render_cache.set, cache_key, image_bytes)
+        logger.info(f"Render cache miss {cache_key[:12]} {self._stats()}")
+
+    def _stats(self) -> dict[str, int] | None:
+        return self.render_cache.stats() if self.render_cache is not None else None
+
+    def _build_metadata(
+        self,
+        analysis_result: dict[str, Any],
+        generation_time: float,
+        cache_hit: bool,
+    ) -> dict[str, Any]:
+        """Assemble response metadata for a rendered analysis."""
+        return {
             "nodes_created": len(analysis_result.get("nodes", [])),
-            "clusters_created": len(analysis_result.get("clusters", [])),
+            "clusters_created": _count_clusters(analysis_result.get("clusters", [])),
             "connections_made": len(analysis_result.get("connections", [])),
             "generation_time": generation_time,
+            "cache_hit": cache_hit,
+            "cache": self._stats(),
+            "timings": {"render": generation_time},
         }
-
-        return image_data, metadata
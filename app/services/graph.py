@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from typing import Any
+
+from app.logging import get_logger
+
+__all__ = ["CompiledGraph", "GraphCluster", "GraphNode", "compile_graph"]
+
+logger = get_logger(__name__)
+
+
+class GraphNode:
+    """A validated diagram node."""
+
+    __slots__ = ("cluster", "id", "label", "type")
+
+    def __init__(self, node_id: str, label: str, node_type: str) -> None:
+        self.id = node_id
+        self.label = label
+        # Lowercased by compile_graph so NODE_MAP lookups need no normalizing
+        self.type = node_type
+        self.cluster: GraphCluster | None = None
+
+
+class GraphCluster:
+    """A cluster of nodes, possibly nested inside another cluster."""
+
+    __slots__ = ("children", "label", "nodes", "parent")
+
+    def __init__(self, label: str, parent: GraphCluster | None = None) -> None:
+        self.label = label
+        self.parent = parent
+        self.nodes: list[GraphNode] = []
+        self.children: list[GraphCluster] = []
+
+
+class CompiledGraph:
+    """Indexed form of an LLM analysis, built in one linear pass.
+
+    Nodes are indexed by id, each node belongs to at most one cluster,
+    edges are de-duplicated and edges to unknown nodes are dropped.
+    """
+
+    __slots__ = ("clusters", "dropped_edges", "edges", "nodes")
+
+    def __init__(self) -> None:
+        self.nodes: dict[str, GraphNode] = {}
+        self.clusters: list[GraphCluster] = []
+        self.edges: list[tuple[GraphNode, GraphNode]] = []
+        self.dropped_edges = 0
+
+    @property
+    def unclustered(self) -> list[GraphNode]:
+        """Nodes outside every cluster, in analysis order."""
+        return [node for node in self.nodes.values() if node.cluster is None]
+
+
+def _add_cluster(
+    graph: CompiledGraph,
+    info: dict[str, Any],
+    parent: GraphCluster | None,
+) -> GraphCluster:
+    cluster = GraphCluster(str(info.get("label", "")), parent)
+    for node_id in info.get("nodes", []):
+        node = graph.nodes.get(node_id)
+        if node is None:
+            logger.warning(
+                f"Cluster '{cluster.label}' references unknown node '{node_id}'"
+            )
+        elif node.cluster is not None:
+            logger.warning(
+                f"Node '{node_id}' is already in cluster '{node.cluster.label}'"
+            )
+        else:
+            node.cluster = cluster
+            cluster.nodes.append(node)
+    for child in info.get("clusters", []):
+        cluster.children.append(_add_cluster(graph, child, cluster))
+    return cluster
+
+
+def compile_graph(analysis_result: dict[str, Any]) -> CompiledGraph:
+    """Validate and index an analysis dict; clusters may nest via ``clusters``."""
+    graph = CompiledGraph()
+    for details in analysis_result.get("nodes", []):
+        node_id = details.get("id")
+        if not node_id or node_id in graph.nodes:
+            logger.warning(f"Skipping node with missing or duplicate id: {details}")
+            continue
+        graph.nodes[node_id] = GraphNode(
+            node_id,
+            str(details.get("label", node_id)),
+            str(details.get("type", "")).lower(),
+        )
+
+    graph.clusters = [
+        _add_cluster(graph, info, None) for info in analysis_result.get("clusters", [])
+    ]
+
+    seen: set[tuple[str, str]] = set()
+    for conn in analysis_result.get("connections", []):
+        source = graph.nodes.get(conn.get("source"))
+        target = graph.nodes.get(conn.get("target"))
+        if source is None or target is None:
+            graph.dropped_edges += 1
+            continue
+        key = (source.id, target.id)
+        if key not in seen:
+            seen.add(key)
+            graph.edges.append((source, target))
+    if graph.dropped_edges:
+        logger.warning(f"Dropped {graph.dropped_edges} connections to unknown nodes")
+    return graph
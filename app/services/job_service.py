@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+import uuid
+from collections import deque
+from typing import Any
+
+from app.config import Settings
+from app.llm_scheduler import llm_lane
+from app.logging import get_logger
+from app.models.diagram import DiagramRequest
+from app.services.diagram_service import DiagramService
+from app.services.renderer import normalize_formats, size_attrs
+
+__all__ = ["Job", "JobQueueFullError", "JobService"]
+
+logger = get_logger(__name__)
+
+
+class JobQueueFullError(RuntimeError):
+    """Raised when the job queue cannot accept more jobs."""
+
+
+class Job:
+    """State of one asynchronous diagram generation job."""
+
+    __slots__ = (
+        "id",
+        "request",
+        "status",
+        "created_at",
+        "started_at",
+        "finished_at",
+        "images",
+        "metadata",
+        "error",
+    )
+
+    def __init__(self, request: DiagramRequest) -> None:
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.images: dict[str, bytes] | None = None
+        self.metadata: dict[str, Any] | None = None
+        self.error: str | None = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+
+class JobService:
+    """In-process job queue with a fixed pool of worker tasks.
+
+    Jobs are kept in memory until ``retention`` seconds after they finish.
+    At most ``max_jobs`` are tracked and finished jobs hold at most
+    ``max_bytes`` of images in total; the oldest finished jobs are dropped
+    first. No external broker is involved.
+    """
+
+    def __init__(
+        self,
+        diagram_service: DiagramService,
+        workers: int = 4,
+        queue_size: int = 1000,
+        retention: float = 3600.0,
+        max_jobs: int = 10000,
+        *,
+        max_bytes: int = 256 * 1024 * 1024,
+    ) -> None:
+        self.diagram_service = diagram_service
+        self.workers = workers
+        self.retention = retention
+        self.max_jobs = max_jobs
+        self.max_bytes = max_bytes
+        # Image bytes held by finished jobs
+        self._bytes = 0
+        self._queue: asyncio.Queue[Job] = asyncio.Queue(maxsize=queue_size)
+        self._jobs: dict[str, Job] = {}
+        # Finished jobs in completion order, so pruning never scans active jobs
+        self._finished: deque[Job] = deque()
+        self._tasks: list[asyncio.Task] = []
+
+    @classmethod
+    def from_settings(
+        cls, settings: Settings, diagram_service: DiagramService
+    ) -> JobService:
+        """Build a job service from application settings."""
+        return cls(
+            diagram_service,
+            workers=settings.job_workers,
+            queue_size=settings.job_queue_size,
+            retention=settings.job_retention,
+            max_jobs=settings.job_max_jobs,
+            max_bytes=settings.job_max_bytes,
+        )
+
+    def start(self) -> None:
+        """Start the worker tasks on the running event loop."""
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._worker()) for _ in range(self.workers)
+            ]
+
+    async def stop(self) -> None:
+        """Cancel the worker tasks, failing jobs that did not finish."""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+        while not self._queue.empty():
+            job = self._queue.get_nowait()
+            self._queue.task_done()
+            job.error = "Cancelled at shutdown"
+            job.status = "failed"
+            job.finished_at = time.time()
+            self._finished.append(job)
+
+    def submit(self, request: DiagramRequest) -> Job:
+        """Queue a diagram request and return its job immediately."""
+        normalize_formats(request.format)
+        size_attrs(request.size)
+        self.start()
+        self._prune(reserve=1)
+        if len(self._jobs) >= self.max_jobs:
+            raise JobQueueFullError("Too many jobs are being tracked, try again later")
+        job = Job(request)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull as e:
+            raise JobQueueFullError("Job queue is full, try again later") from e
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        """Return a job by id, or None if unknown or expired."""
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def _prune(self, reserve: int = 0) -> None:
+        """Drop finished jobs past their retention or over capacity, oldest first.
+
+        ``reserve`` makes room for that many jobs about to be added.
+        """
+        cutoff = time.time() - self.retention
+        while self._finished and (
+            self._finished[0].finished_at < cutoff  # type: ignore[operator]
+            or len(self._jobs) + reserve > self.max_jobs
+            or self._bytes > self.max_bytes
+        ):
+            job = self._finished.popleft()
+            self._bytes -= _image_bytes(job)
+            self._jobs.pop(job.id, None)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        request = job.request
+        try:
+            # Jobs are background work; interactive LLM calls go first
+            with llm_lane("bulk"):
+                images, metadata = await self.diagram_service.generate_diagram_images(
+                    request.description, normalize_formats(request.format), request.size
+                )
+            job.images, job.metadata = images, metadata
+            job.status = "succeeded"
+        except Exception as e:
+            logger.warning(f"Job {job.id} failed: {e}")
+            job.error = str(e) or type(e).__name__
+            job.status = "failed"
+        except asyncio.CancelledError:
+            job.error = "Cancelled at shutdown"
+            job.status = "failed"
+            raise
+        finally:
+            job.finished_at = time.time()
+            self._finished.append(job)
+            self._bytes += _image_bytes(job)
+            self._prune()
+
+    def stats(self) -> dict[str, int]:
+        """Return queue depth, tracked job count and retained image bytes."""
+        return {
+            "queued": self._queue.qsize(),
+            "tracked": len(self._jobs),
+            "bytes": self._bytes,
+        }
+
+
+def _image_bytes(job: Job) -> int:
+    return sum(len(data) for data in job.images.values()) if job.images else 0
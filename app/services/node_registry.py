@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import ast
+import importlib
+import importlib.metadata
+import importlib.util
+import json
+import os
+import re
+import threading
+from collections.abc import Iterator, Mapping, Sequence
+
+from app.config import Settings, settings
+from app.logging import get_logger
+
+__all__ = ["PROVIDERS", "NodeRegistry", "build_index", "node_registry"]
+
+logger = get_logger(__name__)
+
+# Searched in order; an unqualified name resolves to the first provider defining it
+PROVIDERS = ("aws", "gcp", "azure", "k8s", "onprem", "generic")
+
+# Bump when the index layout changes so stale files on disk are rebuilt
+_INDEX_FORMAT = 1
+
+# Generic names the prompts suggest, mapped to the node they have always drawn
+_ALIASES: dict[str, tuple[str, str]] = {
+    "service": ("diagrams.aws.compute", "EC2"),
+    "microservice": ("diagrams.aws.compute", "EC2"),
+    "auth_service": ("diagrams.aws.compute", "EC2"),
+    "payment_service": ("diagrams.aws.compute", "EC2"),
+    "order_service": ("diagrams.aws.compute", "EC2"),
+    "web_server": ("diagrams.aws.compute", "EC2"),
+    "database": ("diagrams.aws.database", "RDS"),
+    "queue": ("diagrams.aws.integration", "SQS"),
+    "gateway": ("diagrams.aws.network", "APIGateway"),
+    # aws.mobile defines an APIGateway too; keep the network one
+    "api_gateway": ("diagrams.aws.network", "APIGateway"),
+    "apigateway": ("diagrams.aws.network", "APIGateway"),
+    "monitoring": ("diagrams.aws.management", "Cloudwatch"),
+    "internet_gateway": ("diagrams.aws.network", "InternetGateway"),
+}
+
+_CAMEL_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])")
+_SEPARATORS = re.compile(r"[\s\-]+")
+
+
+def _snake(name: str) -> str:
+    return _CAMEL_BOUNDARY.sub("_", name).lower()
+
+
+def normalize_type(name: str) -> str:
+    """Canonical form of a node type: lowercase with underscores."""
+    return _SEPARATORS.sub("_", name.strip().lower())
+
+
+def _module_names(path: str) -> dict[str, str]:
+    """Public classes in a module file and their aliases, without importing it."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    names: dict[str, str] = {}
+    for statement in tree.body:
+        if isinstance(statement, ast.ClassDef) and not statement.name.startswith("_"):
+            names[statement.name] = statement.name
+        elif (
+            isinstance(statement, ast.Assign)
+            and isinstance(statement.value, ast.Name)
+            and statement.value.id in names
+        ):
+            # Aliases such as ``ALB = ElbApplicationLoadBalancer``
+            for target in statement.targets:
+                if isinstance(target, ast.Name):
+                    names[target.id] = statement.value.id
+    return names
+
+
+def build_index(providers: Sequence[str] = PROVIDERS) -> dict[str, list[str]]:
+    """Map every alias of every provider node class to ``[module, class]``.
+
+    Each class is reachable by its lowercased name, its snake_case name and
+    the ``<provider>.<name>`` and ``<provider>.<category>.<name>`` forms.
+    """
+    spec = importlib.util.find_spec("diagrams")
+    if spec is None or not spec.submodule_search_locations:
+        raise RuntimeError("The diagrams package is not installed")
+    root = spec.submodule_search_locations[0]
+    index: dict[str, list[str]] = {}
+    for provider in providers:
+        directory = os.path.join(root, provider)
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".py") or filename.startswith("_"):
+                continue
+            category = filename[:-3]
+            module = f"diagrams.{provider}.{category}"
+            for name, target in _module_names(
+                os.path.join(directory, filename)
+            ).items():
+                for alias in {name.lower(), _snake(name)}:
+                    for key in (
+                        alias,
+                        f"{provider}.{alias}",
+                        f"{provider}.{category}.{alias}",
+                    ):
+                        index.setdefault(key, [module, target])
+    return index
+
+
+class NodeRegistry(Mapping[str, type]):
+    """Lazily resolves analysis node types to ``diagrams`` node classes.
+
+    Types are looked up in an alias index covering every class of the
+    configured providers. The index is built by parsing the provider
+    sources once and cached as JSON at ``index_path``; a node module is
+    only imported the first time one of its types is drawn.
+    """
+
+    def __init__(
+        self, providers: Sequence[str] = PROVIDERS, index_path: str | None = None
+    ) -> None:
+        self.providers = tuple(providers)
+        self.index_path = index_path
+        self._index: dict[str, list[str]] | None = None
+        self._classes: dict[str, type | None] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> NodeRegistry:
+        """Build a node registry from application settings."""
+        return cls(
+            providers=[p.strip() for p in settings.node_providers.split(",") if p],
+            index_path=settings.node_index_path
+            or os.path.join(settings.tmp_dir, "node-index.json"),
+        )
+
+    @property
+    def index(self) -> dict[str, list[str]]:
+        """The alias index, loaded from disk or built on first use."""
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._load() or self._build()
+        return self._index
+
+    def _fingerprint(self) -> dict[str, object]:
+        return {
+            "format": _INDEX_FORMAT,
+            "diagrams": importlib.metadata.version("diagrams"),
+            "providers": list(self.providers),
+        }
+
+    def _load(self) -> dict[str, list[str]] | None:
+        if not self.index_path:
+            return None
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("fingerprint") != self._fingerprint():
+            return None
+        return data["aliases"]
+
+    def _build(self) -> dict[str, list[str]]:
+        index = build_index(self.providers)
+        if self.index_path:
+            payload = {"fingerprint": self._fingerprint(), "aliases": index}
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(payload, f)
+                os.replace(tmp_path, self.index_path)
+            except OSError as e:
+                logger.warning(f"Could not cache node index at {self.index_path}: {e}")
+        logger.info(f"Built node index with {len(index)} aliases")
+        return index
+
+    def _locate(self, node_type: str) -> tuple[str, str] | None:
+        key = normalize_type(node_type)
+        if key in _ALIASES:
+            return _ALIASES[key]
+        entry = self.index.get(key) or self.index.get(key.replace("_", ""))
+        return (entry[0], entry[1]) if entry else None
+
+    def resolve(self, node_type: str) -> type | None:
+        """Node class for a type, importing its module on first use."""
+        if node_type in self._classes:
+            return self._classes[node_type]
+        location = self._locate(node_type)
+        node_class = None
+        if location is not None:
+            module, name = location
+            node_class = getattr(importlib.import_module(module), name)
+        self._classes[node_type] = node_class
+        return node_class
+
+    def __getitem__(self, node_type: str) -> type:
+        node_class = self.resolve(node_type)
+        if node_class is None:
+            raise KeyError(node_type)
+        return node_class
+
+    def __contains__(self, node_type: object) -> bool:
+        return isinstance(node_type, str) and self._locate(node_type) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        yield from _ALIASES
+        yield from (alias for alias in self.index if alias not in _ALIASES)
+
+    def __len__(self) -> int:
+        return len(_ALIASES) + sum(1 for alias in self.index if alias not in _ALIASES)
+
+
+node_registry = NodeRegistry.from_settings(settings)
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any
+
+from app.cache import LRUCache
+from app.config import Settings
+from app.logging import get_logger
+
+__all__ = ["RenderCache", "DiskCache", "normalize_analysis", "render_cache_key"]
+
+logger = get_logger(__name__)
+
+
+def _normalize_clusters(clusters: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    normalized = [
+        {
+            "label": str(cluster.get("label", "")).strip(),
+            "nodes": sorted(str(n).strip() for n in cluster.get("nodes", [])),
+            "clusters": _normalize_clusters(cluster.get("clusters", [])),
+        }
+        for cluster in clusters
+    ]
+    return sorted(normalized, key=lambda cluster: json.dumps(cluster, sort_keys=True))
+
+
+def normalize_analysis(analysis: dict[str, Any]) -> dict[str, Any]:
+    """Return a canonical form of an analysis dict, independent of ordering."""
+    nodes = sorted(
+        (
+            {
+                "id": str(node.get("id", "")).strip(),
+                "type": str(node.get("type", "")).strip().lower(),
+                "label": str(node.get("label", "")).strip(),
+            }
+            for node in analysis.get("nodes", [])
+        ),
+        key=lambda node: node["id"],
+    )
+    clusters = _normalize_clusters(analysis.get("clusters", []))
+    connections = sorted(
+        {
+            (str(conn.get("source", "")).strip(), str(conn.get("target", "")).strip())
+            for conn in analysis.get("connections", [])
+        }
+    )
+    return {
+        "nodes": nodes,
+        "clusters": clusters,
+        "connections": [{"source": s, "target": t} for s, t in connections],
+    }
+
+
+def render_cache_key(
+    analysis: dict[str, Any],
+    title: str,
+    outformat: str,
+    size: dict[str, str] | None = None,
+) -> str:
+    """Build a content hash identifying a rendered diagram."""
+    payload = {
+        "analysis": normalize_analysis(analysis),
+        "title": title.strip(),
+        "format": outformat.lower(),
+        "size": size or {},
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """Size-bounded on-disk cache that can be shared by several processes.
+
+    Entries are written atomically via rename, so concurrent workers never
+    observe partial files. Recency is tracked through file mtimes and the
+    least recently used files are removed once the directory exceeds
+    ``max_bytes``. Files used within the last ``min_age`` seconds are never
+    removed, even if that leaves the directory over the limit.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, min_age: float = 0.0) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_age = min_age
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._approx_bytes = self._scan_size()
+
+    def path(self, key: str) -> str:
+        """Return the file path used for an entry."""
+        return os.path.join(self.directory, key[:2], f"{key}.bin")
+
+    def get(self, key: str) -> bytes | None:
+        """Read an entry and refresh its recency, or return None."""
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def set(self, key: str, data: bytes) -> None:
+        """Atomically write an entry and enforce the size bound."""
+        if len(data) > self.max_bytes:
+            return
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self._approx_bytes += len(data)
+            if self._approx_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith(".bin"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self) -> None:
+        """Remove least recently used files until usage drops below 90%."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        cutoff = time.time() - self.min_age
+        for mtime, size, path in entries:
+            if total <= target or mtime > cutoff:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+        self._approx_bytes = total
+
+
+class RenderCache:
+    """Two-tier cache of rendered diagram images keyed by content hash."""
+
+    def __init__(
+        self,
+        memory_items: int = 256,
+        disk_dir: str | None = None,
+        disk_max_bytes: int = 0,
+    ) -> None:
+        self.memory: LRUCache[str, bytes] = LRUCache(maxsize=memory_items)
+        self.disk = (
+            DiskCache(disk_dir, disk_max_bytes)
+            if disk_dir and disk_max_bytes > 0
+            else None
+        )
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> RenderCache:
+        """Build a render cache from application settings."""
+        disk_dir = settings.render_cache_dir or os.path.join(
+            settings.tmp_dir, "render-cache"
+        )
+        return cls(
+            memory_items=settings.render_cache_memory_items,
+            disk_dir=disk_dir,
+            disk_max_bytes=settings.render_cache_disk_bytes,
+        )
+
+    def get_memory(self, key: str) -> bytes | None:
+        """Look up a rendered image in memory only.
+
+        Hits are counted, misses are not, since :meth:`get` may still find
+        the image on disk.
+        """
+        data = self.memory.get(key)
+        if data is not None:
+            self.hits += 1
+        return data
+
+    def get(self, key: str) -> bytes | None:
+        """Look up a rendered image in memory, then on disk."""
+        data = self.memory.get(key)
+        if data is None and self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                self.memory.set(key, data)
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    def set(self, key: str, data: bytes) -> None:
+        """Store a rendered image in both tiers."""
+        self.memory.set(key, data)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, data)
+            except OSError as e:
+                logger.warning(f"Failed to write render cache entry {key}: {e}")
+
+    def stats(self) -> dict[str, int]:
+        """Return hit, miss and eviction counters for both tiers."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_evictions": self.memory.evictions,
+            "disk_evictions": self.disk.evictions if self.disk else 0,
+        }
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import importlib
+import multiprocessing
+import os
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, NamedTuple
+
+import anyio
+
+from app.config import Settings
+from app.logging import get_logger
+from app.tracing import current_span, tracer
+
+__all__ = ["RenderEngine", "RenderJob", "RenderQueueFullError"]
+
+logger = get_logger(__name__)
+
+
+class RenderQueueFullError(RuntimeError):
+    """Raised when the render queue cannot accept more jobs."""
+
+
+class RenderJob(NamedTuple):
+    """Result of a render job along with its timing."""
+
+    result: Any
+    queue_wait: float
+    run_time: float
+
+
+def _warm_worker() -> None:
+    """Import the renderer and load the node type index up front."""
+    renderer = importlib.import_module("app.services.renderer")
+    _ = renderer.NODE_MAP.index
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _timed_call(
+    fn: Callable[[], Any], traceparent: str | None = None
+) -> tuple[Any, float, float]:
+    """Run a job and report its wall-clock start and end times.
+
+    The job runs in a span continuing the submitter's trace, which is passed
+    as a ``traceparent`` string because context does not cross processes.
+    """
+    started = time.time()
+    name = getattr(getattr(fn, "func", fn), "__name__", "job")
+    try:
+        with tracer.span(f"render_worker.{name}", parent=traceparent, pid=os.getpid()):
+            result = fn()
+    finally:
+        if multiprocessing.parent_process() is not None:
+            # Pool workers exit without running atexit hooks, export right away
+            tracer.flush()
+    return result, started, time.time()
+
+
+class RenderEngine:
+    """Dedicated executor for graphviz rendering with a bounded job queue.
+
+    The ``process`` backend runs jobs in a pool of pre-warmed worker
+    processes, so rendering scales with cores and never occupies the event
+    loop's default thread pool. The ``thread`` backend keeps jobs in-process
+    behind a dedicated capacity limiter. In both cases at most ``workers +
+    queue_size`` jobs are admitted; further submissions fail fast with
+    :class:`RenderQueueFullError`. If a worker process dies, the jobs it
+    took down fail and the pool is replaced for the jobs that follow.
+    """
+
+    def __init__(
+        self, backend: str = "process", workers: int = 0, queue_size: int = 32
+    ) -> None:
+        if backend not in ("process", "thread"):
+            raise ValueError(f"Unknown render backend '{backend}'")
+        self.backend = backend
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self._executor: ProcessPoolExecutor | None = None
+        self._limiter: anyio.CapacityLimiter | None = None
+        self._pending = 0
+        # Process jobs release their slot from the executor's thread
+        self._pending_lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.restarts = 0
+        self.total_queue_wait = 0.0
+        self.total_run_time = 0.0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> RenderEngine:
+        """Build a render engine from application settings."""
+        return cls(
+            backend=settings.render_backend,
+            workers=settings.render_workers,
+            queue_size=settings.render_queue_size,
+        )
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+            )
+        return self._executor
+
+    def _warm(self, executor: ProcessPoolExecutor) -> list[Future[int]]:
+        return [executor.submit(_ping) for _ in range(self.workers)]
+
+    def _replace_broken(self, executor: ProcessPoolExecutor) -> None:
+        """Swap a pool broken by a dead worker for a fresh, warming one."""
+        if self._executor is not executor:
+            return  # already replaced by another job from the same pool
+        logger.warning("A render worker died, restarting the render pool")
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self.restarts += 1
+        self._warm(self._get_executor())
+
+    def _get_limiter(self) -> anyio.CapacityLimiter:
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(self.workers)
+        return self._limiter
+
+    async def start(self) -> None:
+        """Spawn and warm every worker so the first renders pay no import cost."""
+        if self.backend != "process":
+            return
+        pids = await asyncio.gather(
+            *(asyncio.wrap_future(f) for f in self._warm(self._get_executor()))
+        )
+        logger.info(f"Render engine started {len(set(pids))} worker processes")
+
+    def shutdown(self) -> None:
+        """Stop worker processes, cancelling jobs that have not started."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def submit(
+        self, fn: Callable[..., Any], *args: Any, **kwargs: Any
+    ) -> RenderJob:
+        """Run a picklable function on the engine and wait for its result."""
+        call = functools.partial(fn, *args, **kwargs)
+        with self._pending_lock:
+            if self._pending >= self.workers + self.queue_size:
+                self.rejected += 1
+                raise RenderQueueFullError("Render queue is full, try again later")
+            self._pending += 1
+
+        span = current_span()
+        traceparent = span.traceparent if span else None
+        submitted = time.time()
+        try:
+            if self.backend == "process":
+                result, started, finished = await self._run_in_process(
+                    call, traceparent
+                )
+            else:
+                try:
+                    # Not cancellable, so the slot is held until the thread ends
+                    result, started, finished = await anyio.to_thread.run_sync(
+                        _timed_call, call, traceparent, limiter=self._get_limiter()
+                    )
+                finally:
+                    self._release()
+        except Exception:
+            self.failed += 1
+            raise
+
+        job = RenderJob(result, max(started - submitted, 0.0), finished - started)
+        self.completed += 1
+        self.total_queue_wait += job.queue_wait
+        self.total_run_time += job.run_time
+        return job
+
+    async def _run_in_process(
+        self, call: Callable[[], Any], traceparent: str | None
+    ) -> tuple[Any, float, float]:
+        executor = self._get_executor()
+        try:
+            try:
+                future = executor.submit(_timed_call, call, traceparent)
+            except BrokenProcessPool:
+                # A worker died after the last job; submit to a fresh pool
+                self._replace_broken(executor)
+                executor = self._get_executor()
+                future = executor.submit(_timed_call, call, traceparent)
+        except BaseException:
+            self._release()
+            raise
+        # Free the slot when the job ends, not when the caller stops waiting:
+        # a cancelled caller leaves a started job running in its worker
+        future.add_done_callback(lambda _: self._release())
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            self._replace_broken(executor)
+            raise
+
+    def _release(self) -> None:
+        with self._pending_lock:
+            self._pending -= 1
+
+    def stats(self) -> dict[str, Any]:
+        """Return queue depth and job counters."""
+        return {
+            "backend": self.backend,
+            "workers": self.workers,
+            "pending": self._pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+            "total_queue_wait": self.total_queue_wait,
+            "total_run_time": self.total_run_time,
+        }
@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import base64
+import functools
+import os
+import re
+import time
+import uuid
+from collections.abc import Sequence
+from typing import Any
+
+import graphviz
+from diagrams import Cluster, Diagram, setdiagram
+from diagrams.generic.blank import Blank
+from graphviz import Digraph
+
+from app.logging import get_logger
+from app.services.graph import GraphCluster, GraphNode, compile_graph
+from app.services.node_registry import node_registry
+
+__all__ = [
+    "NODE_MAP",
+    "OUTPUT_FORMATS",
+    "build_dot",
+    "cleanup_orphans",
+    "normalize_formats",
+    "render_diagram",
+    "render_diagrams",
+    "size_attrs",
+]
+
+logger = get_logger(__name__)
+
+GRAPH_ATTR = {
+    "pad": "0.1",
+    "splines": "ortho",
+    "rankdir": "LR",
+    "nodesep": "0.8",
+    "ranksep": "1.2",
+}
+
+OUTPUT_FORMATS = ("png", "svg", "jpg", "pdf")
+_FORMAT_ALIASES = {"jpeg": "jpg"}
+
+# Absolute icon paths that graphviz embeds as references in SVG output
+_SVG_IMAGE_HREF = re.compile(rb'xlink:href="(/[^"]+\.png)"')
+
+# Names written by the file pipeline: "<uuid>" DOT sources and "<uuid>.<ext>" images
+_ORPHAN_NAME = re.compile(
+    r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}(\.\w+)?$"
+)
+
+# Node types resolve lazily across every provider; see node_registry
+NODE_MAP = node_registry
+
+
+class InMemoryDiagram(Diagram):
+    """Diagram context that only builds the DOT graph and never writes files."""
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        setdiagram(None)
+
+
+def _make_node(node: GraphNode) -> Any:
+    node_class = NODE_MAP.get(node.type)
+    if node_class is None:
+        logger.warning(
+            f"Unknown node type '{node.type}' for node '{node.id}', using generic node"
+        )
+        return Blank(f"Unknown: {node.label}")
+    return node_class(node.label)
+
+
+def _emit_cluster(cluster: GraphCluster, nodes: dict[str, Any]) -> None:
+    with Cluster(cluster.label):
+        for node in cluster.nodes:
+            nodes[node.id] = _make_node(node)
+        for child in cluster.children:
+            _emit_cluster(child, nodes)
+
+
+def _populate(analysis_result: dict[str, Any]) -> None:
+    """Create clusters, nodes and connections inside the active diagram context."""
+    graph = compile_graph(analysis_result)
+    nodes: dict[str, Any] = {}
+    for cluster in graph.clusters:
+        _emit_cluster(cluster, nodes)
+    for node in graph.unclustered:
+        nodes[node.id] = _make_node(node)
+    for source, target in graph.edges:
+        nodes[source.id] >> nodes[target.id]
+
+
+def normalize_formats(outformat: str | Sequence[str] | None) -> list[str]:
+    """Validate requested output formats and return them de-duplicated."""
+    requested = [outformat or "png"] if isinstance(outformat, str | None) else outformat
+    formats: list[str] = []
+    for name in requested:
+        fmt = _FORMAT_ALIASES.get(name.lower(), name.lower())
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(
+                f"Unsupported format '{fmt}', expected one of {', '.join(OUTPUT_FORMATS)}"
+            )
+        if fmt not in formats:
+            formats.append(fmt)
+    if not formats:
+        raise ValueError("At least one output format is required")
+    return formats
+
+
+def size_attrs(size: dict[str, str] | None) -> dict[str, str]:
+    """Translate a request size (pixel width/height, dpi) into graph attributes."""
+    if not size:
+        return {}
+    try:
+        dpi = float(size.get("dpi", 96))
+        width = float(size["width"]) / dpi if "width" in size else None
+        height = float(size["height"]) / dpi if "height" in size else None
+    except (TypeError, ValueError, ZeroDivisionError) as e:
+        raise ValueError(f"Invalid size {size}") from e
+    attrs = {"dpi": f"{dpi:g}"}
+    if width is not None or height is not None:
+        # Graphviz sizes are in inches; an unbounded side gets a huge limit
+        attrs["size"] = f"{width or 1000:.3f},{height or 1000:.3f}"
+    return attrs
+
+
+def build_dot(
+    analysis_result: dict[str, Any],
+    title: str,
+    size: dict[str, str] | None = None,
+) -> Digraph:
+    """Build the graphviz graph for an analysis entirely in memory."""
+    with InMemoryDiagram(
+        title,
+        filename="diagram",
+        show=False,
+        outformat="png",
+        graph_attr={**GRAPH_ATTR, **size_attrs(size)},
+    ) as diagram:
+        _populate(analysis_result)
+    return diagram.dot
+
+
+@functools.lru_cache(maxsize=512)
+def _icon_data_uri(path: bytes) -> bytes:
+    with open(path, "rb") as f:
+        return b"data:image/png;base64," + base64.b64encode(f.read())
+
+
+def _inline_svg_images(svg: bytes) -> bytes:
+    """Embed node icons so the SVG renders outside this machine."""
+
+    def replace(match: re.Match[bytes]) -> bytes:
+        try:
+            return b'xlink:href="' + _icon_data_uri(match.group(1)) + b'"'
+        except OSError:
+            return match.group(0)
+
+    return _SVG_IMAGE_HREF.sub(replace, svg)
+
+
+def render_diagrams(
+    analysis_result: dict[str, Any],
+    title: str,
+    tmp_dir: str,
+    *,
+    pipeline: str = "memory",
+    formats: Sequence[str] = ("png",),
+    size: dict[str, str] | None = None,
+) -> dict[str, bytes]:
+    """Render an analysis with graphviz in one or more formats.
+
+    The ``memory`` pipeline pipes DOT source to graphviz over stdin/stdout.
+    When several formats are requested the layout runs once (``-Tdot``) and
+    each format is produced from the positioned graph with ``neato -n2``,
+    which skips layout entirely. The ``file`` pipeline renders through
+    temporary files in ``tmp_dir``. Kept free of service state so it can run
+    in thread or process workers.
+    """
+    formats = normalize_formats(list(formats))
+    if pipeline == "memory":
+        dot = build_dot(analysis_result, title, size)
+        if len(formats) == 1:
+            images = {formats[0]: dot.pipe(format=formats[0])}
+        else:
+            laid_out = dot.pipe(format="dot")
+            images = {
+                fmt: graphviz.pipe("neato", fmt, laid_out, neato_no_op=2)
+                for fmt in formats
+            }
+    else:
+        images = _render_to_files(analysis_result, title, tmp_dir, formats, size)
+    if "svg" in images:
+        images["svg"] = _inline_svg_images(images["svg"])
+    return images
+
+
+def render_diagram(
+    analysis_result: dict[str, Any],
+    title: str,
+    tmp_dir: str,
+    *,
+    pipeline: str = "memory",
+    outformat: str = "png",
+    size: dict[str, str] | None = None,
+) -> bytes:
+    """Render an analysis with graphviz in a single format."""
+    images = render_diagrams(
+        analysis_result,
+        title,
+        tmp_dir,
+        pipeline=pipeline,
+        formats=[outformat],
+        size=size,
+    )
+    return next(iter(images.values()))
+
+
+def _render_to_files(
+    analysis_result: dict[str, Any],
+    title: str,
+    tmp_dir: str,
+    formats: list[str],
+    size: dict[str, str] | None,
+) -> dict[str, bytes]:
+    diagram_path = os.path.join(tmp_dir, str(uuid.uuid4()))
+    image_paths = {fmt: f"{diagram_path}.{fmt}" for fmt in formats}
+    try:
+        with Diagram(
+            title,
+            filename=diagram_path,
+            show=False,
+            outformat=formats,
+            graph_attr={**GRAPH_ATTR, **size_attrs(size)},
+        ):
+            _populate(analysis_result)
+
+        images = {}
+        for fmt, image_path in image_paths.items():
+            if not os.path.exists(image_path):
+                raise FileNotFoundError("Diagram image not generated.")
+            with open(image_path, "rb") as f:
+                images[fmt] = f.read()
+        return images
+    finally:
+        # Clean up the images and any DOT source left behind by a failed render
+        for path in (*image_paths.values(), diagram_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def cleanup_orphans(tmp_dir: str, max_age: float) -> int:
+    """Remove file-pipeline leftovers older than ``max_age`` seconds."""
+    removed = 0
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(tmp_dir))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if not entry.is_file() or not _ORPHAN_NAME.match(entry.name):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+    if removed:
+        logger.info(f"Removed {removed} orphaned render files from {tmp_dir}")
+    return removed
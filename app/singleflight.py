@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any, Generic, TypeVar
+
+__all__ = ["SingleFlight"]
+
+T = TypeVar("T")
+
+
+class _Call:
+    """One in-flight call and the number of callers awaiting it."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(Generic[T]):
+    """Coalesce concurrent async calls that share a key into one execution.
+
+    The first caller for a key starts the work as a separate task; callers
+    arriving while it runs await the same task instead of starting their own.
+    A cancelled caller only stops waiting, and the work itself is cancelled
+    once every caller waiting on it has gone away.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, _Call] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Return the result of ``fn()``, sharing it with concurrent callers of ``key``."""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Detach first so a new caller starts fresh work instead of
+                # joining the task being cancelled
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Nobody may be left to observe a failure, so mark it retrieved
+        if not call.task.cancelled():
+            call.task.exception()
+
+    def stats(self) -> dict[str, Any]:
+        """Return execution and coalesced-waiter counters."""
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls),
+        }
@@ -0,0 +1,369 @@
+from __future__ import annotations
+
+import contextlib
+import json
+import logging
+import os
+import secrets
+import sys
+import threading
+import time
+import urllib.request
+from collections.abc import Iterator
+from contextvars import ContextVar
+from typing import IO, Any, Protocol
+
+from app.config import Settings, settings
+
+__all__ = [
+    "ConsoleExporter",
+    "FileExporter",
+    "OTLPExporter",
+    "Span",
+    "SpanExporter",
+    "Tracer",
+    "current_span",
+    "parse_traceparent",
+    "tracer",
+]
+
+# app.logging imports this module to stamp trace ids on log records
+logger = logging.getLogger(__name__)
+
+_OTLP_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+_current: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Span | None:
+    """Return the span active in the current task or thread, if any."""
+    return _current.get()
+
+
+def parse_traceparent(header: str | None) -> tuple[str, str] | None:
+    """Extract ``(trace_id, span_id)`` from a W3C ``traceparent`` header."""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    trace_id, span_id = parts[1].lower(), parts[2].lower()
+    try:
+        int(trace_id, 16)
+        int(span_id, 16)
+    except ValueError:
+        return None
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id, span_id
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    __slots__ = (
+        "attributes",
+        "end_ns",
+        "error",
+        "kind",
+        "name",
+        "parent_id",
+        "span_id",
+        "start_ns",
+        "trace_id",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: str | None = None,
+        kind: str = "internal",
+        attributes: dict[str, Any] | None = None,
+    ) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.error: str | None = None
+
+    @property
+    def traceparent(self) -> str:
+        """W3C ``traceparent`` header value pointing at this span."""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    @property
+    def duration(self) -> float:
+        """Seconds between start and end (or now, while still open)."""
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class SpanExporter(Protocol):
+    """Destination for finished spans."""
+
+    def export(self, spans: list[Span]) -> None: ...
+
+
+class ConsoleExporter:
+    """Write each span as a JSON line to a stream (stdout by default)."""
+
+    def __init__(self, stream: IO[str] | None = None) -> None:
+        self.stream = stream
+
+    def export(self, spans: list[Span]) -> None:
+        stream = self.stream or sys.stdout
+        for span in spans:
+            stream.write(json.dumps(span.to_dict(), default=str) + "\n")
+        stream.flush()
+
+
+class FileExporter:
+    """Append spans as JSON lines to a local file.
+
+    Lines are written with a single append so render worker processes can
+    share the file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def export(self, spans: list[Span]) -> None:
+        if directory := os.path.dirname(self.path):
+            os.makedirs(directory, exist_ok=True)
+        lines = "".join(json.dumps(s.to_dict(), default=str) + "\n" for s in spans)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict[str, Any]) -> list[dict[str, Any]]:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()]
+
+
+class OTLPExporter:
+    """Send spans to an OpenTelemetry collector using OTLP/HTTP with JSON."""
+
+    def __init__(
+        self, endpoint: str, service_name: str = "diagram-api", timeout: float = 5.0
+    ) -> None:
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def encode(self, spans: list[Span]) -> dict[str, Any]:
+        """Build an ``ExportTraceServiceRequest`` payload."""
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": _otlp_attributes(
+                            {"service.name": self.service_name}
+                        )
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [self._encode_span(s) for s in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def _encode_span(self, span: Span) -> dict[str, Any]:
+        encoded: dict[str, Any] = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": _OTLP_KINDS.get(span.kind, 1),
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns or span.start_ns),
+            "attributes": _otlp_attributes(span.attributes),
+        }
+        if span.parent_id:
+            encoded["parentSpanId"] = span.parent_id
+        if span.error is not None:
+            encoded["status"] = {"code": 2, "message": span.error}
+        return encoded
+
+    def export(self, spans: list[Span]) -> None:
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(self.encode(spans)).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class Tracer:
+    """Creates spans and hands finished ones to an exporter in batches.
+
+    Spans are always created so trace ids reach the logs; without an
+    exporter they are simply discarded when they end. Export happens on a
+    background thread so a slow collector never blocks the event loop, and
+    at most ``max_queue`` unexported spans are held before new ones are
+    dropped.
+    """
+
+    def __init__(
+        self,
+        exporter: SpanExporter | None = None,
+        batch_size: int = 64,
+        flush_interval: float = 2.0,
+        max_queue: int = 4096,
+    ) -> None:
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue: list[Span] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._thread_pid: int | None = None
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> Tracer:
+        """Build a tracer with the exporter chosen in application settings."""
+        return cls(_create_exporter(settings))
+
+    @contextlib.contextmanager
+    def span(
+        self,
+        name: str,
+        *,
+        parent: str | None = None,
+        kind: str = "internal",
+        **attributes: Any,
+    ) -> Iterator[Span]:
+        """Run the ``with`` block inside a new span.
+
+        The span continues the active span's trace, or the trace in the
+        ``parent`` traceparent header, or starts a new trace.
+        """
+        active = _current.get()
+        remote = parse_traceparent(parent)
+        if remote is not None:
+            trace_id, parent_id = remote
+        elif active is not None:
+            trace_id, parent_id = active.trace_id, active.span_id
+        else:
+            trace_id, parent_id = secrets.token_hex(16), None
+        span = Span(name, trace_id, parent_id, kind, attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            span.end_ns = time.time_ns()
+            self._finish(span)
+
+    def _finish(self, span: Span) -> None:
+        if self.exporter is None:
+            return
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                return
+            self._queue.append(span)
+            full = len(self._queue) >= self.batch_size
+        self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def _ensure_thread(self) -> None:
+        # Threads do not survive fork, so a forked worker starts its own
+        if self._thread is not None and self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="span-exporter", daemon=True
+            )
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Export every queued span now."""
+        with self._lock:
+            batch, self._queue = self._queue, []
+        if not batch or self.exporter is None:
+            return
+        try:
+            self.exporter.export(batch)
+            self.exported += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.warning(f"Failed to export {len(batch)} spans: {e}")
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "exporter": type(self.exporter).__name__ if self.exporter else None,
+            "queued": len(self._queue),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+def _create_exporter(settings: Settings) -> SpanExporter | None:
+    kind = settings.tracing_exporter
+    if kind == "none":
+        return None
+    if kind == "console":
+        return ConsoleExporter()
+    if kind == "file":
+        return FileExporter(settings.tracing_file_path)
+    if kind == "otlp":
+        return OTLPExporter(
+            settings.tracing_otlp_endpoint, settings.tracing_service_name
+        )
+    raise ValueError(f"Unknown tracing exporter '{kind}'")
+
+
+tracer = Tracer.from_settings(settings)
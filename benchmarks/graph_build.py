@@ -0,0 +1,114 @@
+"""Benchmark compiling analyses into graphs as the node count grows.
+
+Run with ``python -m benchmarks.graph_build``. Compares the indexed
+``compile_graph`` with the previous scan-based lookups and fails if the
+per-node cost of either compiling or building the DOT graph grows by more
+than ``--max-growth`` between the smallest and largest graph.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import random
+import sys
+import time
+from collections.abc import Callable
+from typing import Any
+
+from app.services.graph import compile_graph
+from app.services.renderer import build_dot
+
+TYPES = ["ec2", "lambda", "rds", "sqs", "s3", "alb", "unknown_type"]
+
+
+def make_analysis(n: int, seed: int = 0) -> dict[str, Any]:
+    """Build a synthetic analysis with nested clusters and messy edges."""
+    rng = random.Random(seed)
+    nodes = [
+        {"id": f"n{i}", "label": f"Node {i}", "type": rng.choice(TYPES).upper()}
+        for i in range(n)
+    ]
+    clusters = [
+        {
+            "label": f"Cluster {c}",
+            "nodes": [f"n{i}" for i in range(c * 20, c * 20 + 10)],
+            "clusters": [
+                {
+                    "label": f"Inner {c}",
+                    "nodes": [f"n{i}" for i in range(c * 20 + 10, c * 20 + 15)],
+                }
+            ],
+        }
+        for c in range(n // 40)
+    ]
+    connections = [
+        {"source": f"n{rng.randrange(n)}", "target": f"n{rng.randrange(n)}"}
+        for _ in range(2 * n)
+    ]
+    # Duplicates and dangling edges, as LLM output often contains
+    connections += connections[: n // 10]
+    connections += [{"source": "n0", "target": f"missing{i}"} for i in range(n // 20)]
+    return {"nodes": nodes, "clusters": clusters, "connections": connections}
+
+
+def legacy_index(analysis: dict[str, Any]) -> int:
+    """Node lookups as done before compile_graph, without building diagram nodes."""
+    found = 0
+    for cluster_info in analysis.get("clusters", []):
+        for node_id in cluster_info["nodes"]:
+            details = next((n for n in analysis["nodes"] if n["id"] == node_id), None)
+            if details:
+                found += details["type"].lower() != ""
+    clustered_node_ids = [
+        node_id for c in analysis.get("clusters", []) for node_id in c["nodes"]
+    ]
+    for details in analysis["nodes"]:
+        if details["id"] not in clustered_node_ids:
+            found += details["type"].lower() != ""
+    return found
+
+
+def best_of(fn: Callable[[], Any], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 1000, 2000, 4000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-growth", type=float, default=3.0)
+    args = parser.parse_args(argv)
+    # Unknown node types are deliberate here; keep their warnings out of the table
+    logging.disable(logging.WARNING)
+
+    per_node: dict[str, list[float]] = {"compile": [], "build_dot": []}
+    print(f"{'nodes':>7} {'legacy ms':>10} {'compile ms':>11} {'build_dot ms':>13}")
+    for n in args.sizes:
+        analysis = make_analysis(n)
+        legacy = best_of(lambda a=analysis: legacy_index(a), args.repeat)
+        compiled = best_of(lambda a=analysis: compile_graph(a), args.repeat)
+        dot = best_of(lambda a=analysis: build_dot(a, "bench"), args.repeat)
+        per_node["compile"].append(compiled / n)
+        per_node["build_dot"].append(dot / n)
+        print(
+            f"{n:>7} {legacy * 1e3:>10.2f} {compiled * 1e3:>11.2f} {dot * 1e3:>13.2f}"
+        )
+
+    failed = False
+    for name, costs in per_node.items():
+        growth = costs[-1] / costs[0]
+        print(f"{name}: per-node cost grew {growth:.2f}x")
+        if growth > args.max_growth:
+            print(f"{name} does not scale linearly (limit {args.max_growth}x)")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""Drive concurrent load at the API and report throughput and latency percentiles.
+
+Run in-process against the ASGI app with the stub LLM::
+
+    python -m benchmarks.load --rate 20 --duration 30 --mix generate=3,assistant=1
+
+or against a running server (start it with ``LLM_MODE=stub``) with
+``--url http://localhost:8000``. ``--rate`` sends open-loop Poisson
+arrivals regardless of how fast responses come back; ``--concurrency``
+instead runs that many closed-loop clients. Latency is broken down by
+pipeline stage using the ``Server-Timing`` header of every response.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import importlib
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections.abc import AsyncIterator, Callable
+from typing import Any, NamedTuple
+
+import httpx
+
+# (path, body builder) per request profile; bodies are unique per request so
+# caches and request coalescing do not hide the pipeline cost
+PROFILES: dict[str, tuple[str, Callable[[int], dict[str, Any]]]] = {
+    "generate": (
+        "/api/v1/generate-diagram",
+        lambda i: {"description": f"Web application with load balancer #{i}"},
+    ),
+    "assistant": (
+        "/api/v1/assistant",
+        lambda i: {
+            "message": f"Create a diagram of a serverless pipeline #{i}",
+            "conversation_id": f"load-{i}",
+        },
+    ),
+}
+
+
+class Sample(NamedTuple):
+    """Outcome of one request."""
+
+    profile: str
+    latency: float
+    status: int
+    stages: dict[str, float]
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    """Parse ``name=weight,...`` into profile weights."""
+    mix: dict[str, float] = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in PROFILES:
+            raise ValueError(
+                f"Unknown profile '{name}', expected one of {', '.join(PROFILES)}"
+            )
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Linearly interpolated percentile, ``q`` in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def parse_server_timing(header: str) -> dict[str, float]:
+    """Parse a ``Server-Timing`` header into durations in seconds by name."""
+    timings: dict[str, float] = {}
+    for metric in header.split(","):
+        name, *params = (part.strip() for part in metric.split(";"))
+        for param in params:
+            key, _, value = param.partition("=")
+            if name and key == "dur":
+                timings[name] = float(value) / 1e3
+    return timings
+
+
+def stage_timings(latency: float, server_timing: str) -> dict[str, float]:
+    """Split a request's latency into stages from its ``Server-Timing`` header.
+
+    Stages the endpoint reports are kept as they are, ``server`` is the
+    rest of the server's ``total`` and ``other`` the time spent outside the
+    server, in transport and the client.
+    """
+    timings = parse_server_timing(server_timing)
+    total = timings.pop("total", None)
+    if total is None:
+        if not timings:
+            return {}
+        total = sum(timings.values())
+    return {
+        **timings,
+        "server": max(total - sum(timings.values()), 0.0),
+        "other": max(latency - total, 0.0),
+    }
+
+
+async def send(client: httpx.AsyncClient, profile: str, index: int) -> Sample:
+    path, body = PROFILES[profile]
+    start = time.perf_counter()
+    try:
+        response = await client.post(path, json=body(index))
+        status = response.status_code
+        header = response.headers.get("server-timing", "")
+    except httpx.HTTPError:
+        status, header = 0, ""
+    latency = time.perf_counter() - start
+    return Sample(profile, latency, status, stage_timings(latency, header))
+
+
+async def open_loop(
+    client: httpx.AsyncClient,
+    mix: dict[str, float],
+    *,
+    rate: float,
+    duration: float,
+    seed: int = 0,
+) -> list[Sample]:
+    """Send Poisson arrivals at ``rate`` per second for ``duration`` seconds."""
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    tasks = []
+    start = time.perf_counter()
+    next_at = 0.0
+    for index in itertools.count():
+        next_at += rng.expovariate(rate)
+        if next_at > duration:
+            break
+        await asyncio.sleep(max(start + next_at - time.perf_counter(), 0))
+        profile = rng.choices(names, weights)[0]
+        tasks.append(asyncio.create_task(send(client, profile, index)))
+    return list(await asyncio.gather(*tasks))
+
+
+async def closed_loop(
+    client: httpx.AsyncClient,
+    mix: dict[str, float],
+    *,
+    concurrency: int,
+    duration: float,
+    seed: int = 0,
+) -> list[Sample]:
+    """Run ``concurrency`` clients back to back for ``duration`` seconds."""
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    counter = itertools.count()
+    deadline = time.perf_counter() + duration
+    samples: list[Sample] = []
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            profile = rng.choices(names, weights)[0]
+            samples.append(await send(client, profile, next(counter)))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+
+def summarize(samples: list[Sample], elapsed: float) -> dict[str, Any]:
+    """Throughput, error count and latency percentiles per profile and stage."""
+    report: dict[str, Any] = {}
+    for profile in sorted({s.profile for s in samples}):
+        group = [s for s in samples if s.profile == profile]
+        ok = [s for s in group if s.status == 200]
+        stages: dict[str, dict[str, float]] = {}
+        for stage in sorted({name for s in ok for name in s.stages}):
+            values = [s.stages[stage] for s in ok if stage in s.stages]
+            stages[stage] = {f"p{q}": percentile(values, q) * 1e3 for q in (50, 95, 99)}
+        latencies = [s.latency for s in ok]
+        report[profile] = {
+            "requests": len(group),
+            "errors": len(group) - len(ok),
+            "throughput": len(ok) / elapsed if elapsed else 0.0,
+            "latency_ms": {
+                f"p{q}": percentile(latencies, q) * 1e3 for q in (50, 95, 99)
+            },
+            "stages_ms": stages,
+        }
+    return report
+
+
+def print_report(report: dict[str, Any], elapsed: float) -> None:
+    print(f"Ran for {elapsed:.1f}s")
+    print(
+        f"{'profile':<10} {'reqs':>6} {'errors':>7} {'rps':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    )
+    for profile, row in report.items():
+        lat = row["latency_ms"]
+        print(
+            f"{profile:<10} {row['requests']:>6} {row['errors']:>7} "
+            f"{row['throughput']:>7.1f} {lat['p50']:>9.1f} {lat['p95']:>9.1f} {lat['p99']:>9.1f}"
+        )
+        for stage, pct in row["stages_ms"].items():
+            print(
+                f"  {stage:<30} {pct['p50']:>9.1f} {pct['p95']:>9.1f} {pct['p99']:>9.1f}"
+            )
+
+
+@contextlib.asynccontextmanager
+async def make_client(
+    url: str | None, timeout: float
+) -> AsyncIterator[httpx.AsyncClient]:
+    """Client for a server at ``url``, or for the app in this process."""
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+            yield client
+        return
+
+    # The LLM client is chosen at import time, so pick the stub first
+    os.environ.setdefault("LLM_MODE", "stub")
+    main = importlib.import_module("app.api.main")
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://load", timeout=timeout
+        ) as client:
+            yield client
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    mix = parse_mix(args.mix)
+    async with make_client(args.url, args.timeout) as client:
+        start = time.perf_counter()
+        if args.rate:
+            samples = await open_loop(
+                client, mix, rate=args.rate, duration=args.duration
+            )
+        else:
+            samples = await closed_loop(
+                client, mix, concurrency=args.concurrency, duration=args.duration
+            )
+        elapsed = time.perf_counter() - start
+    report = summarize(samples, elapsed)
+    print_report(report, elapsed)
+    return {"elapsed": elapsed, "profiles": report}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--url", help="Base URL of a running server (default: in-process)"
+    )
+    parser.add_argument("--mix", default="generate=1,assistant=1")
+    parser.add_argument("--rate", type=float, help="Open-loop arrivals per second")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="Write the report JSON to this path")
+    parser.add_argument("--verbose", action="store_true", help="Keep service logs")
+    args = parser.parse_args(argv)
+    if not args.verbose:
+        # Per-request service logs would drown the report
+        logging.disable(logging.ERROR)
+
+    result = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""Time each diagram pipeline stage for graphs of growing size.
+
+Run with ``python -m benchmarks.pipeline --output results.json``. Stages:
+prompt construction, LLM reply parsing, graph construction, graphviz layout
+and rasterization, base64 encoding and response serialization. Pass
+``--baseline`` with an earlier results file to fail when any stage's best
+time is slower than the baseline by more than ``--threshold``; stages
+faster than ``--noise-floor`` seconds are too noisy to compare.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from typing import Any
+
+import graphviz
+
+from app.agents.diagram_agent import DiagramAgent
+from app.models.diagram import DiagramMetadata, DiagramResponse
+from app.prompts import diagram_analysis_prompt
+from app.services.diagram_service import encode_image
+from app.services.renderer import build_dot
+from benchmarks.graph_build import make_analysis
+
+DEFAULT_SIZES = [5, 50, 500, 5000]
+
+
+def time_call(fn: Callable[[], Any], repeat: int) -> dict[str, float]:
+    """Run ``fn`` ``repeat`` times and summarize the wall-clock timings."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "runs": repeat,
+    }
+
+
+def bench_size(n: int, repeat: int, layout_max_nodes: int) -> dict[str, Any]:
+    """Time every stage for one synthetic graph of ``n`` nodes."""
+    analysis = make_analysis(n)
+    description = " ".join(
+        f"{node['label']} ({node['type']})" for node in analysis["nodes"]
+    )
+    reply = "```json\n" + json.dumps(analysis) + "\n```"
+    agent = DiagramAgent()
+    results: dict[str, Any] = {
+        "prompt": time_call(lambda: diagram_analysis_prompt(description), repeat),
+        "parse": time_call(lambda: agent._parse_response(reply), repeat),
+        "graph": time_call(lambda: build_dot(analysis, "bench"), repeat),
+    }
+
+    image = None
+    if n <= layout_max_nodes:
+        dot = build_dot(analysis, "bench")
+        try:
+            image = dot.pipe(format="png")
+            results["layout"] = time_call(lambda: dot.pipe(format="png"), repeat)
+        except graphviz.ExecutableNotFound:
+            print("Graphviz is not installed, skipping layout", file=sys.stderr)
+    # Without a real render, encode bytes of a plausible PNG size instead
+    image = image or os.urandom(2048 * n)
+    results["encode"] = time_call(lambda: encode_image(image), repeat)
+
+    metadata = DiagramMetadata(
+        nodes_created=n, clusters_created=0, connections_made=0, generation_time=0.0
+    )
+    encoded = encode_image(image)
+    results["serialize"] = time_call(
+        lambda: DiagramResponse(
+            success=True, image_data=encoded, metadata=metadata
+        ).model_dump_json(),
+        repeat,
+    )
+    return results
+
+
+def compare(
+    results: dict[str, Any],
+    baseline: dict[str, Any],
+    threshold: float,
+    noise_floor: float = 0.0,
+) -> list[str]:
+    """Describe every stage whose best time regressed past ``threshold``."""
+    regressions = []
+    for size, stages in results["results"].items():
+        for stage, timing in stages.items():
+            before = baseline.get("results", {}).get(size, {}).get(stage)
+            if before is None or before["min"] <= noise_floor:
+                continue
+            change = timing["min"] / before["min"] - 1
+            if change > threshold:
+                regressions.append(
+                    f"{stage} @ {size} nodes: {before['min'] * 1e3:.3f} ms -> "
+                    f"{timing['min'] * 1e3:.3f} ms (+{change:.0%})"
+                )
+    return regressions
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--layout-max-nodes", type=int, default=500)
+    parser.add_argument("--output", help="Write results JSON to this path")
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--noise-floor", type=float, default=0.0005)
+    args = parser.parse_args(argv)
+    # Synthetic graphs contain unknown node types on purpose
+    logging.disable(logging.WARNING)
+
+    results = {
+        "meta": {
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+        },
+        "results": {
+            str(n): bench_size(n, args.repeat, args.layout_max_nodes)
+            for n in args.sizes
+        },
+    }
+
+    print(f"{'nodes':>6} {'stage':<10} {'median ms':>10} {'min ms':>10}")
+    for size, stages in results["results"].items():
+        for stage, timing in stages.items():
+            print(
+                f"{size:>6} {stage:<10} {timing['median'] * 1e3:>10.3f} "
+                f"{timing['min'] * 1e3:>10.3f}"
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(
+                results, json.load(f), args.threshold, args.noise_floor
+            )
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
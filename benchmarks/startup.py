@@ -0,0 +1,122 @@
+"""Measure import time and worker cold start in fresh interpreters.
+
+Run with ``python -m benchmarks.startup --output startup.json``. Each stage
+runs ``--repeat`` times in a new Python process so module caches do not
+carry over: importing the API app, the LLM module and the renderer, and
+warming a render worker (renderer import plus node index load). Building
+the node index from the provider sources and resolving a node type are
+timed in-process. ``--baseline``/``--threshold`` work as in
+``benchmarks.pipeline``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any
+
+from app.services.node_registry import NodeRegistry
+from benchmarks.pipeline import compare, time_call
+
+# Stage name -> statements timed in a fresh interpreter
+SUBPROCESS_STAGES = {
+    "import_api": "import app.api.main",
+    "import_llm": "import app.llm",
+    "import_renderer": "import app.services.renderer",
+    "worker_warm": (
+        "from app.services.render_engine import _warm_worker; _warm_worker()"
+    ),
+}
+
+_CHILD = """\
+import time
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start)
+"""
+
+
+def time_subprocess(statement: str, repeat: int) -> dict[str, float]:
+    """Time ``statement`` in ``repeat`` fresh interpreters."""
+    env = {**os.environ, "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "x")}
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _CHILD.format(statement=statement)],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=env,
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "runs": repeat,
+    }
+
+
+def bench_registry(repeat: int) -> dict[str, Any]:
+    """Time building the node index and resolving a type from a cold registry."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "node-index.json")
+        results = {
+            "index_build": time_call(lambda: NodeRegistry().index, repeat),
+        }
+        _ = NodeRegistry(index_path=path).index  # write the cache file
+        results["index_load"] = time_call(
+            lambda: NodeRegistry(index_path=path).index, repeat
+        )
+        results["resolve"] = time_call(
+            lambda: NodeRegistry(index_path=path).resolve("gke"), repeat
+        )
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write results JSON to this path")
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--noise-floor", type=float, default=0.005)
+    args = parser.parse_args(argv)
+
+    stages = {
+        name: time_subprocess(statement, args.repeat)
+        for name, statement in SUBPROCESS_STAGES.items()
+    }
+    stages.update(bench_registry(args.repeat))
+    results = {"meta": {"timestamp": time.time()}, "results": {"startup": stages}}
+
+    print(f"{'stage':<16} {'median ms':>10} {'min ms':>10}")
+    for stage, timing in stages.items():
+        print(
+            f"{stage:<16} {timing['median'] * 1e3:>10.3f} {timing['min'] * 1e3:>10.3f}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(
+                results, json.load(f), args.threshold, args.noise_floor
+            )
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import threading
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.agents.analysis_cache import AnalysisCache
+from app.agents.diagram_agent import DiagramAgent
+from app.cache import LRUCache
+
+ANALYSIS = {
+    "nodes": [{"id": "web1", "type": "ec2", "label": "Web Server"}],
+    "clusters": [],
+    "connections": [],
+}
+
+
+def test_analysis_cache_normalizes_description():
+    """Test that whitespace and case variations share one entry."""
+    cache = AnalysisCache(model="gemini-test")
+    cache.set("A web  server\nwith a DB", ANALYSIS)
+
+    assert cache.get("a web server with a db") == ANALYSIS
+    assert cache.get("a different description") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_analysis_cache_key_depends_on_model():
+    """Test that switching models does not reuse old analyses."""
+    assert AnalysisCache(model="a").key("x") != AnalysisCache(model="b").key("x")
+
+
+def test_lru_cache_ttl_expiry():
+    """Test that entries expire after their TTL."""
+    cache: LRUCache[str, str] = LRUCache(maxsize=4, ttl=10.0)
+    with patch("app.cache.time.monotonic", return_value=100.0):
+        cache.set("k", "v")
+    with patch("app.cache.time.monotonic", return_value=105.0):
+        assert cache.get("k") == "v"
+    with patch("app.cache.time.monotonic", return_value=111.0):
+        assert cache.get("k") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_analysis_cache_sqlite_survives_restart(tmp_path):
+    """Test that the SQLite store repopulates a fresh cache instance."""
+    db_path = str(tmp_path / "analysis.sqlite3")
+    first = AnalysisCache(model="gemini-test", db_path=db_path)
+    first.set("web server", ANALYSIS)
+    first.close()
+
+    second = AnalysisCache(model="gemini-test", db_path=db_path)
+    assert second.get("Web Server") == ANALYSIS
+    second.close()
+
+
+def test_analysis_cache_refill_keeps_sqlite_expiry(tmp_path):
+    """Test that entries loaded from SQLite expire when the stored row would."""
+    db_path = str(tmp_path / "analysis.sqlite3")
+    first = AnalysisCache(model="gemini-test", ttl=100.0, db_path=db_path)
+    with patch("app.agents.analysis_cache.time.time", return_value=1000.0):
+        first.set("web server", ANALYSIS)
+    first.close()
+
+    second = AnalysisCache(model="gemini-test", ttl=100.0, db_path=db_path)
+    with (
+        patch("app.agents.analysis_cache.time.time", return_value=1060.0),
+        patch("app.cache.time.monotonic", return_value=500.0),
+    ):
+        assert second.get("web server") == ANALYSIS
+    with patch("app.cache.time.monotonic", return_value=541.0):
+        assert second.get_memory("web server") is None
+    second.close()
+
+
+@pytest.mark.asyncio
+async def test_diagram_agent_reads_sqlite_off_the_event_loop(tmp_path):
+    """Test that a persistent cache is only read from worker threads."""
+    cache = AnalysisCache(model="gemini-test", db_path=str(tmp_path / "a.sqlite3"))
+    cache.set("web server", ANALYSIS)
+    cache.memory.clear()
+    threads = []
+    db_get = cache._db_get
+
+    def record_get(key):
+        threads.append(threading.get_ident())
+        return db_get(key)
+
+    with patch.object(cache, "_db_get", side_effect=record_get):
+        result = await DiagramAgent(cache=cache).generate_analysis("web server")
+
+    assert result == ANALYSIS
+    assert threads and threading.get_ident() not in threads
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_diagram_agent_uses_analysis_cache():
+    """Test that repeated descriptions are answered without an LLM call."""
+    agent = DiagramAgent(cache=AnalysisCache(model="gemini-test"))
+    response = MagicMock(text='{"nodes": [], "clusters": [], "connections": []}')
+
+    with patch("app.agents.diagram_agent.client") as mock_client:
+        mock_client.aio.models.generate_content = AsyncMock(return_value=response)
+        await agent.generate_analysis("Web server")
+        await agent.generate_analysis("  web   SERVER ")
+
+    mock_client.aio.models.generate_content.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_diagram_agent_does_not_cache_repaired_analysis():
+    """Test that a truncated reply is not served from the cache afterwards."""
+    agent = DiagramAgent(cache=AnalysisCache(model="gemini-test"))
+    truncated = MagicMock(text='{"nodes": [{"id": "web1", "type": "ec2"}, {"id": "d')
+
+    with patch("app.agents.diagram_agent.client") as mock_client:
+        mock_client.aio.models.generate_content = AsyncMock(return_value=truncated)
+        result = await agent.generate_analysis("Web server")
+
+    assert result["nodes"][0] == {"id": "web1", "type": "ec2"}
+    assert agent.cache.get("Web server") is None
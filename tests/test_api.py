@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+import time
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
@@ -7,8 +9,15 @@ from httpx import ASGITransport, AsyncClient
 
 from app.agents.assistant_agent import AssistantAgent
 from app.agents.diagram_agent import DiagramAgent
-from app.api.main import app, get_assistant_service, get_diagram_service, get_settings
+from app.api.main import (
+    app,
+    get_assistant_service,
+    get_diagram_service,
+    get_settings,
+    lifespan,
+)
 from app.config import Settings
+from app.container import ServiceContainer
 from app.models.diagram import AssistantRequest, AssistantResponse
 from app.services.assistant_service import AssistantService
 from app.services.diagram_service import DiagramService
@@ -26,17 +35,18 @@ def mock_settings() -> Settings:
 
 @pytest.fixture
 def mock_diagram_service():
+    metadata = {
+        "nodes_created": 1,
+        "clusters_created": 1,
+        "connections_made": 1,
+        "generation_time": 0.1,
+    }
     mock = MagicMock(spec=DiagramService)
     mock.generate_diagram_from_description = AsyncMock(
-        return_value=(
-            "fake_image_data",
-            {
-                "nodes_created": 1,
-                "clusters_created": 1,
-                "connections_made": 1,
-                "generation_time": 0.1,
-            },
-        )
+        return_value=("fake_image_data", metadata)
+    )
+    mock.generate_diagram_images = AsyncMock(
+        return_value=({"png": b"fake_image_data"}, metadata)
     )
     return mock
 
@@ -85,6 +95,39 @@ async def test_assistant(mock_assistant_service, mock_settings):
     app.dependency_overrides = {}
 
 
+@pytest.mark.asyncio
+async def test_generate_diagram_multiple_formats(mock_diagram_service):
+    """Test that several formats are requested together and all returned."""
+    mock_diagram_service.generate_diagram_images.return_value = (
+        {"svg": b"<svg/>", "png": b"png"},
+        mock_diagram_service.generate_diagram_images.return_value[1],
+    )
+    app.dependency_overrides[get_diagram_service] = lambda: mock_diagram_service
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        response = await ac.post(
+            "/api/v1/generate-diagram",
+            json={
+                "description": "test",
+                "format": ["svg", "PNG"],
+                "size": {"width": "400"},
+            },
+        )
+        bad_format = await ac.post(
+            "/api/v1/generate-diagram", json={"description": "test", "format": "gif"}
+        )
+
+    assert response.status_code == 200
+    assert set(response.json()["images"]) == {"svg", "png"}
+    mock_diagram_service.generate_diagram_images.assert_awaited_once_with(
+        "test", ["svg", "png"], {"width": "400"}
+    )
+    assert bad_format.status_code == 400
+    app.dependency_overrides = {}
+
+
 def test_settings_resolution(mock_settings):
     """Test that settings are resolved from environment variables."""
     assert mock_settings.gemini_api_key == "test_api_key"
@@ -94,11 +137,16 @@ def test_settings_resolution(mock_settings):
 
 @pytest.mark.asyncio
 async def test_diagram_generation_thread_pool():
-    """Test that diagram generation runs in thread pool."""
+    """Test that diagram generation runs on the render engine's thread pool."""
     with patch("anyio.to_thread.run_sync") as mock_run_sync:
-        mock_run_sync.return_value = ("test_image", {"nodes_created": 1})
+        mock_run_sync.return_value = ({"png": b"test_image"}, 1.0, 1.5)
 
-        settings = Settings(gemini_api_key="test_key", tmp_dir="/tmp/test")
+        settings = Settings(
+            gemini_api_key="test_key",
+            tmp_dir="/tmp/test",
+            render_backend="thread",
+            render_cache_enabled=False,
+        )
         service = DiagramService(settings)
 
         # Mock the agent analysis
@@ -143,7 +191,8 @@ def test_diagram_agent_analysis_parsing():
         "connections": [{"source": "web1", "target": "db"}]
     }
     """
-    result = agent._parse_response(response_text)
+    result, repaired = agent._parse_response(response_text)
+    assert not repaired
     assert len(result["nodes"]) == 1
     assert result["nodes"][0]["id"] == "web1"
     assert len(result["clusters"]) == 1
@@ -190,6 +239,9 @@ async def test_generate_diagram_error_handling():
     mock_service.generate_diagram_from_description = AsyncMock(
         side_effect=Exception("Test error")
     )
+    mock_service.generate_diagram_images = AsyncMock(
+        side_effect=Exception("Test error")
+    )
 
     app.dependency_overrides[get_diagram_service] = lambda: mock_service
 
@@ -285,7 +337,7 @@ async def test_assistant_service_memory():
         await service.process_message(request1)
 
         # Check context was stored
-        context = service._get_conversation_context("test-conv")
+        context = await service._get_conversation_context("test-conv")
         assert len(context["messages"]) == 2  # User + Assistant
 
         # Second message with same conversation ID
@@ -294,11 +346,12 @@ async def test_assistant_service_memory():
         await service.process_message(request2)
 
         # Check context was updated
-        context = service._get_conversation_context("test-conv")
+        context = await service._get_conversation_context("test-conv")
         assert len(context["messages"]) == 4  # 2 previous + 2 new
 
 
-def test_assistant_service_context_limit():
+@pytest.mark.asyncio
+async def test_assistant_service_context_limit():
     """Test that conversation context is limited to prevent memory bloat."""
     settings = Settings(gemini_api_key="test_key", tmp_dir="/tmp/test")
     service = AssistantService(settings)
@@ -308,8 +361,67 @@ def test_assistant_service_context_limit():
         "messages": [{"role": "user", "content": f"message {i}"} for i in range(15)]
     }
 
-    service._update_conversation_context("test", large_context)
-    updated_context = service._get_conversation_context("test")
+    await service._update_conversation_context("test", large_context)
+    updated_context = await service._get_conversation_context("test")
 
     # Should be limited to 10 messages
     assert len(updated_context["messages"]) == 10
+
+
+@pytest.mark.asyncio
+async def test_lazy_container_is_built_once():
+    """Test that concurrent first requests share one lazily built container."""
+    built = []
+
+    def build(settings):
+        time.sleep(0.05)
+        container = MagicMock()
+        container.stats.return_value = {}
+        built.append(container)
+        return container
+
+    app.state.container = None
+    with patch("app.api.main.ServiceContainer", side_effect=build):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            responses = await asyncio.gather(
+                *(ac.get("/api/v1/stats") for _ in range(10))
+            )
+    app.state.container = None
+    assert [r.status_code for r in responses] == [200] * 10
+    assert len(built) == 1
+
+
+@pytest.mark.asyncio
+async def test_lifespan_builds_shared_container():
+    """Test that the lifespan builds one container with shared services."""
+    async with lifespan(app):
+        container = app.state.container
+        assert isinstance(container, ServiceContainer)
+        assert container.assistant_service.diagram_service is container.diagram_service
+        assert container.diagram_service.agent is container.diagram_agent
+    assert app.state.container is None
+
+
+@pytest.mark.asyncio
+async def test_conversation_memory_survives_between_requests(mock_settings):
+    """Test that the assistant service is reused across requests."""
+    container = ServiceContainer(mock_settings)
+    app.state.container = container
+
+    with patch.object(container.assistant_agent, "get_intent") as mock_intent:
+        mock_intent.return_value = {"intent": "greeting"}
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            for message in ("Hello", "Hello again"):
+                response = await ac.post(
+                    "/api/v1/assistant",
+                    json={"message": message, "conversation_id": "shared"},
+                )
+                assert response.status_code == 200
+
+    context = await container.assistant_service._get_conversation_context("shared")
+    assert len(context["messages"]) == 4
+    app.state.container = None
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import os
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.api.main import app, get_artifact_store, get_diagram_service
+from app.services.artifact_store import FileArtifactStore, MemoryArtifactStore
+from app.services.diagram_service import DiagramService
+
+
+@pytest.mark.parametrize("backend", ["memory", "file"])
+def test_artifact_store_is_content_addressed(backend, tmp_path):
+    """Test that identical bytes map to one id and round-trip."""
+    if backend == "memory":
+        store = MemoryArtifactStore(max_bytes=1024)
+    else:
+        store = FileArtifactStore(str(tmp_path), max_bytes=1024)
+
+    artifact_id = store.put(b"png-bytes", "png")
+
+    assert artifact_id == store.put(b"png-bytes", "png")
+    assert artifact_id.endswith(".png")
+    assert store.is_valid_id(artifact_id)
+    assert store.get(artifact_id) == b"png-bytes"
+    assert store.media_type(artifact_id) == "image/png"
+
+
+@pytest.mark.parametrize("backend", ["memory", "file"])
+@pytest.mark.parametrize("retention", [0, 3600])
+def test_artifact_store_keeps_artifacts_for_retention(backend, retention, tmp_path):
+    """Test that artifacts within their retention survive the size limit."""
+    if backend == "memory":
+        store = MemoryArtifactStore(max_bytes=100, retention=retention)
+    else:
+        store = FileArtifactStore(str(tmp_path), max_bytes=100, retention=retention)
+    first = store.put(b"a" * 60, "png")
+    if backend == "file":
+        # File recency has coarse resolution; make the first one clearly older
+        past = time.time() - 10
+        os.utime(store.path(first), (past, past))
+    second = store.put(b"b" * 60, "png")
+
+    assert store.get(second) == b"b" * 60
+    assert (store.get(first) is not None) == bool(retention)
+
+
+@pytest.mark.asyncio
+async def test_generate_diagram_returns_url_and_serves_artifact(tmp_path):
+    """Test image_url delivery, caching headers and conditional requests."""
+    store = FileArtifactStore(str(tmp_path), max_bytes=1024, retention=3600)
+    mock_service = MagicMock(spec=DiagramService)
+    mock_service.generate_diagram_images = AsyncMock(
+        return_value=(
+            {"png": b"png-bytes"},
+            {
+                "nodes_created": 1,
+                "clusters_created": 0,
+                "connections_made": 0,
+                "generation_time": 0.1,
+            },
+        )
+    )
+    app.dependency_overrides[get_diagram_service] = lambda: mock_service
+    app.dependency_overrides[get_artifact_store] = lambda: store
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        response = await ac.post(
+            "/api/v1/generate-diagram",
+            json={"description": "test", "return_url": True},
+        )
+        body = response.json()
+        image = await ac.get(body["image_url"])
+        not_modified = await ac.get(
+            body["image_url"], headers={"If-None-Match": image.headers["etag"]}
+        )
+        missing = await ac.get("/api/v1/diagrams/not-an-id.png")
+
+    assert body["image_data"] is None
+    assert body["image_url"].startswith("/api/v1/diagrams/")
+    assert image.status_code == 200
+    assert image.content == b"png-bytes"
+    assert image.headers["content-type"] == "image/png"
+    assert image.headers["cache-control"] == "public, max-age=3600"
+    assert not_modified.status_code == 304
+    assert missing.status_code == 404
+    app.dependency_overrides = {}
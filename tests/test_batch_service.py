@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.api.main import app, get_batch_service
+from app.models.diagram import DiagramRequest
+from app.services.batch_service import BatchDiagramService
+from app.services.diagram_service import DiagramService
+
+METADATA = {
+    "nodes_created": 1,
+    "clusters_created": 0,
+    "connections_made": 0,
+    "generation_time": 0.1,
+}
+
+
+def make_diagram_service(analysis_delays: dict[str, float]) -> MagicMock:
+    """Build a mocked diagram service whose analysis takes a per-item delay."""
+    service = MagicMock(spec=DiagramService)
+    service.agent = MagicMock()
+    state = {"active": 0, "peak": 0}
+
+    async def generate_analysis(description: str) -> dict:
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        try:
+            await asyncio.sleep(analysis_delays.get(description, 0.01))
+        finally:
+            state["active"] -= 1
+        return {"nodes": [], "clusters": [], "connections": []}
+
+    service.agent.generate_analysis = generate_analysis
+    service.render_images = AsyncMock(return_value=({"png": b"png"}, METADATA))
+    service.state = state
+    return service
+
+
+@pytest.mark.asyncio
+async def test_batch_bounds_concurrency_and_isolates_slow_items():
+    """Test that slow items time out alone and analysis parallelism is capped."""
+    diagram_service = make_diagram_service({"slow": 5.0})
+    batch = BatchDiagramService(
+        diagram_service, analysis_concurrency=2, render_concurrency=1, item_timeout=0.2
+    )
+    items = [DiagramRequest(description=d) for d in ["a", "slow", "b", "c", ""]]
+
+    outcomes = {o.index: o async for o in batch.run(items)}
+
+    assert outcomes[1].error == "Timed out"
+    assert outcomes[4].error == "Invalid diagram description provided"
+    assert all(outcomes[i].images == {"png": b"png"} for i in (0, 2, 3))
+    assert diagram_service.state["peak"] <= 2
+
+
+@pytest.mark.asyncio
+async def test_batch_item_timeout_excludes_queue_wait():
+    """Test that items queued behind busy slots do not time out while waiting."""
+    # Each analysis fits the timeout, waiting for the whole queue does not
+    diagram_service = make_diagram_service({f"item {i}": 0.03 for i in range(10)})
+    batch = BatchDiagramService(
+        diagram_service, analysis_concurrency=1, render_concurrency=1, item_timeout=0.1
+    )
+    items = [DiagramRequest(description=f"item {i}") for i in range(10)]
+
+    outcomes = [o async for o in batch.run(items)]
+
+    assert [o.error for o in outcomes] == [None] * 10
+
+
+@pytest.mark.asyncio
+async def test_batch_endpoint_json_and_ndjson():
+    """Test ordered JSON results and streamed NDJSON results."""
+    batch = BatchDiagramService(make_diagram_service({}))
+    app.dependency_overrides[get_batch_service] = lambda: batch
+    payload = {"items": [{"description": "a"}, {"description": "b", "format": "gif"}]}
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        response = await ac.post("/api/v1/generate-diagrams:batch", json=payload)
+        streamed = await ac.post(
+            "/api/v1/generate-diagrams:batch", json={**payload, "stream": True}
+        )
+
+    results = response.json()["results"]
+    assert [r["index"] for r in results] == [0, 1]
+    assert results[0]["success"] is True
+    assert results[0]["result"]["image_data"] == "cG5n"
+    assert results[1]["success"] is False
+
+    assert streamed.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1]
+    app.dependency_overrides = {}
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import httpx
+import pytest
+
+from benchmarks.load import (
+    open_loop,
+    parse_mix,
+    percentile,
+    stage_timings,
+    summarize,
+)
+from benchmarks.pipeline import bench_size, compare
+
+
+def timing(seconds: float) -> dict[str, float]:
+    return {"min": seconds, "median": seconds, "mean": seconds, "runs": 1}
+
+
+def test_compare_flags_regressions_past_threshold():
+    """Test that only slow-downs past the threshold and noise floor are reported."""
+    baseline = {"results": {"50": {"graph": timing(0.010), "prompt": timing(1e-6)}}}
+    results = {"results": {"50": {"graph": timing(0.013), "prompt": timing(1e-5)}}}
+
+    assert compare(results, baseline, threshold=0.5, noise_floor=1e-4) == []
+    regressions = compare(results, baseline, threshold=0.2, noise_floor=1e-4)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("graph @ 50 nodes")
+
+
+def test_bench_size_times_every_stage():
+    """Test that one small run covers the pipeline stages."""
+    stages = bench_size(5, repeat=1, layout_max_nodes=0)
+
+    assert set(stages) == {"prompt", "parse", "graph", "encode", "serialize"}
+
+
+def test_percentile_interpolates():
+    """Test linear interpolation between ranked samples."""
+    values = [0.1, 0.2, 0.3, 0.4, 0.5]
+
+    assert percentile(values, 50) == 0.3
+    assert percentile(values, 95) == pytest.approx(0.48)
+    assert percentile([], 99) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_open_loop_reports_profiles_and_stages():
+    """Test open-loop arrivals against a fake server and the per-stage report."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/v1/assistant":
+            return httpx.Response(500)
+        timing = "queue_wait;dur=1.0, render;dur=2.0, total;dur=4.0"
+        return httpx.Response(200, json={}, headers={"Server-Timing": timing})
+
+    async with httpx.AsyncClient(
+        transport=httpx.MockTransport(handler), base_url="http://test"
+    ) as client:
+        samples = await open_loop(
+            client, parse_mix("generate=1,assistant=1"), rate=200, duration=0.2
+        )
+    report = summarize(samples, elapsed=0.2)
+
+    assert report["assistant"]["errors"] == report["assistant"]["requests"]
+    assert report["generate"]["errors"] == 0
+    assert report["generate"]["stages_ms"]["render"]["p50"] == pytest.approx(2.0)
+    assert report["generate"]["stages_ms"]["server"]["p50"] == pytest.approx(1.0)
+
+
+def test_stage_timings_cover_endpoints_without_stages():
+    """Test that a bare total still splits server time from transport."""
+    assert stage_timings(0.010, "total;dur=6.0") == pytest.approx(
+        {"server": 0.006, "other": 0.004}
+    )
+    assert stage_timings(0.010, "") == {}
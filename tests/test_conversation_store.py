@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+
+from app.config import Settings
+from app.metrics import CONVERSATION_EVICTIONS
+from app.models.diagram import AssistantRequest
+from app.services.assistant_service import AssistantService
+from app.services.conversation_store import (
+    ConversationStore,
+    MemoryConversationStore,
+    SQLiteConversationStore,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryConversationStore(max_items=3, ttl=60, max_bytes=1 << 20)
+    else:
+        store = SQLiteConversationStore(str(tmp_path / "c.sqlite3"), 3, ttl=60)
+        yield store
+        store.close()
+
+
+def test_returns_copies(store):
+    """Test that changing a returned context does not change the stored one."""
+    store.set("a", {"messages": [{"role": "user", "content": "hi"}]})
+    context = store.get("a")
+    context["messages"].append({"role": "assistant", "content": "hello"})
+    assert len(store.get("a")["messages"]) == 1
+    assert store.get("unknown") is None
+
+
+def test_evicts_least_recently_updated(store):
+    """Test that a full store drops the conversation updated longest ago."""
+    before = CONVERSATION_EVICTIONS.value(backend=store.backend, reason="capacity")
+    now = time.time()
+    updates = [now + i for i in range(5)]
+    with patch("app.services.conversation_store.time.time", side_effect=updates):
+        for conversation_id in ("a", "b", "c", "a", "d"):
+            store.set(conversation_id, {"id": conversation_id})
+    assert store.get("b") is None
+    assert [store.get(c)["id"] for c in "acd"] == ["a", "c", "d"]
+    assert store.stats()["size"] == 3
+    assert store.stats()["evictions"] == 1
+    after = CONVERSATION_EVICTIONS.value(backend=store.backend, reason="capacity")
+    assert after == before + 1
+
+
+def test_expires_idle_conversations(store):
+    """Test that conversations idle past the TTL are gone."""
+    with patch("app.cache.time.monotonic", return_value=1000.0):
+        with patch("app.services.conversation_store.time.time", return_value=1000.0):
+            store.set("a", {"id": "a"})
+    with patch("app.cache.time.monotonic", return_value=1061.0):
+        with patch("app.services.conversation_store.time.time", return_value=1061.0):
+            assert store.get("a") is None
+
+
+def test_memory_store_is_bounded_by_bytes():
+    """Test that the byte cap evicts conversations before the count cap."""
+    store = MemoryConversationStore(max_items=100, ttl=60, max_bytes=100)
+    for conversation_id in "abc":
+        store.set(conversation_id, {"text": "x" * 40})
+    assert store.get("a") is None
+    assert store.stats()["bytes"] <= 100
+
+
+def test_sqlite_store_is_shared_between_workers(tmp_path):
+    """Test that stores opened on the same file see each other's writes."""
+    path = str(tmp_path / "c.sqlite3")
+    first = SQLiteConversationStore(path, 10, ttl=60)
+    second = SQLiteConversationStore(path, 10, ttl=60)
+    first.set("a", {"id": "a"})
+    assert second.get("a") == {"id": "a"}
+    second.set("b", {"id": "b"})
+    assert first.stats()["size"] == 2
+    first.close()
+    second.close()
+
+
+@pytest.mark.asyncio
+async def test_assistant_starts_new_conversation_without_id():
+    """Test that requests without an id get their own conversation."""
+    service = AssistantService(Settings(gemini_api_key="test_key", tmp_dir="/tmp/test"))
+    with patch.object(service.assistant_agent, "get_intent") as mock_intent:
+        mock_intent.return_value = {"intent": "greeting"}
+        first = await service.process_message(AssistantRequest(message="Hello"))
+        second = await service.process_message(AssistantRequest(message="Hi"))
+        follow_up = await service.process_message(
+            AssistantRequest(message="More", conversation_id=first.conversation_id)
+        )
+    assert first.conversation_id != second.conversation_id
+    assert follow_up.conversation_id == first.conversation_id
+    context = await service._get_conversation_context(first.conversation_id)
+    assert len(context["messages"]) == 4
+
+
+class _ThreadRecordingStore(MemoryConversationStore):
+    def __init__(self) -> None:
+        super().__init__(max_items=10, ttl=60, max_bytes=1 << 20)
+        self.threads: set[int] = set()
+
+    def get(self, conversation_id: str) -> dict[str, Any] | None:
+        self.threads.add(threading.get_ident())
+        return super().get(conversation_id)
+
+    def set(self, conversation_id: str, context: dict[str, Any]) -> None:
+        self.threads.add(threading.get_ident())
+        super().set(conversation_id, context)
+
+
+@pytest.mark.asyncio
+async def test_assistant_keeps_store_calls_off_the_event_loop():
+    """Test that the store is only called from worker threads."""
+    with pytest.raises(TypeError):
+        ConversationStore()
+    store = _ThreadRecordingStore()
+    service = AssistantService(
+        Settings(gemini_api_key="test_key", tmp_dir="/tmp/test"),
+        conversation_store=store,
+    )
+    with patch.object(service.assistant_agent, "get_intent") as mock_intent:
+        mock_intent.return_value = {"intent": "greeting"}
+        await service.process_message(AssistantRequest(message="Hello"))
+    assert store.threads
+    assert threading.get_ident() not in store.threads
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.agents.assistant_agent import AssistantAgent, IntentClassifier, LocalIntent
+from app.config import Settings
+from app.metrics import FALLBACKS
+from app.models.analysis import AssistantTurn
+from app.models.diagram import AssistantRequest
+from app.services.assistant_service import AssistantService
+from app.services.diagram_service import DiagramService
+
+ANALYSIS = {
+    "nodes": [{"id": "web", "type": "ec2", "label": "Web"}],
+    "clusters": [],
+    "connections": [],
+}
+
+
+@pytest.mark.asyncio
+async def test_fused_intent_keeps_only_complete_analysis():
+    """Test the fused schema is requested and incomplete analyses are dropped."""
+    agent = AssistantAgent()
+    complete = {
+        "intent": "generate_diagram",
+        "description": "web",
+        "analysis": ANALYSIS,
+    }
+    incomplete = {**complete, "analysis": {"nodes": []}}
+    mock_generate = AsyncMock(
+        side_effect=[
+            SimpleNamespace(text=json.dumps(complete)),
+            SimpleNamespace(text=json.dumps(incomplete)),
+        ]
+    )
+
+    with patch("app.agents.assistant_agent.client") as mock_client:
+        mock_client.aio.models.generate_content = mock_generate
+        fused = await agent.get_intent("draw a web server", with_analysis=True)
+        partial = await agent.get_intent("draw a web server", with_analysis=True)
+
+    assert mock_generate.call_args.kwargs["config"].response_schema is AssistantTurn
+    assert fused["analysis"] == ANALYSIS
+    assert "analysis" not in partial
+    assert partial["description"] == "web"
+
+
+@pytest.mark.asyncio
+async def test_assistant_service_uses_fused_analysis_or_falls_back():
+    """Test one LLM call with a fused analysis and two without it."""
+    diagram_service = MagicMock(spec=DiagramService)
+    diagram_service.render_analysis = AsyncMock(return_value=("img", {}))
+    diagram_service.generate_diagram_from_description = AsyncMock(
+        return_value=("img", {})
+    )
+    service = AssistantService(
+        Settings(gemini_api_key="x"), diagram_service=diagram_service
+    )
+    intent = {"intent": "generate_diagram", "description": "web"}
+    request = AssistantRequest(message="draw a web server")
+
+    with patch.object(
+        service.assistant_agent,
+        "_llm_intent",
+        AsyncMock(side_effect=[{**intent, "analysis": ANALYSIS}, intent]),
+    ) as mock_intent:
+        fused = await service.process_message(request)
+        fallback = await service.process_message(request)
+
+    assert mock_intent.call_args.args[2] is True
+    diagram_service.render_analysis.assert_awaited_once_with(ANALYSIS, "web")
+    diagram_service.generate_diagram_from_description.assert_awaited_once_with("web")
+    assert fused.image_data == fallback.image_data == "img"
+    assert service.fused_stats == {"fused": 1, "fallback": 1}
+
+
+@pytest.mark.asyncio
+async def test_local_intent_is_not_counted_as_fused_fallback():
+    """Test that intents answered without the LLM leave fused stats alone."""
+    diagram_service = MagicMock(spec=DiagramService)
+    diagram_service.generate_diagram_from_description = AsyncMock(
+        return_value=("img", {})
+    )
+    classifier = MagicMock(spec=IntentClassifier)
+    classifier.classify.return_value = LocalIntent("generate_diagram", 0.9, "web")
+    service = AssistantService(
+        Settings(gemini_api_key="x"),
+        diagram_service=diagram_service,
+        assistant_agent=AssistantAgent(classifier),
+    )
+    before = FALLBACKS.value(kind="fused_analysis")
+
+    response = await service.process_message(AssistantRequest(message="draw web"))
+
+    assert response.image_data == "img"
+    diagram_service.generate_diagram_from_description.assert_awaited_once_with("web")
+    assert service.fused_stats == {"fused": 0, "fallback": 0}
+    assert FALLBACKS.value(kind="fused_analysis") == before
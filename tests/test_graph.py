@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from app.services.graph import compile_graph
+from app.services.renderer import build_dot
+
+ANALYSIS = {
+    "nodes": [
+        {"id": "lb", "type": "ALB", "label": "Load Balancer"},
+        {"id": "web", "type": "ec2", "label": "Web"},
+        {"id": "worker", "type": "lambda", "label": "Worker"},
+        {"id": "db", "type": "rds", "label": "Database"},
+        {"id": "db", "type": "rds", "label": "Duplicate"},
+    ],
+    "clusters": [
+        {
+            "label": "VPC",
+            "nodes": ["lb", "missing"],
+            "clusters": [{"label": "App Tier", "nodes": ["web", "worker", "lb"]}],
+        }
+    ],
+    "connections": [
+        {"source": "lb", "target": "web"},
+        {"source": "lb", "target": "web"},
+        {"source": "web", "target": "db"},
+        {"source": "web", "target": "ghost"},
+    ],
+}
+
+
+def test_compile_graph_indexes_and_cleans_analysis():
+    """Test id indexing, nested clusters, edge de-duplication and dangling edges."""
+    graph = compile_graph(ANALYSIS)
+
+    assert list(graph.nodes) == ["lb", "web", "worker", "db"]
+    assert graph.nodes["lb"].type == "alb"
+    assert graph.nodes["db"].label == "Database"
+
+    vpc = graph.clusters[0]
+    app_tier = vpc.children[0]
+    assert [n.id for n in vpc.nodes] == ["lb"]
+    assert [n.id for n in app_tier.nodes] == ["web", "worker"]
+    assert app_tier.parent is vpc
+    assert [n.id for n in graph.unclustered] == ["db"]
+
+    assert [(s.id, t.id) for s, t in graph.edges] == [("lb", "web"), ("web", "db")]
+    assert graph.dropped_edges == 1
+
+
+def test_build_dot_renders_nested_clusters():
+    """Test that nested clusters become nested graphviz subgraphs."""
+    source = build_dot(ANALYSIS, "Nested").source
+
+    assert source.index("cluster_VPC") < source.index("cluster_App Tier")
+    assert source.count("->") == 2
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.agents.assistant_agent import AssistantAgent, IntentClassifier
+
+
+@pytest.mark.parametrize(
+    ("message", "intent"),
+    [
+        ("Hello!", "greeting"),
+        ("what can you do?", "clarification"),
+        (
+            "Create a diagram of a web app with an ALB and two EC2 instances",
+            "generate_diagram",
+        ),
+        ("Show me a serverless architecture with s3 and dynamodb", "generate_diagram"),
+        ("add a database to the diagram", None),
+        ("tell me a joke", None),
+    ],
+)
+def test_classifier_answers_only_confident_intents(message, intent):
+    """Test rules and the bundled model, deferring unclear messages."""
+    result = IntentClassifier(threshold=0.9).classify(message)
+
+    assert (result.intent if result else None) == intent
+    if intent == "generate_diagram":
+        assert result.description == message
+
+
+@pytest.mark.asyncio
+async def test_agent_skips_llm_on_fast_path_and_reports_routing():
+    """Test that confident messages never reach the LLM client."""
+    agent = AssistantAgent(IntentClassifier())
+    with patch("app.agents.assistant_agent.client") as mock_client:
+        mock_client.aio.models.generate_content = AsyncMock(
+            return_value=SimpleNamespace(text='{"intent": "unknown"}')
+        )
+        greeting = await agent.get_intent("hi there")
+        unclear = await agent.get_intent("make it bigger")
+
+    assert greeting["intent"] == "greeting"
+    assert greeting["source"] == "local"
+    assert unclear == {"intent": "unknown", "source": "llm"}
+    mock_client.aio.models.generate_content.assert_awaited_once()
+    assert agent.routing_stats["local"]["count"] == 1
+    assert agent.routing_stats["llm"]["count"] == 1
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.api.main import app, get_job_service
+from app.models.diagram import DiagramRequest
+from app.services.diagram_service import DiagramService
+from app.services.job_service import JobQueueFullError, JobService
+
+METADATA = {
+    "nodes_created": 1,
+    "clusters_created": 0,
+    "connections_made": 0,
+    "generation_time": 0.1,
+}
+
+
+def make_diagram_service() -> MagicMock:
+    service = MagicMock(spec=DiagramService)
+    service.generate_diagram_images = AsyncMock(
+        return_value=({"png": b"png"}, METADATA)
+    )
+    return service
+
+
+@pytest.mark.asyncio
+async def test_job_service_runs_jobs_and_records_failures():
+    """Test that workers complete jobs and keep errors for polling."""
+    diagram_service = make_diagram_service()
+    diagram_service.generate_diagram_images.side_effect = [
+        ({"png": b"png"}, METADATA),
+        RuntimeError("render failed"),
+    ]
+    jobs = JobService(diagram_service, workers=2)
+
+    ok = jobs.submit(DiagramRequest(description="a"))
+    failed = jobs.submit(DiagramRequest(description="b"))
+    assert ok.status == "queued"
+    await jobs._queue.join()
+    await jobs.stop()
+
+    assert jobs.get(ok.id).status == "succeeded"
+    assert jobs.get(ok.id).images == {"png": b"png"}
+    assert jobs.get(failed.id).error == "render failed"
+
+
+@pytest.mark.asyncio
+async def test_job_service_bounds_queue_and_retention():
+    """Test the bounded queue and expiry of finished jobs."""
+    jobs = JobService(make_diagram_service(), workers=1, queue_size=1, retention=60)
+    first = jobs.submit(DiagramRequest(description="a"))
+    with pytest.raises(JobQueueFullError):
+        jobs.submit(DiagramRequest(description="b"))
+    await jobs._queue.join()
+    await jobs.stop()
+
+    with patch("app.services.job_service.time.time", return_value=first.finished_at):
+        assert jobs.get(first.id) is not None
+    with patch(
+        "app.services.job_service.time.time", return_value=first.finished_at + 61
+    ):
+        assert jobs.get(first.id) is None
+
+
+@pytest.mark.asyncio
+async def test_job_endpoints_return_id_then_result():
+    """Test that POST returns 202 at once and GET returns the finished result."""
+    jobs = JobService(make_diagram_service(), workers=1)
+    app.dependency_overrides[get_job_service] = lambda: jobs
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        created = await ac.post("/api/v1/jobs", json={"description": "test"})
+        await asyncio.wait_for(jobs._queue.join(), timeout=5)
+        status = await ac.get(created.json()["status_url"])
+        missing = await ac.get("/api/v1/jobs/unknown")
+        bad_size = await ac.post(
+            "/api/v1/jobs", json={"description": "test", "size": {"width": "wide"}}
+        )
+
+    await jobs.stop()
+    assert created.status_code == 202
+    assert created.json()["status"] == "queued"
+    assert status.json()["status"] == "succeeded"
+    assert status.json()["result"]["image_data"] == "cG5n"
+    assert missing.status_code == 404
+    assert bad_size.status_code == 400
+    app.dependency_overrides = {}
+
+
+@pytest.mark.asyncio
+async def test_job_service_rejects_invalid_size_and_bounds_bytes():
+    """Test that bad sizes fail at submit and finished images are capped."""
+    jobs = JobService(make_diagram_service(), workers=1, max_bytes=5)
+    with pytest.raises(ValueError):
+        jobs.submit(DiagramRequest(description="a", size={"width": "wide"}))
+
+    # Each job keeps 3 bytes of images, so only the newest fits
+    first = jobs.submit(DiagramRequest(description="a"))
+    second = jobs.submit(DiagramRequest(description="b"))
+    await jobs._queue.join()
+    await jobs.stop()
+
+    assert jobs.get(first.id) is None
+    assert jobs.get(second.id).status == "succeeded"
+    assert jobs.stats()["bytes"] == 3
+
+
+@pytest.mark.asyncio
+async def test_job_service_stop_fails_unfinished_jobs():
+    """Test that jobs running or queued at shutdown are not left running."""
+    diagram_service = make_diagram_service()
+    started = asyncio.Event()
+
+    async def hang(*args):
+        started.set()
+        await asyncio.sleep(60)
+
+    diagram_service.generate_diagram_images.side_effect = hang
+    jobs = JobService(diagram_service, workers=1)
+    running = jobs.submit(DiagramRequest(description="a"))
+    queued = jobs.submit(DiagramRequest(description="b"))
+    await started.wait()
+    await jobs.stop()
+
+    for job in (running, queued):
+        assert job.status == "failed"
+        assert job.error == "Cancelled at shutdown"
+        assert job.finished_at is not None
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.agents.diagram_agent import DiagramAgent
+from app.json_repair import loads_lenient
+from app.models.analysis import DiagramAnalysis
+
+
+@pytest.mark.parametrize(
+    ("text", "expected", "repaired"),
+    [
+        ('{"a": 1}', {"a": 1}, False),
+        ('```json\n{"a": 1}\n```', {"a": 1}, False),
+        ('Sure! Here it is: {"a": [1, 2]} Hope that helps.', {"a": [1, 2]}, True),
+        ('{"a": [1, 2,], "b": 3,}', {"a": [1, 2], "b": 3}, True),
+        ('{"a": "unterminated', {"a": "unterminated"}, True),
+        ('{"a": 1, "b": tru', {"a": 1}, True),
+        (
+            '{"nodes": [{"id": "x", "type": "ec2"}, {"id": "y", "lab',
+            {"nodes": [{"id": "x", "type": "ec2"}, {"id": "y"}]},
+            True,
+        ),
+    ],
+)
+def test_loads_lenient_repairs_noisy_json(text, expected, repaired):
+    """Test fences, surrounding prose, trailing commas and truncation."""
+    assert loads_lenient(text) == (expected, repaired)
+
+
+def test_loads_lenient_rejects_text_without_json():
+    """Test that replies without any JSON raise ValueError."""
+    with pytest.raises(ValueError):
+        loads_lenient("I cannot help with that.")
+
+
+@pytest.mark.asyncio
+async def test_diagram_agent_requests_schema_and_counts_repairs():
+    """Test the response schema is sent and a truncated reply still succeeds."""
+    agent = DiagramAgent()
+    truncated = '{"nodes": [{"id": "web", "type": "ec2", "label": "Web"}], "conn'
+    mock_generate = AsyncMock(return_value=SimpleNamespace(text=truncated))
+
+    with patch("app.agents.diagram_agent.client") as mock_client:
+        mock_client.aio.models.generate_content = mock_generate
+        result = await agent.generate_analysis("web server")
+
+    config = mock_generate.call_args.kwargs["config"]
+    assert config.response_mime_type == "application/json"
+    assert config.response_schema is DiagramAnalysis
+    assert result == {
+        "nodes": [{"id": "web", "type": "ec2", "label": "Web"}],
+        "clusters": [],
+        "connections": [],
+    }
+    assert agent.parse_stats == {"parsed": 0, "repaired": 1, "failed": 0}
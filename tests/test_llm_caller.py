@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from google.genai import errors
+
+from app.agents.diagram_agent import DiagramAgent
+from app.llm import CircuitBreaker, LLMCaller, LLMUnavailableError
+
+
+def server_error() -> errors.ServerError:
+    return errors.ServerError(503, {"error": {"message": "overloaded"}})
+
+
+def make_caller(**kwargs) -> LLMCaller:
+    kwargs.setdefault("backoff_base", 0.0)
+    return LLMCaller(**kwargs)
+
+
+@pytest.mark.asyncio
+async def test_retries_transient_errors():
+    """Test that transient failures are retried until a call succeeds."""
+    caller = make_caller(max_attempts=3)
+    fn = AsyncMock(side_effect=[server_error(), server_error(), "ok"])
+
+    assert await caller.call(fn) == "ok"
+    assert fn.await_count == 3
+    assert caller.retries == 2
+
+
+@pytest.mark.asyncio
+async def test_non_transient_errors_are_not_retried():
+    """Test that bad requests propagate unchanged after one attempt."""
+    caller = make_caller(max_attempts=3)
+    fn = AsyncMock(side_effect=errors.ClientError(400, {"error": {}}))
+
+    with pytest.raises(errors.ClientError):
+        await caller.call(fn)
+    assert fn.await_count == 1
+    assert caller.breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_timeouts_exhaust_into_unavailable():
+    """Test per-attempt timeouts ending in LLMUnavailableError."""
+    caller = make_caller(timeout=0.01, max_attempts=2)
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    with pytest.raises(LLMUnavailableError):
+        await caller.call(slow)
+    assert caller.timeouts == 2
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_wins_over_slow_primary():
+    """Test that a slow attempt is hedged and the faster reply is used."""
+    caller = make_caller(hedge=True, hedge_min_delay=0.01, timeout=5)
+    caller._latencies.extend([0.01] * 20)
+    cancelled = asyncio.Event()
+    replies = iter(["slow", "fast"])
+
+    async def request():
+        reply = next(replies)
+        if reply == "slow":
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        return reply
+
+    assert await caller.call(request) == "fast"
+    assert (caller.hedges, caller.hedge_wins) == (1, 1)
+    await asyncio.wait_for(cancelled.wait(), 1)
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_opens_and_recovers():
+    """Test short-circuiting while open and closing after a good probe."""
+    caller = make_caller(max_attempts=1, breaker=CircuitBreaker(2, 0.05))
+    failing = AsyncMock(side_effect=server_error())
+    for _ in range(2):
+        with pytest.raises(LLMUnavailableError):
+            await caller.call(failing)
+
+    assert caller.breaker.state == "open"
+    with pytest.raises(LLMUnavailableError, match="circuit breaker"):
+        await caller.call(AsyncMock(return_value="ok"))
+    assert failing.await_count == 2
+
+    await asyncio.sleep(0.06)
+    assert await caller.call(AsyncMock(return_value="ok")) == "ok"
+    assert caller.breaker.state == "closed"
+    assert caller.breaker.trips == 1
+
+
+@pytest.mark.asyncio
+async def test_agent_falls_back_when_llm_unavailable():
+    """Test the heuristic analysis is used when the upstream is degraded."""
+    caller = make_caller(max_attempts=1, breaker=CircuitBreaker(1, 60))
+    with (
+        patch("app.agents.diagram_agent.llm_caller", caller),
+        patch("app.agents.diagram_agent.client") as mock_client,
+    ):
+        mock_client.aio.models.generate_content = AsyncMock(side_effect=server_error())
+        agent = DiagramAgent()
+        first = await agent.generate_analysis("web server with a database")
+        second = await agent.generate_analysis("queue and worker")
+
+    assert first["nodes"]
+    assert second["nodes"]
+    # The breaker opened after the first failure, so only one request went out
+    mock_client.aio.models.generate_content.assert_awaited_once()
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.config import Settings
+from app.llm import (
+    CassetteClient,
+    CassetteMissError,
+    StubClient,
+    create_client,
+    json_config,
+)
+from app.models.analysis import IntentResult
+
+
+@pytest.mark.asyncio
+async def test_record_then_replay_round_trip(tmp_path):
+    """Test that recorded replies replay offline, in rotation, with latency."""
+    path = str(tmp_path / "cassette.jsonl")
+    live = MagicMock()
+    live.aio.models.generate_content = AsyncMock(
+        side_effect=[SimpleNamespace(text="first"), SimpleNamespace(text="second")]
+    )
+    recorder = CassetteClient(path, mode="record", live=live)
+    config = json_config(IntentResult)
+    for _ in range(2):
+        await recorder.aio.models.generate_content(
+            model="m", contents="hello", config=config
+        )
+
+    player = CassetteClient(path, mode="replay", latency=0.5, jitter=0.1)
+    with patch("app.llm.asyncio.sleep", new=AsyncMock()) as mock_sleep:
+        replies = [
+            (
+                await player.aio.models.generate_content(
+                    model="m", contents="hello", config=config
+                )
+            ).text
+            for _ in range(3)
+        ]
+
+    assert replies == ["first", "second", "first"]
+    assert all(0.4 <= call.args[0] <= 0.6 for call in mock_sleep.await_args_list)
+    with pytest.raises(CassetteMissError):
+        await player.aio.models.generate_content(model="m", contents="other")
+
+
+def test_create_client_selects_cassette_by_mode(tmp_path):
+    """Test that offline LLM modes build clients without network access."""
+    path = tmp_path / "cassette.jsonl"
+    path.write_text("")
+    settings = Settings(
+        gemini_api_key="x", llm_mode="replay", llm_cassette_path=str(path)
+    )
+
+    assert isinstance(create_client(settings), CassetteClient)
+    stub = Settings(gemini_api_key="x", llm_mode="stub", llm_stub_nodes=3)
+    assert isinstance(create_client(stub), StubClient)
+    with pytest.raises(ValueError):
+        create_client(Settings(gemini_api_key="x", llm_mode="bogus"))
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.llm import LLMCaller
+from app.llm_scheduler import LLMScheduler, TokenBucket, llm_lane
+
+
+@pytest.mark.asyncio
+async def test_interactive_lane_goes_first():
+    """Test that queued interactive work is dispatched before earlier bulk work."""
+    scheduler = LLMScheduler(max_concurrency=1)
+    order: list[str] = []
+
+    async def request(lane: str) -> None:
+        await scheduler.acquire(lane)
+        order.append(lane)
+        await asyncio.sleep(0)
+        scheduler.release()
+
+    await scheduler.acquire("bulk")
+    tasks = [asyncio.create_task(request("bulk"))]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(request("interactive")))
+    await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.gather(*tasks)
+
+    assert order == ["interactive", "bulk"]
+    assert scheduler.in_flight == 0
+    assert scheduler.lane_stats["bulk"]["dispatched"] == 2
+
+
+@pytest.mark.asyncio
+async def test_requests_per_minute_limit():
+    """Test that requests beyond the bucket wait for it to refill."""
+    scheduler = LLMScheduler(rpm=600, burst=0.1)  # one request per 0.1s
+    start = time.perf_counter()
+    for _ in range(3):
+        await scheduler.acquire("interactive")
+        scheduler.release()
+
+    assert time.perf_counter() - start >= 0.15
+
+
+def test_token_bucket_allows_oversized_request_when_full():
+    """Test that a request larger than the bucket is not blocked forever."""
+    bucket = TokenBucket(per_minute=600, capacity=10)
+
+    assert bucket.time_until(50) == 0
+    bucket.take(50)
+    assert bucket.time_until(1) > 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_slot():
+    """Test that giving up while queued leaves capacity for others."""
+    scheduler = LLMScheduler(max_concurrency=1)
+    await scheduler.acquire("interactive")
+    waiter = asyncio.create_task(scheduler.acquire("bulk"))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    scheduler.release()
+
+    await asyncio.wait_for(scheduler.acquire("interactive"), 1)
+    assert scheduler.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_caller_schedules_in_context_lane():
+    """Test that LLM calls use the lane set by llm_lane and reserve tokens."""
+    scheduler = LLMScheduler(tpm=60_000)
+    caller = LLMCaller(scheduler=scheduler)
+    available = scheduler.tokens.level
+
+    with llm_lane("bulk"):
+        await caller.call(AsyncMock(return_value="ok"), tokens=500)
+
+    assert scheduler.lane_stats["bulk"]["dispatched"] == 1
+    assert scheduler.lane_stats["interactive"]["dispatched"] == 0
+    assert scheduler.tokens.level == pytest.approx(available - 500, abs=5)
+    assert scheduler.in_flight == 0
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.api.main import InstrumentMiddleware, app, get_diagram_service
+from app.metrics import Counter, Histogram, Registry, graph_size_bucket, server_timing
+
+
+def test_registry_renders_prometheus_text():
+    """Test counters and histograms in the Prometheus exposition format."""
+    registry = Registry()
+    hits = registry.register(Counter("hits_total", "Cache hits", ("cache",)))
+    latency = registry.register(Histogram("latency_seconds", "Latency", buckets=(1, 5)))
+
+    hits.inc(cache="render")
+    hits.inc(2, cache="render")
+    latency.observe(0.5)
+    latency.observe(3)
+    text = registry.render()
+
+    assert "# TYPE hits_total counter" in text
+    assert 'hits_total{cache="render"} 3' in text
+    assert 'latency_seconds_bucket{le="1"} 1' in text
+    assert 'latency_seconds_bucket{le="5"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in text
+    assert "latency_seconds_sum 3.5" in text
+    assert "latency_seconds_count 2" in text
+
+
+def test_metric_rejects_wrong_labels():
+    """Test that label names must match the metric definition."""
+    counter = Counter("errors_total", "Errors", ("endpoint",))
+
+    with pytest.raises(ValueError):
+        counter.inc(route="/")
+
+
+def test_histogram_time_records_on_error():
+    """Test that timed blocks are observed even when they raise."""
+    histogram = Histogram("work_seconds", "Work")
+
+    with pytest.raises(RuntimeError), histogram.time():
+        raise RuntimeError("boom")
+
+    assert histogram.count() == 1
+
+
+def test_helpers():
+    """Test graph size labels and the Server-Timing header format."""
+    assert graph_size_bucket(3) == "le10"
+    assert graph_size_bucket(5000) == "gt1000"
+    assert server_timing({"llm": 0.25, "render": 0.0015}) == (
+        "llm;dur=250.0, render;dur=1.5"
+    )
+
+
+@pytest.mark.asyncio
+async def test_generate_diagram_reports_stage_timings():
+    """Test Server-Timing and metadata timings on a generated diagram."""
+    service = MagicMock()
+    service.generate_diagram_images = AsyncMock(
+        return_value=(
+            {"png": b"png"},
+            {
+                "nodes_created": 1,
+                "clusters_created": 0,
+                "connections_made": 0,
+                "generation_time": 0.1,
+                "timings": {"llm": 0.2, "render": 0.1},
+            },
+        )
+    )
+    app.dependency_overrides[get_diagram_service] = lambda: service
+
+    try:
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            response = await ac.post(
+                "/api/v1/generate-diagram", json={"description": "web"}
+            )
+            metrics = await ac.get("/metrics")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    timings = response.json()["metadata"]["timings"]
+    assert set(timings) == {"llm", "render", "encode"}
+    header = response.headers["server-timing"]
+    for stage in ("llm", "render", "encode", "serialize", "total"):
+        assert f"{stage};dur=" in header
+
+    assert metrics.headers["content-type"].startswith("text/plain")
+    assert (
+        'diagram_http_request_seconds_count{method="POST",'
+        'route="/api/v1/generate-diagram",status="200"}'
+    ) in metrics.text
+
+
+def test_instrumentation_is_plain_asgi_middleware():
+    """Test that requests are not instrumented through BaseHTTPMiddleware."""
+    classes = [middleware.cls for middleware in app.user_middleware]
+    assert InstrumentMiddleware in classes
+    assert BaseHTTPMiddleware not in classes
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.llm import LazyClient
+from app.services.node_registry import NodeRegistry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return NodeRegistry(index_path=str(tmp_path / "node-index.json"))
+
+
+def test_resolves_previously_supported_types(registry):
+    """Test that the hand-picked AWS types keep drawing the same nodes."""
+    assert registry["ec2"].__name__ == "EC2"
+    assert registry["alb"].__name__ == "ElbApplicationLoadBalancer"
+    assert registry["api_gateway"].__module__ == "diagrams.aws.network"
+    assert registry["service"].__name__ == "EC2"
+    assert registry["database"].__name__ == "RDS"
+
+
+def test_resolves_types_from_other_providers(registry):
+    """Test lookups across providers, qualified names and loose spelling."""
+    assert registry["gke"].__module__ == "diagrams.gcp.compute"
+    assert registry["k8s.pod"].__name__ == "Pod"
+    assert registry["onprem.database.postgresql"].__name__ == "Postgresql"
+    assert registry["Cloud-Run"].__name__ == "Run"
+    assert registry.get("azure.function_apps").__name__ == "FunctionApps"
+
+
+def test_unknown_type(registry):
+    """Test that unknown types are reported as missing."""
+    assert registry.get("flux_capacitor") is None
+    assert "flux_capacitor" not in registry
+    with pytest.raises(KeyError):
+        registry["flux_capacitor"]
+
+
+def test_index_is_cached_on_disk(registry):
+    """Test that a second registry loads the index instead of rebuilding it."""
+    assert "ec2" in registry
+    assert registry.index_path
+
+    with patch("app.services.node_registry.build_index") as build:
+        fresh = NodeRegistry(index_path=registry.index_path)
+        assert fresh["lambda"].__name__ == "Lambda"
+    build.assert_not_called()
+
+
+def test_stale_index_is_rebuilt(registry):
+    """Test that an index for other providers is not reused."""
+    assert "gke" in registry
+
+    aws_only = NodeRegistry(providers=["aws"], index_path=registry.index_path)
+    assert aws_only.get("gke") is None
+    assert aws_only.get("ec2") is not None
+
+
+def test_lazy_client_builds_on_first_use():
+    """Test that the LLM client is only constructed when first used."""
+    factory = MagicMock()
+    client = LazyClient(factory)
+    factory.assert_not_called()
+
+    _ = client.aio.models
+    _ = client.aio
+    factory.assert_called_once()
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from app.cache import LRUCache
+from app.config import Settings
+from app.services.diagram_service import DiagramService
+from app.services.render_cache import DiskCache, RenderCache, render_cache_key
+
+ANALYSIS = {
+    "nodes": [
+        {"id": "web", "type": "EC2", "label": "Web"},
+        {"id": "db", "type": "rds", "label": "DB"},
+    ],
+    "clusters": [{"label": "Tier", "nodes": ["web"]}],
+    "connections": [{"source": "web", "target": "db"}],
+}
+
+
+def test_render_cache_key_is_canonical():
+    """Test that ordering, whitespace and type case do not change the key."""
+    reordered = {
+        "connections": [
+            {"source": "web", "target": "db"},
+            {"source": "web", "target": "db"},
+        ],
+        "clusters": [{"label": "Tier ", "nodes": ["web"]}],
+        "nodes": [
+            {"id": "db", "type": "RDS", "label": "DB"},
+            {"id": "web", "type": "ec2", "label": " Web"},
+        ],
+    }
+    key = render_cache_key(ANALYSIS, "title", "png")
+    assert key == render_cache_key(reordered, "title ", "PNG")
+    assert key != render_cache_key(ANALYSIS, "other title", "png")
+    assert key != render_cache_key(ANALYSIS, "title", "svg")
+
+
+@pytest.mark.asyncio
+async def test_render_cache_key_includes_nested_clusters(tmp_path):
+    """Test that nested clusters change the key and count as clusters."""
+    nested = {
+        **ANALYSIS,
+        "clusters": [
+            {
+                "label": "Tier",
+                "nodes": [],
+                "clusters": [{"label": "Inner", "nodes": ["web"]}],
+            }
+        ],
+    }
+    flat = {**ANALYSIS, "clusters": [{"label": "Tier", "nodes": []}]}
+    assert render_cache_key(nested, "title", "png") != render_cache_key(
+        flat, "title", "png"
+    )
+    settings = Settings(gemini_api_key="test_key", tmp_dir=str(tmp_path))
+    service = DiagramService(settings)
+    metadata = service._build_metadata(nested, 0.0, cache_hit=False)
+    assert metadata["clusters_created"] == 2
+    events = service.stream_diagram("title", analysis=nested)
+    event, data = await anext(events)
+    await events.aclose()
+    assert (event, data["clusters"]) == ("analysis", 2)
+
+
+def test_lru_cache_eviction():
+    """Test that the least recently used entry is evicted first."""
+    cache: LRUCache[str, bytes] = LRUCache(maxsize=2)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    cache.get("a")
+    cache.set("c", b"3")
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_cache_size_bound(tmp_path):
+    """Test that the disk tier stays under its byte budget."""
+    disk = DiskCache(str(tmp_path), max_bytes=250)
+    for i in range(5):
+        disk.set(f"{i:02d}key", b"x" * 100)
+
+    assert disk.evictions > 0
+    assert disk._scan_size() <= 250
+    assert disk.get("04key") == b"x" * 100
+
+
+def test_render_cache_promotes_disk_hits(tmp_path):
+    """Test that a fresh cache instance finds entries written by another one."""
+    RenderCache(disk_dir=str(tmp_path), disk_max_bytes=1024).set("k" * 64, b"png")
+    cache = RenderCache(disk_dir=str(tmp_path), disk_max_bytes=1024)
+
+    assert cache.get("k" * 64) == b"png"
+    assert "k" * 64 in cache.memory
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_diagram_service_cache_hit_skips_render(tmp_path):
+    """Test that a cache hit never enters the Diagram context."""
+    settings = Settings(gemini_api_key="test_key", tmp_dir=str(tmp_path))
+    service = DiagramService(settings)
+    key = render_cache_key(ANALYSIS, "test description", "png")
+    service.render_cache.set(key, b"cached-png")
+
+    with patch("app.services.renderer.Diagram") as mock_diagram:
+        images, metadata = await service.render_images(ANALYSIS, "test description")
+
+    mock_diagram.assert_not_called()
+    assert images["png"] == b"cached-png"
+    assert metadata["cache_hit"] is True
+    assert metadata["cache"]["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_diagram_service_reads_disk_tier_off_the_event_loop(tmp_path):
+    """Test that only memory lookups run on the event loop thread."""
+    settings = Settings(gemini_api_key="test_key", tmp_dir=str(tmp_path))
+    service = DiagramService(settings)
+    key = render_cache_key(ANALYSIS, "test description", "png")
+    service.render_cache.disk.set(key, b"disk-png")
+    threads = []
+    disk_get = service.render_cache.disk.get
+
+    def record_get(cache_key):
+        threads.append(threading.get_ident())
+        return disk_get(cache_key)
+
+    with patch.object(service.render_cache.disk, "get", side_effect=record_get):
+        images, _ = await service.render_images(ANALYSIS, "test description")
+
+    assert images["png"] == b"disk-png"
+    assert threads and threading.get_ident() not in threads
+    assert service.render_cache.stats()["hits"] == 1
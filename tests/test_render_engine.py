@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import anyio
+import pytest
+
+from app.services.render_engine import RenderEngine, RenderQueueFullError
+
+
+@pytest.mark.asyncio
+async def test_render_engine_thread_backend_reports_timing():
+    """Test that the thread backend returns results with per-job timing."""
+    engine = RenderEngine(backend="thread", workers=2)
+    job = await engine.submit(sum, [1, 2, 3])
+
+    assert job.result == 6
+    assert job.queue_wait >= 0
+    assert job.run_time >= 0
+    assert engine.stats()["completed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_render_engine_rejects_when_queue_is_full():
+    """Test that submissions beyond workers + queue_size fail fast."""
+    engine = RenderEngine(backend="thread", workers=1, queue_size=1)
+    release = anyio.Event()
+
+    def block() -> None:
+        anyio.from_thread.run(release.wait)
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(engine.submit, block)
+        tg.start_soon(engine.submit, block)
+        await anyio.wait_all_tasks_blocked()
+        with pytest.raises(RenderQueueFullError):
+            await engine.submit(block)
+        release.set()
+
+    assert engine.stats()["rejected"] == 1
+    assert engine.stats()["completed"] == 2
+
+
+@pytest.mark.asyncio
+async def test_render_engine_process_backend_runs_in_workers():
+    """Test that the process backend executes jobs outside this process."""
+    engine = RenderEngine(backend="process", workers=1)
+    try:
+        await engine.start()
+        job = await engine.submit(os.getpid)
+    finally:
+        engine.shutdown()
+
+    assert job.result != os.getpid()
+
+
+def _crash() -> None:
+    os._exit(1)
+
+
+@pytest.mark.asyncio
+async def test_render_engine_recovers_from_dead_worker():
+    """Test that a dead worker fails its job but not the renders after it."""
+    engine = RenderEngine(backend="process", workers=1)
+    try:
+        await engine.start()
+        with pytest.raises(BrokenProcessPool):
+            await engine.submit(_crash)
+        job = await engine.submit(os.getpid)
+    finally:
+        engine.shutdown()
+
+    assert job.result != os.getpid()
+    assert engine.stats()["restarts"] == 1
+    assert engine.stats()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_render_engine_holds_slot_of_cancelled_job():
+    """Test that a job keeps its queue slot while it runs after a cancel."""
+    engine = RenderEngine(backend="process", workers=1, queue_size=0)
+    try:
+        await engine.start()
+        task = asyncio.create_task(engine.submit(time.sleep, 0.5))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert engine.stats()["pending"] == 1
+        with pytest.raises(RenderQueueFullError):
+            await engine.submit(os.getpid)
+        await asyncio.sleep(0.6)
+        assert engine.stats()["pending"] == 0
+    finally:
+        engine.shutdown()
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import os
+import time
+import uuid
+from unittest.mock import patch
+
+import pytest
+from diagrams import Diagram
+
+from app.services.renderer import (
+    _inline_svg_images,
+    build_dot,
+    cleanup_orphans,
+    normalize_formats,
+    render_diagram,
+    render_diagrams,
+    size_attrs,
+)
+
+ANALYSIS = {
+    "nodes": [
+        {"id": "web", "type": "ec2", "label": "Web Server"},
+        {"id": "db", "type": "rds", "label": "Database"},
+    ],
+    "clusters": [{"label": "Web Tier", "nodes": ["web"]}],
+    "connections": [{"source": "web", "target": "db"}],
+}
+
+
+def test_build_dot_is_in_memory(tmp_path, monkeypatch):
+    """Test that building the graph writes nothing to disk."""
+    monkeypatch.chdir(tmp_path)
+    dot = build_dot(ANALYSIS, "Web App")
+
+    assert "Web Server" in dot.source
+    assert "cluster_Web Tier" in dot.source
+    assert os.listdir(tmp_path) == []
+
+
+def test_render_diagram_memory_pipeline_pipes_to_graphviz(tmp_path):
+    """Test that the memory pipeline returns graphviz stdout without temp files."""
+    with patch("graphviz.Digraph.pipe", return_value=b"png-bytes") as mock_pipe:
+        image = render_diagram(ANALYSIS, "Web App", str(tmp_path))
+
+    mock_pipe.assert_called_once_with(format="png")
+    assert image == b"png-bytes"
+    assert os.listdir(tmp_path) == []
+
+
+def test_render_diagrams_lays_out_once_for_several_formats(tmp_path):
+    """Test that extra formats reuse one layout pass via neato -n2."""
+    with (
+        patch("graphviz.Digraph.pipe", return_value=b"laid-out") as mock_layout,
+        patch("app.services.renderer.graphviz.pipe", return_value=b"out") as mock_pipe,
+    ):
+        images = render_diagrams(
+            ANALYSIS, "Web App", str(tmp_path), formats=["png", "pdf"]
+        )
+
+    mock_layout.assert_called_once_with(format="dot")
+    assert mock_pipe.call_count == 2
+    mock_pipe.assert_called_with("neato", "pdf", b"laid-out", neato_no_op=2)
+    assert list(images) == ["png", "pdf"]
+
+
+def test_normalize_formats_and_size_attrs():
+    """Test request format and size translation."""
+    assert normalize_formats(None) == ["png"]
+    assert normalize_formats(["SVG", "jpeg", "svg"]) == ["svg", "jpg"]
+    with pytest.raises(ValueError):
+        normalize_formats("gif")
+
+    assert size_attrs({"width": "480", "height": "240", "dpi": "48"}) == {
+        "dpi": "48",
+        "size": "10.000,5.000",
+    }
+    with pytest.raises(ValueError):
+        size_attrs({"width": "wide"})
+
+
+def test_svg_icons_are_inlined(tmp_path):
+    """Test that local icon references become data URIs."""
+    icon = tmp_path / "icon.png"
+    icon.write_bytes(b"icon")
+    svg = f'<image xlink:href="{icon}" />'.encode()
+
+    assert b'xlink:href="data:image/png;base64,aWNvbg=="' in _inline_svg_images(svg)
+
+
+def test_render_diagram_file_pipeline_cleans_up_on_failure(tmp_path):
+    """Test that a failed file render leaves no files behind."""
+
+    def failing_render(self):
+        self.dot.save()
+        raise RuntimeError("dot crashed")
+
+    with (
+        patch.object(Diagram, "render", failing_render),
+        pytest.raises(RuntimeError),
+    ):
+        render_diagram(ANALYSIS, "Web App", str(tmp_path), pipeline="file")
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_cleanup_orphans_only_removes_old_render_files(tmp_path):
+    """Test that the janitor removes stale render files and nothing else."""
+    stale = tmp_path / f"{uuid.uuid4()}.png"
+    fresh = tmp_path / f"{uuid.uuid4()}.png"
+    unrelated = tmp_path / "analysis-cache.sqlite3"
+    for path in (stale, fresh, unrelated):
+        path.write_bytes(b"x")
+    old = time.time() - 3600
+    os.utime(stale, (old, old))
+    os.utime(unrelated, (old, old))
+
+    assert cleanup_orphans(str(tmp_path), max_age=600) == 1
+    assert sorted(os.listdir(tmp_path)) == sorted([fresh.name, unrelated.name])
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.agents.assistant_agent import IntentClassifier, _fit_classifier
+from app.config import Settings
+from app.server import (
+    PreforkServer,
+    available_cpus,
+    main,
+    preload,
+    private_memory_mb,
+)
+
+
+def test_private_memory_mb():
+    """Test reading a process's unshared memory from /proc."""
+    if not os.path.exists(f"/proc/{os.getpid()}/smaps_rollup"):
+        pytest.skip("smaps_rollup is Linux-only")
+    assert private_memory_mb(os.getpid()) > 0
+    assert private_memory_mb(2**22 + 1) is None
+
+
+def test_available_cpus_honours_cgroup_quota(tmp_path):
+    """Test that a container CPU quota caps the CPU count."""
+    cpu_max = tmp_path / "cpu.max"
+    cpu_max.write_text("100000 100000\n")
+    with patch("app.server._CPU_MAX_PATH", str(cpu_max)):
+        assert available_cpus() == 1
+    cpu_max.write_text("max 100000\n")
+    with patch("app.server._CPU_MAX_PATH", str(cpu_max)):
+        assert 1 <= available_cpus() <= (os.cpu_count() or 1)
+
+
+def test_main_splits_llm_quota_between_workers():
+    """Test that per-worker schedulers together stay within the LLM quota."""
+    test_settings = Settings(gemini_api_key="x", llm_rpm=60, llm_tpm=1000)
+    with (
+        patch("app.server.settings", test_settings),
+        patch("app.server.setup_logging"),
+        patch("app.server.preload"),
+        patch("app.server.PreforkServer") as server,
+    ):
+        main(["--workers", "4"])
+    assert (test_settings.llm_rpm, test_settings.llm_tpm) == (15, 250)
+    assert server.call_args.kwargs["workers"] == 4
+
+
+def test_recycles_workers_over_memory_budget():
+    """Test that only workers above the budget are replaced, once each."""
+    server = PreforkServer(MagicMock(), workers=2, worker_memory_mb=100)
+    server.children = {1: 0.0, 2: 0.0}
+    with (
+        patch("app.server.private_memory_mb", side_effect=lambda pid: pid * 80.0),
+        patch.object(server, "_spawn") as spawn,
+        patch("app.server.os.kill") as kill,
+    ):
+        server._check_memory()
+        server._check_memory()
+    spawn.assert_called_once_with()
+    kill.assert_called_once_with(2, signal.SIGTERM)
+    assert server.recycled == 1
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get(url: str, timeout: float = 15.0) -> int:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                return response.status
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_serves_through_worker_recycling():
+    """Test that workers past max-requests are replaced without dropping service."""
+    port = _free_port()
+    env = {**os.environ, "GEMINI_API_KEY": "x", "LLM_MODE": "stub"}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.server", "--host", "127.0.0.1"]
+        + ["--port", str(port), "--workers", "1", "--max-requests", "2"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        statuses = [_get(f"http://127.0.0.1:{port}/metrics") for _ in range(5)]
+        assert statuses == [200] * 5
+    finally:
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=30) == 0
+
+
+def test_preload_fits_intent_model_once():
+    """Test that the parent fits the intent model that workers then reuse."""
+    settings = Settings(gemini_api_key="x", intent_fast_path=True)
+    _fit_classifier.cache_clear()
+    with patch("app.server.gc.freeze"):
+        preload(settings)
+    assert _fit_classifier.cache_info().currsize == 1
+    first = IntentClassifier.from_settings(settings)
+    assert IntentClassifier()._log_probs is first._log_probs
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.agents.diagram_agent import DiagramAgent
+from app.api.main import app, get_container
+from app.config import Settings
+from app.container import ServiceContainer
+from app.llm_scheduler import llm_lane
+from app.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    """Test that N concurrent callers of one key trigger a single call."""
+    flight: SingleFlight[int] = SingleFlight()
+    calls = 0
+
+    async def work() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return 42
+
+    results = await asyncio.gather(*(flight.do("k", work) for _ in range(10)))
+
+    assert results == [42] * 10
+    assert calls == 1
+    assert flight.stats() == {"executions": 1, "coalesced": 9, "in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_work():
+    """Test that work survives a cancelled caller and stops when all leave."""
+    flight: SingleFlight[str] = SingleFlight()
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def work() -> str:
+        started.set()
+        await release.wait()
+        return "done"
+
+    leader = asyncio.create_task(flight.do("k", work))
+    await started.wait()
+    follower = asyncio.create_task(flight.do("k", work))
+    await asyncio.sleep(0)
+    leader.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    assert await follower == "done"
+
+    release.clear()
+    lone = asyncio.create_task(flight.do("other", work))
+    await asyncio.sleep(0.01)
+    task = flight._calls["other"].task
+    lone.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await lone
+    await asyncio.sleep(0)
+    assert task.cancelled()
+    assert flight.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_diagram_agent_coalesces_identical_descriptions():
+    """Test that identical concurrent analyses make one LLM request."""
+    agent = DiagramAgent()
+
+    async def generate_content(**kwargs):
+        await asyncio.sleep(0.05)
+        return SimpleNamespace(text='{"nodes": [], "clusters": [], "connections": []}')
+
+    mock_generate = AsyncMock(side_effect=generate_content)
+    with patch("app.agents.diagram_agent.client") as mock_client:
+        mock_client.aio.models.generate_content = mock_generate
+        results = await asyncio.gather(
+            agent.generate_analysis("Web app"), agent.generate_analysis(" web  APP ")
+        )
+
+    assert mock_generate.await_count == 1
+    assert results[0] == results[1]
+    assert results[0] is not results[1]
+
+
+@pytest.mark.asyncio
+async def test_diagram_agent_does_not_coalesce_across_lanes():
+    """Test that an interactive analysis never joins one running in the bulk lane."""
+    agent = DiagramAgent()
+
+    async def generate_content(**kwargs):
+        await asyncio.sleep(0.05)
+        return SimpleNamespace(text='{"nodes": [], "clusters": [], "connections": []}')
+
+    async def bulk_analysis():
+        with llm_lane("bulk"):
+            return await agent.generate_analysis("Web app")
+
+    mock_generate = AsyncMock(side_effect=generate_content)
+    with patch("app.agents.diagram_agent.client") as mock_client:
+        mock_client.aio.models.generate_content = mock_generate
+        await asyncio.gather(bulk_analysis(), agent.generate_analysis("Web app"))
+
+    assert mock_generate.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_stats_endpoint_reports_coalescing():
+    """Test that the stats endpoint exposes coalesced-waiter counters."""
+    container = ServiceContainer(Settings(gemini_api_key="x"))
+    app.dependency_overrides[get_container] = lambda: container
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        response = await ac.get("/api/v1/stats")
+
+    coalescing = response.json()["coalescing"]
+    assert coalescing["analysis"] == {"executions": 0, "coalesced": 0, "in_flight": 0}
+    assert "render" in coalescing
+    app.dependency_overrides = {}
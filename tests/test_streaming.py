@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.api.main import app, get_assistant_service, get_diagram_service
+from app.config import Settings
+from app.services.assistant_service import AssistantService
+from app.services.diagram_service import DiagramService
+
+ANALYSIS = {
+    "nodes": [{"id": "web", "type": "ec2", "label": "Web"}],
+    "clusters": [],
+    "connections": [],
+}
+METADATA = {
+    "nodes_created": 1,
+    "clusters_created": 0,
+    "connections_made": 0,
+    "generation_time": 0.1,
+}
+
+
+def parse_sse(text: str) -> list[tuple[str, dict]]:
+    """Split a server-sent event stream into (event, data) pairs."""
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def make_diagram_service() -> DiagramService:
+    settings = Settings(gemini_api_key="x", render_cache_enabled=False)
+    service = DiagramService(settings, agent=MagicMock())
+    service.agent.generate_analysis = AsyncMock(return_value=ANALYSIS)
+    service.render_images = AsyncMock(return_value=({"png": b"png"}, METADATA))
+    return service
+
+
+@pytest.mark.asyncio
+async def test_generate_diagram_stream_emits_analysis_before_image():
+    """Test that the analysis event arrives ahead of the rendered image."""
+    app.dependency_overrides[get_diagram_service] = make_diagram_service
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        response = await ac.post(
+            "/api/v1/generate-diagram:stream", json={"description": "web"}
+        )
+
+    events = parse_sse(response.text)
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert [event for event, _ in events] == ["analysis", "render_started", "image"]
+    assert events[0][1]["nodes"] == 1
+    assert events[2][1]["image_data"] == "cG5n"
+    assert "total;dur=" in response.headers["server-timing"]
+    assert response.headers["x-trace-id"]
+    app.dependency_overrides = {}
+
+
+@pytest.mark.asyncio
+async def test_assistant_stream_text_and_error():
+    """Test streamed text deltas and the error event on failure."""
+    service = AssistantService(
+        Settings(gemini_api_key="x"), diagram_service=make_diagram_service()
+    )
+    app.dependency_overrides[get_assistant_service] = lambda: service
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        with patch.object(
+            service.assistant_agent,
+            "get_intent",
+            AsyncMock(return_value={"intent": "greeting"}),
+        ):
+            greeting = await ac.post("/api/v1/assistant:stream", json={"message": "hi"})
+        with patch.object(
+            service.assistant_agent,
+            "get_intent",
+            AsyncMock(side_effect=RuntimeError("llm down")),
+        ):
+            failed = await ac.post("/api/v1/assistant:stream", json={"message": "hi"})
+
+    events = parse_sse(greeting.text)
+    text = "".join(data["delta"] for event, data in events if event == "text")
+    assert events[0] == ("intent", {"intent": "greeting"})
+    assert events[-1][0] == "response"
+    assert text == events[-1][1]["content"]
+    assert parse_sse(failed.text) == [("error", {"detail": "llm down"})]
+    app.dependency_overrides = {}
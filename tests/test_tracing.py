@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import logging
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.api.main import app
+from app.logging import TraceContextFilter
+from app.services.render_engine import _timed_call
+from app.tracing import OTLPExporter, Span, Tracer, parse_traceparent, tracer
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+class ListExporter:
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+
+    def export(self, spans: list[Span]) -> None:
+        self.spans.extend(spans)
+
+
+@pytest.fixture
+def exporter():
+    """Collect spans from the process-wide tracer."""
+    collected = ListExporter()
+    previous, tracer.exporter = tracer.exporter, collected
+    yield collected
+    tracer.flush()
+    tracer.exporter = previous
+
+
+def test_parse_traceparent():
+    """Test W3C traceparent parsing and rejection of malformed headers."""
+    assert parse_traceparent(TRACEPARENT) == (
+        "0af7651916cd43dd8448eb211c80319c",
+        "b7ad6b7169203331",
+    )
+    assert parse_traceparent("00-xyz-b7ad6b7169203331-01") is None
+    assert parse_traceparent(f"00-{'0' * 32}-b7ad6b7169203331-01") is None
+    assert parse_traceparent(None) is None
+
+
+def test_nested_spans_share_trace_and_record_errors():
+    """Test parent links within a trace and error capture on exceptions."""
+    collected = ListExporter()
+    local = Tracer(collected)
+
+    with local.span("outer") as outer:
+        with pytest.raises(ValueError), local.span("inner"):
+            raise ValueError("bad")
+    local.flush()
+
+    inner, finished_outer = collected.spans
+    assert finished_outer is outer
+    assert inner.trace_id == outer.trace_id
+    assert inner.parent_id == outer.span_id
+    assert inner.error == "ValueError: bad"
+    assert outer.end_ns is not None
+
+
+def test_otlp_encoding():
+    """Test the OTLP/HTTP JSON payload for a finished span."""
+    local = Tracer()
+    with local.span("llm", parent=TRACEPARENT, kind="client", tokens=3) as span:
+        pass
+
+    payload = OTLPExporter("http://collector", "svc").encode([span])
+
+    resource = payload["resourceSpans"][0]
+    assert resource["resource"]["attributes"][0]["value"] == {"stringValue": "svc"}
+    encoded = resource["scopeSpans"][0]["spans"][0]
+    assert encoded["traceId"] == "0af7651916cd43dd8448eb211c80319c"
+    assert encoded["parentSpanId"] == "b7ad6b7169203331"
+    assert encoded["kind"] == 3
+    assert encoded["attributes"] == [{"key": "tokens", "value": {"intValue": "3"}}]
+
+
+def test_worker_call_continues_submitter_trace(exporter):
+    """Test that render jobs run in a span under the submitting span."""
+    with tracer.span("submit") as parent:
+        _timed_call(lambda: None, parent.traceparent)
+    tracer.flush()
+
+    worker = next(s for s in exporter.spans if s.name.startswith("render_worker"))
+    assert worker.trace_id == parent.trace_id
+    assert worker.parent_id == parent.span_id
+
+
+def test_log_records_carry_trace_id():
+    """Test that log records are stamped with the active trace id."""
+    record = logging.LogRecord("app", logging.INFO, __file__, 1, "hi", None, None)
+    log_filter = TraceContextFilter()
+
+    log_filter.filter(record)
+    assert record.trace_id == "-"
+    with tracer.span("request") as span:
+        log_filter.filter(record)
+    assert record.trace_id == span.trace_id
+
+
+@pytest.mark.asyncio
+async def test_request_continues_incoming_trace(exporter):
+    """Test that the HTTP span continues the caller's traceparent."""
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        response = await ac.get("/metrics", headers={"traceparent": TRACEPARENT})
+    tracer.flush()
+
+    assert response.headers["x-trace-id"] == "0af7651916cd43dd8448eb211c80319c"
+    server = next(s for s in exporter.spans if s.kind == "server")
+    assert server.name == "GET /metrics"
+    assert server.parent_id == "b7ad6b7169203331"
+    assert server.attributes["http.status_code"] == 200